@@ -39,6 +39,14 @@ for i in range(0, 10000):
 select_time_1 = process_time()
 print("Selecting 10k records took:  \t\t\t", select_time_1 - select_time_0)
 
+# Measuring Prepared Select Performance
+prepared_select = query.prepare_select(0, [1, 1, 1, 1, 1])
+prepared_select_time_0 = process_time()
+for i in range(0, 10000):
+    prepared_select(choice(keys))
+prepared_select_time_1 = process_time()
+print("Selecting 10k records (prepared) took:\t", prepared_select_time_1 - prepared_select_time_0)
+
 # Measuring Aggregate Performance
 agg_time_0 = process_time()
 for i in range(0, 10000, 100):
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+grades_table.index.create_index(1)
+query = Query(grades_table)
+for key in range(1, 51):
+    query.insert(key, key % 10, 0)
+
+def get_rows(value, column_index=0):
+    return [record.columns for record in query.select(value, column_index, [1, 1, 1])]
+
+# an insert and an update rolled back when a later query (a duplicate insert) fails
+transaction = Transaction()
+transaction.add_query(query.insert, grades_table, 100, 7, 7)
+transaction.add_query(query.update, grades_table, 5, None, 55, 5)
+transaction.add_query(query.insert, grades_table, 6, 0, 0)
+assert transaction.run() == False
+assert get_rows(100) == [] and get_rows(5) == [[5, 5, 0]]
+assert get_rows(55, 1) == [] and sorted(row[0] for row in get_rows(5, 1)) == [5, 15, 25, 35, 45]
+assert query.sum(1, 100, 1) == sum(key % 10 for key in range(1, 51))
+print("Abort rollback finished")
+
+# the key of the rolled back insert can be inserted again (reusing its RID)
+assert query.insert(100, 8, 8) != False
+assert get_rows(100) == [[100, 8, 8]] and [100, 8, 8] in get_rows(8, 1)
+assert grades_table.index.locate(100, 0) == {51}
+transaction = Transaction()
+transaction.add_query(query.update, grades_table, 5, None, 55, 5)
+assert transaction.run() == True
+assert get_rows(5) == [[5, 55, 5]] and get_rows(55, 1) == [[5, 55, 5]]
+print("Insert after abort finished")
+
+# the rollback is still in place after reopening
+db.close()
+del grades_table, query, transaction
+db = Database()
+db.open(path)
+grades_table = db.get_table("Grades")
+query = Query(grades_table)
+assert get_rows(100) == [[100, 8, 8]] and get_rows(5) == [[5, 55, 5]] and get_rows(6) == [[6, 6, 0]]
+db.close()
+print("Reopen after abort finished")
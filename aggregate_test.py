@@ -0,0 +1,53 @@
+import os
+import tempfile
+from random import Random
+
+from lstore.aggregate_info import Aggregate_Type
+from lstore.db import Database
+from lstore.query import Query
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+random = Random(3)
+records = dict()
+# spans several page ranges
+for key in range(5000):
+    records[key] = [key, random.randint(-100, 100), key % 5]
+    query.insert(*records[key])
+old_records = {key: list(columns) for key, columns in records.items()}
+for key in random.sample(range(5000), 500):
+    records[key][1] = random.randint(-100, 100)
+    query.update(key, None, records[key][1], None)
+for key in random.sample(range(5000), 100):
+    del records[key]
+    del old_records[key]
+    query.delete(key)
+
+def get_values(records, start_range=None, end_range=None):
+    return [columns[1] for key, columns in records.items() if (start_range == None or key >= start_range) and (end_range == None or key <= end_range)]
+
+for start_range, end_range in [(None, None), (10, 4000), (4990, None)]:
+    values = get_values(records, start_range, end_range)
+    assert query.count(start_range, end_range) == len(values)
+    assert query.min(start_range, end_range, 1) == min(values) and query.max(start_range, end_range, 1) == max(values)
+    assert query.avg(start_range, end_range, 1) == sum(values) / len(values)
+    assert query.aggregate(Aggregate_Type.SUM, 1, start_range, end_range) == sum(values)
+    assert query.aggregate(Aggregate_Type.SUM, 1, start_range, end_range, relative_version=-1) == sum(get_values(old_records, start_range, end_range))
+print("Aggregate finished")
+
+groups = dict()
+for columns in records.values():
+    groups.setdefault(columns[2], list()).append(columns[1])
+assert query.group_by(2, 1) == {group: sum(values) for group, values in groups.items()}
+assert query.group_by(2, 1, Aggregate_Type.MAX) == {group: max(values) for group, values in groups.items()}
+assert query.group_by(2, 1, Aggregate_Type.COUNT, 0, 99) == {group: len([key for key in records if key < 100 and key % 5 == group]) for group in range(5)}
+print("Group by finished")
+
+# empty ranges count nothing, other aggregates of them fail
+assert query.count(6000, 7000) == 0 and query.min(6000, 7000, 1) == False and query.avg(6000, 7000, 1) == False
+assert query.group_by(2, 1, Aggregate_Type.SUM, 6000, 7000) == dict()
+print("Empty aggregate finished")
+db.close()
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+
+from lstore.async_query import AsyncQuery, AsyncTransaction, shutdown_executor
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+
+async def main():
+    # many concurrent requests share a couple of threads
+    executor = ThreadPoolExecutor(max_workers=2)
+    async_query = AsyncQuery(grades_table, executor)
+    assert await asyncio.gather(*[async_query.insert(key, 0, key) for key in range(10)]) == [None] * 10
+    assert await async_query.insert(0, 0, 0) == False
+    assert all(await asyncio.gather(*[async_query.increment(key % 10, 1) for key in range(200)]))
+    assert [record.columns for record in await async_query.select(3, 0, [1, 1, 1])] == [[3, 20, 3]]
+    assert await async_query.sum(0, 9, 1) == 200 and await async_query.count() == 10
+    assert await async_query.group_by(1, 2) == {20: sum(range(10))}
+    print("Async queries finished")
+
+    # a transaction holding a lock does not stall the event loop: writers wait for it by awaiting retries
+    paused = Event()
+    resume = Event()
+    def pause():
+        paused.set()
+        resume.wait()
+        return True
+    transaction = Transaction()
+    transaction.add_query(query.update, grades_table, 5, None, 100, None)
+    transaction.add_query(pause, grades_table)
+    thread = Thread(target=transaction.run, daemon=True)
+    thread.start()
+    paused.wait()
+    async_transaction = AsyncTransaction(executor=executor)
+    async_transaction.add_query(query.increment, grades_table, 5, 1)
+    async_transaction.add_query(query.select, grades_table, 5, 0, [1, 1, 1])
+    writer = asyncio.create_task(async_transaction.run())
+    num_ticks = 0
+    while num_ticks < 20:
+        await asyncio.sleep(0.01)
+        num_ticks += 1
+    # meanwhile readers still run on the pool
+    assert [record.columns for record in await async_query.select(5, 0, [1, 1, 1])] == [[5, 20, 5]]
+    assert not writer.done()
+    resume.set()
+    assert await writer == True and async_transaction.num_retries > 0
+    assert async_transaction.results[1][0].columns == [5, 101, 5]
+    thread.join()
+    print("Awaited locks finished")
+
+    # failing transactions are not retried
+    async_transaction = AsyncTransaction(executor=executor)
+    async_transaction.add_query(query.update, grades_table, 1, None, 7, None)
+    async_transaction.add_query(query.insert, grades_table, 2, 0, 0)
+    assert await async_transaction.run() == False and async_transaction.num_retries == 0
+    assert [record.columns for record in await async_query.select(1, 0, [1, 1, 1])] == [[1, 20, 1]]
+    executor.shutdown()
+    # the shared pool is used without an executor
+    assert await AsyncQuery(grades_table).sum(0, 9, 1) == 281
+    shutdown_executor()
+    print("Failed async transaction finished")
+
+asyncio.run(main())
+db.close()
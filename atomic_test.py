@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+db.open(os.path.join(tempfile.mkdtemp(), "ECS165"))
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(1, 11):
+    query.insert(key, 0, 0)
+
+assert query.increment(1, 1) == True
+assert query.add(1, 2, 5) == True
+assert query.compare_and_set(1, 1, 1, 7) == True
+assert query.compare_and_set(1, 1, 1, 8) == False
+assert query.select(1, 0, [1, 1, 1])[0].columns == [1, 7, 5]
+# no record matches the key
+assert query.increment(100, 1) == False
+assert query.add(100, 2, 5) == False
+assert query.compare_and_set(100, 1, 0, 1) == False
+print("Atomic queries finished")
+
+# a transaction whose atomic query finds no record aborts without its other writes
+for modify, args in ((query.increment, (100, 1)), (query.add, (100, 1, 3)), (query.compare_and_set, (100, 1, 0, 3))):
+    transaction = Transaction()
+    transaction.add_query(query.update, grades_table, 2, None, 9, None)
+    transaction.add_query(modify, grades_table, *args)
+    assert transaction.run() == False
+    assert query.select(2, 0, [1, 1, 1])[0].columns == [2, 0, 0]
+print("Atomic queries on missing keys finished")
+db.close()
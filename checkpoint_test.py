@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from lstore.db import Database
+from lstore.query import Query
+
+# runs in a child process that checkpoints while a transaction runs, then dies without closing the database
+CRASHING_SESSION = r'''
+import os
+import sys
+from threading import Event, Thread
+from time import sleep
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.log_info import LOG_MANAGER
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+Config.CHECKPOINT_INTERVAL = 0.05
+Config.CHECKPOINT_LOG_SIZE = 1 << 30
+log_path = os.path.join(sys.argv[1], Config.WAL_FILE_NAME)
+db = Database()
+db.open(sys.argv[1])
+grades_table = db.create_table("Grades", 3, 0)
+grades_table.index.create_index(1)
+query = Query(grades_table)
+for key in range(1, 201):
+    query.insert(key, key % 10, 0)
+for key in range(2, 201, 2):
+    query.update(key, None, 10, key)
+
+# the log shrinks when a checkpoint writes the pages out
+LOG_MANAGER.flush()
+log_size = os.path.getsize(log_path)
+db.checkpoint()
+assert os.path.getsize(log_path) < log_size / 10
+
+# background checkpoints keep the log small under sustained writes
+Config.CHECKPOINT_LOG_SIZE = 1 << 16
+max_log_size = 0
+for value in range(40):
+    for key in range(101, 201):
+        query.update(key, None, None, value)
+    LOG_MANAGER.flush()
+    max_log_size = max(max_log_size, os.path.getsize(log_path))
+    sleep(0.05)
+assert max_log_size < 1 << 18
+
+# a transaction running across a checkpoint is still undone (its writes reach the pages)
+paused = Event()
+def pause():
+    paused.set()
+    Event().wait()
+transaction = Transaction()
+transaction.add_query(query.update, grades_table, 1, None, 20, 20)
+transaction.add_query(query.insert, grades_table, 500, 20, 20)
+transaction.add_query(pause, grades_table)
+Thread(target=transaction.run, daemon=True).start()
+paused.wait()
+db.checkpoint()
+os._exit(0)
+'''
+
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+subprocess.run([sys.executable, "-c", CRASHING_SESSION, path], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+print("Checkpoints finished")
+
+db = Database()
+db.open(path)
+grades_table = db.get_table("Grades")
+query = Query(grades_table)
+for key in range(1, 201):
+    expected = [key, 10 if key % 2 == 0 else key % 10, 39 if key > 100 else key if key % 2 == 0 else 0]
+    assert query.select(key, 0, [1, 1, 1])[0].columns == expected, key
+assert query.select(500, 0, [1, 1, 1]) == [] and query.select(20, 1, [1, 1, 1]) == []
+assert sorted(record.columns[0] for record in query.select(10, 1, [1, 1, 1])) == list(range(2, 201, 2))
+db.close()
+print("Recovery after checkpoints finished")
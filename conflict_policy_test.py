@@ -0,0 +1,92 @@
+from threading import Thread
+from time import monotonic, sleep
+
+import lstore.config as Config
+from lstore.lock_info import LOCK_MANAGER, Lock_Manager, Lock_Mode
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+def acquire_in_thread(lock_manager, owner, resource, timeout=None):
+    """
+    Request resource on another thread. Returns the thread and the list its result goes to.
+    """
+    results = list()
+    thread = Thread(target=lambda: results.append(lock_manager.acquire(owner, resource, Lock_Mode.X, timeout=timeout)), daemon=True)
+    thread.start()
+    sleep(0.1)
+    return (thread, results)
+
+def hold(policy):
+    """
+    Get a lock manager where "old" holds resource 0 and the younger "young" holds resource 1
+    """
+    lock_manager = Lock_Manager(conflict_policy=policy)
+    assert lock_manager.acquire("old", (0,), Lock_Mode.X)
+    assert lock_manager.acquire("young", (1,), Lock_Mode.X)
+    return lock_manager
+
+# NO_WAIT: conflicting requests fail at once
+lock_manager = hold("NO_WAIT")
+start_time = monotonic()
+assert not lock_manager.acquire("young", (0,), Lock_Mode.X) and not lock_manager.acquire("old", (1,), Lock_Mode.X)
+assert monotonic() - start_time < 0.1 and lock_manager.had_conflict("old")
+print("NO_WAIT finished")
+
+# WAIT_DIE: younger requesters fail, older ones wait
+lock_manager = hold("WAIT_DIE")
+assert not lock_manager.acquire("young", (0,), Lock_Mode.X)
+thread, results = acquire_in_thread(lock_manager, "old", (1,))
+assert thread.is_alive()
+lock_manager.release_all("young")
+thread.join()
+assert results == [True]
+print("WAIT_DIE finished")
+
+# WOUND_WAIT: older requesters make younger holders fail, younger ones wait
+lock_manager = hold("WOUND_WAIT")
+start_time = monotonic()
+assert not lock_manager.acquire("young", (0,), Lock_Mode.X, timeout=0.2)
+assert monotonic() - start_time >= 0.2
+thread, results = acquire_in_thread(lock_manager, "old", (1,))
+assert thread.is_alive()
+assert not lock_manager.acquire("young", (2,), Lock_Mode.X) and lock_manager.had_conflict("young")
+assert not lock_manager.clear_conflicts("young")
+lock_manager.release_all("young")
+thread.join()
+assert results == [True]
+print("WOUND_WAIT finished")
+
+# DETECT: requests wait, and the youngest owner of a deadlock fails
+lock_manager = hold("DETECT")
+thread, results = acquire_in_thread(lock_manager, "old", (1,))
+assert thread.is_alive()
+assert not lock_manager.acquire("young", (0,), Lock_Mode.X)
+lock_manager.release_all("young")
+thread.join()
+assert results == [True]
+print("DETECT finished")
+
+# TransactionWorker retries transactions that aborted on a lock conflict
+LOCK_MANAGER.set_conflict_policy("NO_WAIT")
+assert LOCK_MANAGER.acquire("blocker", ("contended",), Lock_Mode.X)
+attempts = list()
+def contend():
+    attempts.append(len(attempts))
+    # the conflicting lock goes away after the first attempt
+    if len(attempts) == 2: LOCK_MANAGER.release_all("blocker")
+    return LOCK_MANAGER.acquire(LOCK_MANAGER.get_owner(), ("contended",), Lock_Mode.X)
+transaction = Transaction()
+transaction.add_query(contend, None)
+# queries failing for another reason are not retried
+failing_transaction = Transaction()
+failing_transaction.add_query(lambda: False, None)
+worker = TransactionWorker([transaction, failing_transaction])
+worker.run()
+worker.join()
+LOCK_MANAGER.set_conflict_policy(Config.LOCK_CONFLICT_POLICY)
+assert worker.stats == [True, False] and worker.result == 1 and len(attempts) == 2
+assert worker.num_commits == 1 and worker.num_aborts == 2 and worker.num_retries == 1
+stats = worker.get_stats()
+assert stats["commits"] == 1 and stats["retries"] == 1 and stats["aborts_by_reason"] == {"CONFLICT": 1, "QUERY_FAILED": 1}
+assert LOCK_MANAGER.get_lock_holders() == dict()
+print("Worker retries finished")
@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from lstore.db import Database
+from lstore.lock_info import LOCK_MANAGER
+from lstore.query import Query
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+grades_table.index.create_index(2)
+query = Query(grades_table)
+# spans several page ranges
+number_of_records = 5000
+for key in range(number_of_records):
+    query.insert(key, key % 10, key % 3)
+query.delete(7)
+
+# a full scan yields every record lazily, in page order
+cursor = query.select_cursor(None, None)
+assert [record.columns[0] for record in cursor] == [key for key in range(number_of_records) if key != 7]
+assert cursor.is_closed and list(cursor) == []
+# by a column with or without an index
+assert [record.columns for record in query.select_cursor(4, 1, [1, 0, 1])] == [[key, key % 3] for key in range(4, number_of_records, 10)]
+assert [record.columns[0] for record in query.select_cursor(2, 2, limit=3)] == [2, 5, 8]
+print("Cursor finished")
+
+# limit and early close stop the scan
+cursor = query.select_cursor(None, None, [1, 0, 0], limit=25)
+assert [record.columns for record in cursor.fetch_batch(10)] == [[key] for key in range(11) if key != 7]
+assert len(cursor.fetch_batch(100)) == 15 and cursor.is_closed and cursor.num_records_read == 25
+with query.select_cursor(None, None) as cursor:
+    assert next(cursor).columns == [0, 0, 0]
+assert cursor.is_closed and cursor.fetch_batch(10) == []
+print("Limit and close finished")
+
+# column batches hold the projected columns of many rows
+cursor = query.select_cursor(None, None, [0, 1, 1])
+batch = cursor.fetch_column_batch(2000)
+assert len(batch) == 2000 and batch.get_column(0) == [key % 10 for key in range(2001) if key != 7]
+assert [record.columns for record in batch][:3] == [[0, 0], [1, 1], [2, 2]]
+num_rows = len(batch)
+while len(batch):
+    batch = cursor.fetch_column_batch(2000)
+    num_rows += len(batch)
+assert num_rows == number_of_records - 1 and cursor.is_closed
+print("Column batches finished")
+
+# an open cursor holds no locks and keeps reading the snapshot taken when it started
+cursor = query.select_cursor(None, None)
+assert next(cursor).columns == [0, 0, 0]
+assert LOCK_MANAGER.get_lock_holders() == dict()
+assert query.update(4000, None, 100, None) == True and query.delete(4001) == True
+assert query.insert(number_of_records, 0, 0) != False
+rows = {record.columns[0]: record.columns for record in cursor}
+assert rows[4000] == [4000, 0, 1] and rows[4001] == [4001, 1, 2] and not number_of_records in rows
+print("Cursor snapshot finished")
+db.close()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+from threading import Event, Thread
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Abort_Reason, Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(1, 11):
+    query.insert(key, 0, key)
+
+def get_rows(key):
+    return [record.columns for record in query.select(key, 0, [1, 1, 1])]
+
+def run_paused(transaction):
+    """
+    Run transaction on a thread that stops inside it until the returned event is set
+    """
+    paused = Event()
+    resume = Event()
+    def pause():
+        paused.set()
+        resume.wait()
+        return True
+    transaction.add_query(pause, grades_table)
+    results = list()
+    thread = Thread(target=lambda: results.append(transaction.run()), daemon=True)
+    thread.start()
+    paused.wait()
+    return (thread, resume, results)
+
+# a deferred transaction reads its own writes, which no one else sees until it commits
+reads = list()
+def read(*keys):
+    reads.append([get_rows(key) for key in keys] + [query.sum(1, 20, 2)])
+    return True
+transaction = Transaction(mode="DEFERRED")
+transaction.add_query(query.insert, grades_table, 11, 0, 11)
+transaction.add_query(query.update, grades_table, 1, None, 1, 100)
+transaction.add_query(query.delete, grades_table, 2)
+transaction.add_query(read, grades_table, 11, 1, 2)
+transaction.add_query(query.update, grades_table, 11, None, 11, None)
+transaction.add_query(read, grades_table, 11)
+thread, resume, results = run_paused(transaction)
+assert reads == [[[[11, 0, 11]], [[1, 1, 100]], [], 55 - 1 + 100 - 2 + 11], [[[11, 11, 11]], 55 - 1 + 100 - 2 + 11]]
+assert get_rows(11) == [] and get_rows(1) == [[1, 0, 1]] and get_rows(2) == [[2, 0, 2]] and query.sum(1, 20, 2) == 55
+resume.set()
+thread.join()
+assert results == [True]
+assert get_rows(11) == [[11, 11, 11]] and get_rows(1) == [[1, 1, 100]] and get_rows(2) == []
+print("Read your own writes finished")
+
+# records it only read may change before it commits (snapshot isolation)
+transaction = Transaction(mode="DEFERRED")
+transaction.add_query(read, grades_table, 3)
+thread, resume, results = run_paused(transaction)
+transaction.add_query(query.update, grades_table, 4, None, 4, None)
+assert query.update(3, None, 3, None) == True
+resume.set()
+thread.join()
+assert results == [True] and reads[-1][0] == [[3, 0, 3]]
+assert get_rows(3) == [[3, 3, 3]] and get_rows(4) == [[4, 4, 4]]
+print("Changed reads finished")
+
+# but it aborts if a record it writes changed
+transaction = Transaction(mode="DEFERRED")
+transaction.add_query(query.update, grades_table, 5, None, 5, None)
+thread, resume, results = run_paused(transaction)
+assert query.update(5, None, None, 50) == True
+resume.set()
+thread.join()
+assert results == [False] and transaction.abort_reason == Abort_Reason.CONFLICT and transaction.is_retryable()
+assert get_rows(5) == [[5, 0, 50]]
+assert transaction.run() == True and get_rows(5) == [[5, 5, 50]]
+print("Write conflict finished")
+
+db.close()
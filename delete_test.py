@@ -54,20 +54,20 @@ for i in range(0, number_of_records):
     query.delete(92106429 + i)
 
 print("Delete finished")
+
+# deleting a key without a record fails instead of raising
+assert query.delete(92106429) == False
+assert query.delete(92106429 + number_of_records) == False
+print("Delete of missing keys finished")
+
 print("NUMBER OF RECORDS", grades_table.num_records)
-print("First Record", query.select(92106429, 0, [1, 1, 1, 1, 1])[0].columns)
+print("First Record", query.select(92106429, 0, [1, 1, 1, 1, 1]))
 
+# deleted records are no longer selected
 for key in keys:
-    record = query.select(key, 0, [1, 1, 1, 1, 1])[0]
-    error = False
-    for i, column in enumerate(record.columns):
-        if column != records[key][i]:
-            error = True
-    if error:
-        print("select error on", key, ":", record, ", correct:", records[key])
-    else:
-        pass
-        # print('select on', key, ':', record)
+    records_found = query.select(key, 0, [1, 1, 1, 1, 1])
+    if len(records_found) != 0:
+        print("select error on deleted", key, ":", records_found[0])
 print("Select finished")
 
 db.close()
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from lstore.db import Database
+from lstore.query import Query
+
+# runs in a child process that commits transactions and dies without closing the database
+CRASHING_SESSION = r'''
+import os
+import sys
+from time import sleep
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.log_info import LOG_MANAGER, Log_Type, read_log_records
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+def insert(keys, durability=None):
+    for key in keys:
+        transaction = Transaction(durability=durability)
+        transaction.add_query(query.insert, grades_table, key, 0, 0)
+        assert transaction.run()
+    return transaction
+
+path, durability = sys.argv[1:]
+Config.WAL_ASYNC_FLUSH_INTERVAL = 1
+db = Database()
+db.open(path, durability)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+match durability:
+    case "ASYNC":
+        # commits don't wait for the log, which is flushed in the background
+        transaction = insert(range(1, 21))
+        assert LOG_MANAGER.flushed_lsn < transaction.commit_lsn
+        sleep(Config.WAL_ASYNC_FLUSH_INTERVAL * 1.5)
+        assert LOG_MANAGER.flushed_lsn >= transaction.commit_lsn
+        # unless a transaction asks for a stronger durability
+        transaction = insert(range(21, 41), "FSYNC")
+        assert LOG_MANAGER.flushed_lsn >= transaction.commit_lsn
+        # commits within the flush interval before a crash are lost
+        insert(range(41, 61))
+    case "NONE":
+        # nothing is logged, changes are on disk once the database is closed
+        transaction = insert(range(1, 41), "FSYNC")
+        assert transaction.commit_lsn == 0
+        db.close()
+        del grades_table, query
+        db.open(path, durability)
+        grades_table = db.get_table("Grades")
+        query = Query(grades_table)
+        # and the ones since then are lost
+        insert(range(41, 61))
+        assert all(record.type in [Log_Type.CHECKPOINT, Log_Type.CLOSE] for record in read_log_records(LOG_MANAGER.log_path))
+os._exit(0)
+'''
+
+for durability in ["ASYNC", "NONE"]:
+    path = os.path.join(tempfile.mkdtemp(), "ECS165")
+    subprocess.run([sys.executable, "-c", CRASHING_SESSION, path, durability], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    db = Database()
+    db.open(path)
+    grades_table = db.get_table("Grades")
+    query = Query(grades_table)
+    assert all(len(query.select(key, 0, [1, 1, 1])) == 1 for key in range(1, 41))
+    assert all(query.select(key, 0, [1, 1, 1]) == [] for key in range(41, 61))
+    assert query.count() == 40
+    # lost keys can be inserted again
+    assert query.insert(41, 0, 0) != False and len(query.select(41, 0, [1, 1, 1])) == 1
+    db.close()
+    del grades_table, query
+    print(f"{durability} commits finished")
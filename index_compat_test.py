@@ -0,0 +1,63 @@
+import copyreg
+import os
+import tempfile
+from pickle import dumps
+
+from bplustree import BPlusTree
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.index import load_rids
+from lstore.query import Query
+from lstore.record_info import RID
+
+# {RID(7), RID(4100)} as pickled by the original RID class (which had a __dict__)
+ORIGINAL_PICKLE = b'\x80\x04\x95?\x00\x00\x00\x00\x00\x00\x00\x8f\x94(\x8c\x12lstore.record_info\x94\x8c\x03RID\x94\x93\x94)\x81\x94}\x94\x8c\x03rid\x94M\x04\x10sbh\x03)\x81\x94}\x94h\x06K\x07sb\x90.'
+
+assert load_rids(ORIGINAL_PICKLE) == {7, 4100}, load_rids(ORIGINAL_PICKLE)
+print("Original RID pickle finished")
+
+
+class Original_RID:
+    """
+    Pickles like an RID of the original class with pickle protocols 0 and 1: RID
+    created without arguments, then its __dict__ set
+    """
+
+    def __init__(self, rid:int)->None:
+        self.rid = rid
+
+    def __reduce_ex__(self, protocol):
+        return (copyreg._reconstructor, (RID, object, None), {"rid": self.rid})
+
+
+# an index written before RIDs were passed around as ints
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db = Database()
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+grades_table.index.create_index(1)
+query = Query(grades_table)
+for key in range(1, 101):
+    query.insert(key, key % 10, 0)
+rids = {key: grades_table.index.locate(key, 0).pop() for key in range(1, 101)}
+db.close()
+del grades_table, query
+
+tree = BPlusTree(os.path.join(path, "Grades", "index", "1.db"), order=Config.INDEX_ORDER_NUMBER)
+for value in range(10):
+    tree[value] = dumps({Original_RID(rid) for key, rid in rids.items() if key % 10 == value})
+tree.close()
+
+db = Database()
+db.open(path)
+grades_table = db.get_table("Grades")
+query = Query(grades_table)
+for value in range(10):
+    keys = sorted(record.columns[0] for record in query.select(value, 1, [1, 1, 1]))
+    assert keys == [key for key in range(1, 101) if key % 10 == value], (value, keys)
+# entries written from here on hold ints again
+query.update(10, None, 3, None)
+assert sorted(record.columns[0] for record in query.select(3, 1, [1, 1, 1])) == [3, 10, 13, 23, 33, 43, 53, 63, 73, 83, 93]
+db.close()
+print("Index with original RIDs finished")
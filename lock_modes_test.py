@@ -0,0 +1,64 @@
+import lstore.config as Config
+from lstore.lock_info import Lock_Manager, Lock_Mode, combine_modes, is_covered_by
+
+lock_manager = Lock_Manager(conflict_policy="NO_WAIT")
+table = ("Grades",)
+page_range = ("Grades", 0)
+
+def acquire(owner, resource, mode):
+    return lock_manager.acquire(owner, resource, mode, blocking=False)
+
+def held(owner, resource):
+    return lock_manager.get_held_mode(owner, resource)
+
+# locking a record takes intention locks on its page range and table
+assert acquire("a", page_range + (1,), Lock_Mode.S)
+assert held("a", table) == Lock_Mode.IS and held("a", page_range) == Lock_Mode.IS and held("a", page_range + (1,)) == Lock_Mode.S
+assert acquire("b", page_range + (2,), Lock_Mode.X)
+assert held("b", table) == Lock_Mode.IX and held("b", page_range) == Lock_Mode.IX
+# intention locks only conflict with coarse locks
+assert not acquire("b", page_range + (1,), Lock_Mode.X)
+assert not acquire("c", page_range, Lock_Mode.S)
+assert not acquire("c", table, Lock_Mode.X)
+assert acquire("c", page_range + (3,), Lock_Mode.S)
+lock_manager.release_all("a")
+lock_manager.release_all("b")
+lock_manager.release_all("c")
+assert lock_manager.get_lock_holders() == dict()
+print("Intention locks finished")
+
+# reading a whole page range while writing some of its records takes SIX
+assert combine_modes(Lock_Mode.IX, Lock_Mode.S) == Lock_Mode.SIX and combine_modes(Lock_Mode.IS, Lock_Mode.X) == Lock_Mode.X
+assert acquire("a", page_range + (1,), Lock_Mode.X)
+assert acquire("a", page_range, Lock_Mode.S)
+assert held("a", page_range) == Lock_Mode.SIX
+assert acquire("b", page_range + (2,), Lock_Mode.S)
+assert not acquire("b", page_range + (3,), Lock_Mode.X)
+# the page range lock already covers reads of its records
+assert is_covered_by(Lock_Mode.SIX, Lock_Mode.S) and not is_covered_by(Lock_Mode.SIX, Lock_Mode.X)
+assert acquire("a", page_range + (4,), Lock_Mode.S)
+assert held("a", page_range + (4,)) == None
+lock_manager.release_all("a")
+lock_manager.release_all("b")
+print("SIX locks finished")
+
+# too many record locks in a page range are traded for one page range lock
+escalation_threshold = Config.LOCK_ESCALATION_THRESHOLD
+Config.LOCK_ESCALATION_THRESHOLD = 3
+for rid in range(1, 5):
+    assert acquire("a", page_range + (rid,), Lock_Mode.X)
+assert held("a", page_range) == Lock_Mode.X
+assert all(held("a", page_range + (rid,)) == None for rid in range(1, 5))
+assert acquire("a", page_range + (10,), Lock_Mode.X) and held("a", page_range + (10,)) == None
+assert not acquire("b", page_range + (10,), Lock_Mode.S)
+lock_manager.release_all("a")
+# escalation gives up (keeping the record locks) while another owner uses the page range
+assert acquire("b", page_range + (20,), Lock_Mode.S)
+for rid in range(1, 5):
+    assert acquire("a", page_range + (rid,), Lock_Mode.X)
+assert held("a", page_range) == Lock_Mode.IX and held("a", page_range + (4,)) == Lock_Mode.X
+Config.LOCK_ESCALATION_THRESHOLD = escalation_threshold
+lock_manager.release_all("a")
+lock_manager.release_all("b")
+assert lock_manager.get_lock_holders() == dict()
+print("Lock escalation finished")
@@ -0,0 +1,64 @@
+from enum import Enum
+
+
+class Aggregate_Type(Enum):
+    COUNT = 0
+    SUM = 1
+    MIN = 2
+    MAX = 3
+    AVG = 4
+
+
+class Partial_Aggregate:
+
+    def __init__(self)->None:
+        self.count:int   = 0
+        self.total:int   = 0
+        self.minimum:int = None
+        self.maximum:int = None
+
+    def __repr__(self)->str:
+        return f"Partial_Aggregate(count={self.count}, total={self.total}, min={self.minimum}, max={self.maximum})"
+
+    def add(self, value:int)->None:
+        """
+        Add a single value to the partial aggregate
+        """
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum: self.minimum = value
+        if self.maximum is None or value > self.maximum: self.maximum = value
+
+    def merge(self, other:"Partial_Aggregate")->None:
+        """
+        Merge another partial aggregate (e.g. from another page range) into this one
+        """
+        if not other.count: return
+        self.count += other.count
+        self.total += other.total
+        if self.minimum is None or other.minimum < self.minimum: self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum: self.maximum = other.maximum
+
+    def get_result(self, aggregate_type:Aggregate_Type):
+        """
+        Get final aggregate value. Returns False if nothing was aggregated
+        (except for COUNT, which returns 0).
+        """
+        if aggregate_type == Aggregate_Type.COUNT: return self.count
+        if not self.count: return False
+        match aggregate_type:
+            case Aggregate_Type.SUM: return self.total
+            case Aggregate_Type.MIN: return self.minimum
+            case Aggregate_Type.MAX: return self.maximum
+            case Aggregate_Type.AVG: return self.total / self.count
+            case _: raise ValueError
+
+
+def merge_partial_aggregates(partials:dict, other_partials:dict)->None:
+    """
+    Merge grouped partial aggregates ({group value: Partial_Aggregate}) into partials.
+    """
+    for group_value, other_partial in other_partials.items():
+        if group_value not in partials:
+            partials[group_value] = Partial_Aggregate()
+        partials[group_value].merge(other_partial)
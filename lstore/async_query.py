@@ -0,0 +1,170 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from random import uniform
+from threading import Lock
+
+import lstore.config as Config
+from lstore.aggregate_info import Aggregate_Type
+from lstore.query import Query
+from lstore.table import Table
+from lstore.transaction import Transaction
+
+executor:ThreadPoolExecutor = None
+executor_mutex:Lock         = Lock()
+
+
+def get_executor()->ThreadPoolExecutor:
+    """
+    Get the thread pool shared by async queries (created on first use)
+    """
+    global executor
+    with executor_mutex:
+        if executor == None:
+            executor = ThreadPoolExecutor(max_workers=Config.ASYNC_EXECUTOR_THREADS, thread_name_prefix="lstore-async")
+        return executor
+
+
+def shutdown_executor()->None:
+    """
+    Stop the shared thread pool (a new one is created if async queries run again)
+    """
+    global executor
+    with executor_mutex:
+        if executor != None:
+            executor.shutdown()
+            executor = None
+
+
+async def run_in_executor(func, *args, executor:ThreadPoolExecutor=None):
+    """
+    Run a blocking call on the async thread pool (or executor) and await its result
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor or get_executor(), partial(func, *args))
+
+
+class AsyncTransaction:
+    """
+    Transaction for asyncio code. Each attempt runs on one thread of the pool (its
+    locks, snapshot and workspace are per thread), but it only waits
+    Config.ASYNC_LOCK_TIMEOUT for a lock there: on a conflict it aborts and the retry
+    is awaited on the event loop, so contended requests do not tie up pool threads.
+    """
+
+    def __init__(self, mode=Config.TRANSACTION_MODE, executor:ThreadPoolExecutor=None, durability=None)->None:
+        self.transaction:Transaction = Transaction(mode, durability)
+        self.transaction.lock_timeout = Config.ASYNC_LOCK_TIMEOUT
+        self.executor:ThreadPoolExecutor = executor
+        self.num_retries:int = 0
+
+    def add_query(self, query, table:Table, *args)->None:
+        """
+        Adds the given query to this transaction (blocking Query methods, as for Transaction)
+        """
+        self.transaction.add_query(query, table, *args)
+
+    @property
+    def results(self)->list:
+        """
+        Results of the queries of the last run
+        """
+        return self.transaction.results
+
+    def __run_attempt(self)->bool:
+        try:
+            return self.transaction.run()
+        except Exception:
+            # a crashing query fails the transaction instead of leaving it open on the pool thread
+            return self.transaction.abort()
+
+    async def run(self)->bool:
+        """
+        Run the transaction, retrying with exponential backoff while it aborts because
+        of conflicts. Returns True if it committed.
+        """
+        backoff = Config.TRANSACTION_RETRY_BACKOFF
+        for attempt in range(Config.MAX_TRANSACTION_RETRIES + 1):
+            if attempt:
+                self.num_retries += 1
+                await asyncio.sleep(uniform(0, backoff))
+                backoff = min(backoff * 2, Config.MAX_TRANSACTION_RETRY_BACKOFF)
+            if await run_in_executor(self.__run_attempt, executor=self.executor): return True
+            if not self.transaction.is_retryable(): return False
+        return False
+
+
+class AsyncQuery:
+    """
+    Awaitable version of Query. Reads run on the async thread pool (they take no
+    locks, see MVCC, so they only block a pool thread on disk I/O). Writes run as
+    single-query AsyncTransactions, so waiting for a record lock is awaited instead
+    of blocking a thread. Failing queries return False, as with Query.
+    """
+
+    def __init__(self, table:Table, executor:ThreadPoolExecutor=None)->None:
+        self.table:Table                 = table
+        self.query:Query                 = Query(table)
+        self.executor:ThreadPoolExecutor = executor
+
+    async def __read(self, func, *args):
+        try:
+            return await run_in_executor(func, *args, executor=self.executor)
+        except Exception:
+            return False
+
+    async def __write(self, func, *args):
+        transaction = AsyncTransaction(executor=self.executor)
+        transaction.add_query(func, self.table, *args)
+        if not await transaction.run(): return False
+        return transaction.results[0]
+
+    async def delete(self, primary_key)->bool:
+        return await self.__write(self.query.delete, primary_key)
+
+    async def insert(self, *columns)->bool:
+        return await self.__write(self.query.insert, *columns)
+
+    async def update(self, primary_key, *columns)->bool:
+        return await self.__write(self.query.update, primary_key, *columns)
+
+    async def increment(self, key, column:int)->bool:
+        return await self.__write(self.query.increment, key, column)
+
+    async def add(self, key, column:int, amount:int)->bool:
+        return await self.__write(self.query.add, key, column, amount)
+
+    async def compare_and_set(self, key, column:int, expected_value:int, new_value:int)->bool:
+        return await self.__write(self.query.compare_and_set, key, column, expected_value, new_value)
+
+    async def select(self, search_key, search_key_index:int, projected_columns_index:list):
+        return await self.__read(self.query.select, search_key, search_key_index, projected_columns_index)
+
+    async def select_version(self, search_key, search_key_index:int, projected_columns_index:list, relative_version:int):
+        return await self.__read(self.query.select_version, search_key, search_key_index, projected_columns_index, relative_version)
+
+    async def select_batch(self, search_key, search_key_index:int, projected_columns_index:list=None, relative_version:int=0):
+        return await self.__read(self.query.select_batch, search_key, search_key_index, projected_columns_index, relative_version)
+
+    async def sum(self, start_range, end_range, aggregate_column_index:int)->int:
+        return await self.__read(self.query.sum, start_range, end_range, aggregate_column_index)
+
+    async def sum_version(self, start_range, end_range, aggregate_column_index:int, relative_version:int)->int:
+        return await self.__read(self.query.sum_version, start_range, end_range, aggregate_column_index, relative_version)
+
+    async def aggregate(self, aggregate_type:Aggregate_Type, aggregate_column_index:int, start_range=None, end_range=None, group_by_column_index:int=None, relative_version:int=0):
+        return await self.__read(self.query.aggregate, aggregate_type, aggregate_column_index, start_range, end_range, group_by_column_index, relative_version)
+
+    async def count(self, start_range=None, end_range=None, aggregate_column_index:int=None)->int:
+        return await self.__read(self.query.count, start_range, end_range, aggregate_column_index)
+
+    async def min(self, start_range, end_range, aggregate_column_index:int):
+        return await self.__read(self.query.min, start_range, end_range, aggregate_column_index)
+
+    async def max(self, start_range, end_range, aggregate_column_index:int):
+        return await self.__read(self.query.max, start_range, end_range, aggregate_column_index)
+
+    async def avg(self, start_range, end_range, aggregate_column_index:int)->float:
+        return await self.__read(self.query.avg, start_range, end_range, aggregate_column_index)
+
+    async def group_by(self, group_by_column_index:int, aggregate_column_index:int, aggregate_type:Aggregate_Type=Aggregate_Type.SUM, start_range=None, end_range=None)->dict:
+        return await self.__read(self.query.group_by, group_by_column_index, aggregate_column_index, aggregate_type, start_range, end_range)
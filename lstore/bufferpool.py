@@ -6,7 +6,9 @@ from threading import RLock
 
 import lstore.config as Config
 from lstore.disk import Disk
-from lstore.record_info import Record, RID, TID
+from lstore.log_info import LOG_MANAGER
+from lstore.mvcc_info import VERSION_MANAGER
+from lstore.record_info import Record
 
 INITIAL_SCHEMA_ENCODING = 0
 INITIAL_INDIRECTION_VALUE = -1
@@ -16,6 +18,7 @@ class Bufferpool:
     def __init__(self)->None:
         self.frames:dict[str,Frame] = dict()
         self.latch:RLock             = RLock()
+        self.is_detached:bool        = False
 
     def __del__(self)->None:
         del self.frames
@@ -33,6 +36,8 @@ class Bufferpool:
         for frame_path, frame in self.frames.items():
             if earliest_time > frame.get_last_time_used():
                 earliest_frame_path = frame_path
+        # written out under the latch, so dirty page tables do not miss it while it is
+        self.frames[earliest_frame_path].write_frame_to_disk()
         del self.frames[earliest_frame_path]
 
     def __import_frame(self, page_path:str)->None:
@@ -45,43 +50,102 @@ class Bufferpool:
             if not self.__is_page_in_buffer(page_path):
                 self.__import_frame(page_path)
 
-    def insert_record(self, record:Record, base_page_path:str)->None:
+    def insert_record(self, record:Record, base_page_path:str, timestamp:int=None)->None:
         self.__access_frame(base_page_path)
-        self.frames[base_page_path].insert_record(record)
+        self.frames[base_page_path].insert_record(record, timestamp)
 
-    def get_record_entry(self, id:RID, page_path:str, column_index:int)->int:
+    def write_entries(self, id:int, page_path:str, entries:list[tuple[int,int]])->None:
+        """
+        Write (physical page index, value) entries of id in the page at page_path (used by recovery and rollbacks)
+        """
+        self.__access_frame(page_path)
+        self.frames[page_path].write_entries(id, entries)
+
+    def get_record_entry(self, id:int, page_path:str, column_index:int)->int:
         self.__access_frame(page_path)
         return self.frames[page_path].get_record_entry(id, column_index)
 
-    def get_schema_encoding(self, rid:RID, base_page_path:str)->bitarray:
+    def get_record_entries(self, id:int, page_path:str, column_indices:list)->list[int]:
+        self.__access_frame(page_path)
+        return self.frames[page_path].get_record_entries(id, column_indices)
+
+    def get_schema_encoding(self, rid:int, base_page_path:str)->bitarray:
         self.__access_frame(base_page_path)
         return self.frames[base_page_path].get_schema_encoding(rid)
 
-    def set_schema_encoding(self, rid:RID, schema_encoding:bitarray, base_page_path:str)->None:
+    def set_schema_encoding(self, rid:int, schema_encoding:bitarray, base_page_path:str)->None:
         self.__access_frame(base_page_path)
         self.frames[base_page_path].set_schema_encoding(rid, schema_encoding)
 
-    def get_indirection_tid(self, id:RID, page_path:str)->TID:
+    def get_indirection_tid(self, id:int, page_path:str)->int:
         self.__access_frame(page_path)
         return self.frames[page_path].get_indirection_tid(id)
 
-    def set_indirection_tid(self, id:RID, tid:TID, page_path:str)->None:
+    def set_indirection_tid(self, id:int, tid:int, page_path:str)->None:
         self.__access_frame(page_path)
         self.frames[page_path].set_indirection_tid(id, tid)
 
-    def delete_record(self, rid:RID, base_page_path:str)->None:
-        self.__access_frame(base_page_path)
-        self.frames[base_page_path].delete_record(rid)
+    def get_timestamp(self, id:int, page_path:str)->int:
+        self.__access_frame(page_path)
+        return self.frames[page_path].get_timestamp(id)
+
+    def delete_record(self, id:int, page_path:str)->None:
+        self.__access_frame(page_path)
+        self.frames[page_path].delete_record(id)
+
+    def is_record_deleted(self, id:int, page_path:str)->bool:
+        self.__access_frame(page_path)
+        return self.frames[page_path].is_record_deleted(id)
+
+    def detach_from_disk(self)->None:
+        """
+        Never write frames back to disk from now on. Used by forked worker processes,
+        whose copy of the pool must not overwrite pages written by the parent.
+        """
+        with self.latch:
+            self.is_detached = True
+            for frame in self.frames.values():
+                frame.is_dirty = False
+
+    def flush_frames(self, path_prefix:str)->None:
+        if self.is_detached: return
+        path_prefix = os.path.join(path_prefix, "")
+        with self.latch:
+            for frame_path, frame in self.frames.items():
+                if frame_path.startswith(path_prefix):
+                    frame.write_frame_to_disk()
 
     def commit_writes_to_disk(self)->None:
+        if self.is_detached: return
         with self.latch:
             for frame in self.frames.values():
                 frame.write_frame_to_disk()
 
-    def abort_writes_to_disk(self)->None:
+    def flush_dirty_frames(self, lsn:int)->None:
+        """
+        Write out frames dirtied before lsn one at a time, so other threads keep using
+        the bufferpool in between (for fuzzy checkpoints)
+        """
+        if self.is_detached: return
         with self.latch:
-            for frame in self.frames.values():
-                frame.keep_original_frame_to_disk()
+            page_paths = [page_path for page_path, frame in self.frames.items() if frame.is_dirty and frame.rec_lsn < lsn]
+        for page_path in page_paths:
+            # frames are not imported again while one is being written out
+            with self.latch:
+                frame = self.frames.get(page_path)
+                if frame != None: frame.write_frame_to_disk()
+
+    def get_dirty_page_table(self)->dict[str,int]:
+        """
+        Get {page path: LSN of the first logged write not on disk} of the dirty frames
+        """
+        with self.latch:
+            frames = list(self.frames.items())
+        dirty_page_table = dict()
+        for page_path, frame in frames:
+            rec_lsn = frame.get_rec_lsn()
+            if rec_lsn: dirty_page_table[page_path] = rec_lsn
+        return dirty_page_table
 
 
 class Frame:
@@ -90,6 +154,9 @@ class Frame:
         self.page_path:str                      = page_path
         self.num_pins:int                       = 0
         self.is_dirty:bool                      = False
+        self.page_lsn:int                       = 0 # LSN of the latest logged write to the frame
+        self.rec_lsn:int                        = 0 # LSN of the first write since the frame was last written out (0 if not logged)
+        self.writing_lsn:int                    = 0 # rec_lsn of the copy being written out (0 if none)
         self.physical_pages:list[Physical_Page] = list()
         self.last_time_used:datetime            = datetime.now()
 
@@ -114,6 +181,7 @@ class Frame:
             physical_page_path = os.path.join(self.page_path, f"{physical_page_index}.bin")
             with open(physical_page_path, 'wb') as f:
                 f.write(bytearray(Config.PHYSICAL_PAGE_SIZE))
+            Disk.mark_written(physical_page_path)
 
     def __load_physical_pages(self)->None:
         """
@@ -145,62 +213,101 @@ class Frame:
     def get_last_time_used(self)->datetime:
         return self.last_time_used
 
-    def write_frame_to_disk(self)->None:
-        if self.is_dirty:
-            for physical_page in self.physical_pages:
-                physical_page.write_data_to_disk()
+    def __write_entries(self, id:int, entries:list[tuple[int,int]])->None:
+        """
+        Log and apply (physical page index, value) writes to id (in order)
+        """
+        # logged and applied together, so a write-out never holds a write its log records miss
+        with self.latch:
+            writes = [(i, self.physical_pages[i].read_record_info_from_data(id), value) for i, value in entries]
+            lsn = LOG_MANAGER.log_write(self.page_path, id, writes)
+            for i, value in entries:
+                self.physical_pages[i].write_record_info_to_data(value, id)
+            self.page_lsn = max(self.page_lsn, lsn)
+            if not self.is_dirty or not self.rec_lsn: self.rec_lsn = lsn
+            self.__set_dirty_bit()
+
+    def get_rec_lsn(self)->int:
+        """
+        Get LSN of the first write not on disk (None if the frame is clean)
+        """
+        with self.latch:
+            rec_lsns = [lsn for lsn in (self.rec_lsn if self.is_dirty else 0, self.writing_lsn) if lsn]
+            return min(rec_lsns) if len(rec_lsns) else None
 
-    def keep_original_frame_to_disk(self)->None:
-        if self.is_dirty:
-            for physical_page in self.physical_pages:
-                physical_page.keep_original_data_to_disk()
+    def write_frame_to_disk(self)->None:
+        # take a copy of the pages: writes made while it is written out dirty the frame again
+        with self.latch:
+            if not self.is_dirty: return
+            self.is_dirty = False
+            self.writing_lsn, self.rec_lsn = self.rec_lsn, 0
+            page_lsn = self.page_lsn
+            pages_data = [bytes(physical_page.data) for physical_page in self.physical_pages]
+        # write-ahead: the log must hold every write of the pages before they reach disk
+        LOG_MANAGER.flush(page_lsn)
+        for physical_page, data in zip(self.physical_pages, pages_data):
+            physical_page.write_data_to_disk(data)
+        with self.latch:
+            self.writing_lsn = 0
 
     @__pin_frame_decorator
-    def insert_record(self, record:Record)->None:
-        rid = int(record.get_rid())
-        # create metadata for data
-        self.physical_pages[Config.INDIRECTION_COLUMN].write_record_info_to_data(INITIAL_INDIRECTION_VALUE, rid)
-        self.physical_pages[Config.RID_COLUMN].write_record_info_to_data(rid, rid)
-        self.physical_pages[Config.TIMESTAMP_COLUMN].write_record_info_to_data(datetime.now().timestamp(), rid)
-        self.physical_pages[Config.SCHEMA_ENCODING_COLUMN].write_record_info_to_data(INITIAL_SCHEMA_ENCODING, rid)
-
-        # write columns to data
-        for i, entry_value in enumerate(record.get_columns()):
-            self.physical_pages[i+Config.NUM_METADATA_COLUMNS].write_record_info_to_data(entry_value, rid)
+    def insert_record(self, record:Record, timestamp:int=None)->None:
+        rid = record.get_rid()
+        # version timestamp of the writer (see mvcc_info)
+        if timestamp == None: timestamp = VERSION_MANAGER.new_timestamp()
+        # metadata, then columns, then the RID last: scans without locks skip the record until it is complete
+        entries = [
+            (Config.INDIRECTION_COLUMN, INITIAL_INDIRECTION_VALUE),
+            (Config.TIMESTAMP_COLUMN, timestamp),
+            (Config.SCHEMA_ENCODING_COLUMN, INITIAL_SCHEMA_ENCODING),
+        ]
+        entries += [(i+Config.NUM_METADATA_COLUMNS, entry_value) for i, entry_value in enumerate(record.get_columns())]
+        entries.append((Config.RID_COLUMN, rid))
+        self.__write_entries(rid, entries)
 
-        # set frame as dirty
-        self.__set_dirty_bit()
+    @__pin_frame_decorator
+    def write_entries(self, id:int, entries:list[tuple[int,int]])->None:
+        self.__write_entries(id, entries)
 
     @__pin_frame_decorator
-    def get_schema_encoding(self, rid:RID)->bitarray:
+    def get_schema_encoding(self, rid:int)->bitarray:
         rbarr = bitarray()
-        rbarr.frombytes(self.physical_pages[Config.SCHEMA_ENCODING_COLUMN].read_record_info_from_data(int(rid)).to_bytes(Config.RECORD_FIELD_SIZE, "big"))
+        rbarr.frombytes(self.physical_pages[Config.SCHEMA_ENCODING_COLUMN].read_record_info_from_data(rid).to_bytes(Config.RECORD_FIELD_SIZE, "big"))
         rbarr = rbarr[-self.num_columns:]
         return rbarr
 
     @__pin_frame_decorator
-    def set_schema_encoding(self, rid:RID, schema_encoding:bitarray)->None:
+    def set_schema_encoding(self, rid:int, schema_encoding:bitarray)->None:
         schema_encoding = int(schema_encoding.to01(), 2)
-        self.physical_pages[Config.SCHEMA_ENCODING_COLUMN].write_record_info_to_data(schema_encoding, int(rid))
-        self.__set_dirty_bit()
+        self.__write_entries(rid, [(Config.SCHEMA_ENCODING_COLUMN, schema_encoding)])
 
     @__pin_frame_decorator
-    def get_indirection_tid(self, rid:RID)->TID:
-        return TID(self.physical_pages[Config.INDIRECTION_COLUMN].read_record_info_from_data(int(rid)))
+    def get_indirection_tid(self, rid:int)->int:
+        return self.physical_pages[Config.INDIRECTION_COLUMN].read_record_info_from_data(rid)
 
     @__pin_frame_decorator
-    def set_indirection_tid(self, id:RID, tid:TID)->None:
-        self.physical_pages[Config.INDIRECTION_COLUMN].write_record_info_to_data(tid, int(id))
-        self.__set_dirty_bit()
+    def set_indirection_tid(self, id:int, tid:int)->None:
+        self.__write_entries(id, [(Config.INDIRECTION_COLUMN, tid)])
 
     @__pin_frame_decorator
-    def get_record_entry(self, id:RID, column_index:int)->int:
-        return self.physical_pages[column_index+Config.NUM_METADATA_COLUMNS].read_record_info_from_data(int(id))
+    def get_timestamp(self, id:int)->int:
+        return self.physical_pages[Config.TIMESTAMP_COLUMN].read_record_info_from_data(id)
 
     @__pin_frame_decorator
-    def delete_record(self, rid:RID)->None:
-        self.physical_pages[Config.RID_COLUMN].write_record_info_to_data(0, int(rid))
-        self.__set_dirty_bit()
+    def get_record_entry(self, id:int, column_index:int)->int:
+        return self.physical_pages[column_index+Config.NUM_METADATA_COLUMNS].read_record_info_from_data(id)
+
+    @__pin_frame_decorator
+    def get_record_entries(self, id:int, column_indices:list)->list[int]:
+        return [self.physical_pages[i+Config.NUM_METADATA_COLUMNS].read_record_info_from_data(id) for i in column_indices]
+
+    @__pin_frame_decorator
+    def delete_record(self, id:int)->None:
+        self.__write_entries(id, [(Config.RID_COLUMN, 0)])
+
+    @__pin_frame_decorator
+    def is_record_deleted(self, id:int)->bool:
+        return self.physical_pages[Config.RID_COLUMN].read_record_info_from_data(id) == 0
 
 
 class Physical_Page:
@@ -209,25 +316,19 @@ class Physical_Page:
         assert len(data) == Config.PHYSICAL_PAGE_SIZE
         self.physical_page_path:str  = physical_page_path
         self.data:bytearray          = data
-        self.original_data:bytearray = data
 
     def __get_offset(self, rid:int)->int:
         return (rid - 1) * Config.RECORD_FIELD_SIZE % Config.PHYSICAL_PAGE_SIZE
 
-    def keep_original_data_to_disk(self)->int:
-        with io.open(self.physical_page_path, 'wb') as f:
-            f.write(self.original_data)
-
-    def write_data_to_disk(self)->int:
+    def write_data_to_disk(self, data:bytes=None)->int:
         with io.open(self.physical_page_path, 'wb') as f:
-            f.write(self.data)
+            f.write(self.data if data == None else data)
+        Disk.mark_written(self.physical_page_path)
 
     def write_record_info_to_data(self, entry_value, id:int)->None:
         offset = self.__get_offset(id)
-        self.data = self.data[:offset] + \
-                    int(entry_value).to_bytes(Config.RECORD_FIELD_SIZE, "big", signed=True) + \
-                    self.data[offset+Config.RECORD_FIELD_SIZE:]
-        assert len(self.data) == Config.PHYSICAL_PAGE_SIZE
+        # in-place write so that concurrent writers of other records in the page don't lose updates
+        self.data[offset:offset+Config.RECORD_FIELD_SIZE] = int(entry_value).to_bytes(Config.RECORD_FIELD_SIZE, "big", signed=True)
 
     def read_record_info_from_data(self, id:int)->int:
         offset = self.__get_offset(id)
@@ -10,12 +10,57 @@ RECORD_FIELD_SIZE = 8 # bytes
 PHYSICAL_PAGE_SIZE = 4096 # bytes
 NUM_RECORDS_PER_PAGE = 512 # records
 NUM_BASE_PAGES_PER_PAGE_RANGE = 4 # base pages
+RID_BLOCK_SIZE = 64 # RIDs a thread reserves at once for its inserts (without an insert partition)
+INSERT_PARTITION = "NONE" # where concurrent inserts go: "NONE" (shared pages), "BASE_PAGE" or "PAGE_RANGE" (one per thread, each reserving a whole aligned block)
+RID_PERSIST_BATCH = 1024 # RIDs reserved on disk ahead of allocation (one metadata write per batch)
 
 # index configuration
 INDEX_ORDER_NUMBER = 4
+INDEX_CACHE_SIZE = 100000 # entries cached in memory per indexed column
 
 # bufferpool configuration
 NUM_FRAMES_IN_BUFFERPOOL = 100
 
+# log configuration
+WAL_FILE_NAME = ".wal" # write-ahead log file in the database directory
+WAL_BUFFER_SIZE = 1 << 20 # bytes of log records buffered before they are written out without a commit
+WAL_GROUP_COMMIT_DELAY = 0 # seconds a flushing committer waits for others to join its fsync (GROUP durability)
+WAL_ASYNC_FLUSH_INTERVAL = 0.05 # seconds between background log flushes (bounds what ASYNC commits can lose)
+CHECKPOINT_INTERVAL = 1 # seconds between checks whether the log grew enough for a background checkpoint
+CHECKPOINT_LOG_SIZE = 8 << 20 # bytes of log that trigger a fuzzy checkpoint (which truncates the log)
+DURABILITY = "GROUP" # when commits are durable: "FSYNC", "GROUP", "ASYNC" or "NONE" (see log_info.Durability)
+
+# lock configuration
+LOCK_TIMEOUT = None # seconds to wait for a lock before giving up (None waits forever)
+TRANSACTION_LOCK_TIMEOUT = 1 # seconds a transaction waits for a lock before its query fails (and the transaction aborts)
+LOCK_PREFER_WRITERS = False # queued writers block newly arriving readers
+LOCK_ESCALATION_THRESHOLD = 256 # RID locks an owner may hold in a page range before locking the whole page range
+LOCK_CONFLICT_POLICY = "WOUND_WAIT" # how conflicting lock requests are handled: WAIT, NO_WAIT, WAIT_DIE, WOUND_WAIT or DETECT
+
+# transaction configuration
+TRANSACTION_MODE = "2PL" # concurrency control of new transactions: "2PL" (locking), "OCC" (optimistic) or "DEFERRED" (buffered writes)
+SAVEPOINT_MAX_RETRIES = 10 # times the queries after a savepoint are rolled back and run again before the transaction aborts
+
+# transaction worker configuration
+TRANSACTION_WORKER_USE_PROCESS = False # run queries of each worker in forked processes (escapes the GIL, Linux only; commits stay in this process)
+TRANSACTION_WORKER_PROCESS_BATCH = 16 # transactions run by each forked process
+TRANSACTION_WORKER_USE_PIPELINE = False # run transactions of each worker back to back, making their commits durable in batches
+TRANSACTION_WORKER_PIPELINE_BATCH = 64 # commits of a pipelined worker made durable by one log flush
+MAX_TRANSACTION_RETRIES = 100 # times a transaction aborted by a lock conflict is retried
+TRANSACTION_RETRY_BACKOFF = 0.001 # seconds to wait before the first retry (doubles every retry)
+MAX_TRANSACTION_RETRY_BACKOFF = 0.1 # seconds
+
+# statistics configuration
+STATS_MIN_LATENCY = 1e-6 # seconds, upper bound of the lowest latency histogram bucket
+STATS_BUCKETS_PER_DOUBLING = 8 # latency histogram buckets per doubling of latency (percentiles within ~9%)
+STATS_THROUGHPUT_INTERVAL = 1 # seconds of commits counted together in throughput over time
+
+# async configuration
+ASYNC_EXECUTOR_THREADS = 8 # threads running queries of AsyncQuery/AsyncTransaction
+ASYNC_LOCK_TIMEOUT = 0.01 # seconds an async transaction blocks a thread on a lock before aborting and awaiting its retry
+
+# scan configuration
+NUM_SCAN_PROCESSES = 0 # worker processes for parallel scans of every Query (0 scans serially unless a Query asks for parallel ones, which then use one per core)
+
 # merge configuration
 MERGE_THRESHOLD = 1024
@@ -0,0 +1,78 @@
+from lstore.table import Table
+from lstore.record_info import Record, Record_Batch
+
+
+class Cursor:
+    """
+    Lazily iterates over the Records matched by a select. Records are read in page
+    order from the snapshot taken when the cursor starts, so concurrent writes are
+    neither seen nor blocked by it.
+    """
+
+    def __init__(self, table:Table, search_key, search_key_index:int, selected_columns:list=None, rollback_version:int=0, limit:int=None)->None:
+        self.table:Table          = table
+        self.num_columns:int      = table.num_columns if selected_columns == None else sum(selected_columns)
+        self.limit:int            = limit
+        self.num_records_read:int = 0
+        self.is_closed:bool       = False
+
+        self.__rows = table.scan_rows(search_key, search_key_index, selected_columns, rollback_version)
+
+    def __del__(self)->None:
+        self.close()
+
+    def __enter__(self)->"Cursor":
+        return self
+
+    def __exit__(self, *args)->None:
+        self.close()
+
+    def __iter__(self)->"Cursor":
+        return self
+
+    def __next__(self)->Record:
+        rid, columns = self.__next_row()
+        return Record(rid, self.table.key_index, columns)
+
+    def __next_row(self)->tuple[int,list]:
+        if self.is_closed: raise StopIteration
+        if self.limit != None and self.num_records_read >= self.limit:
+            self.close()
+            raise StopIteration
+        try:
+            row = next(self.__rows)
+        except StopIteration:
+            self.close()
+            raise
+        self.num_records_read += 1
+        return row
+
+    def fetch_batch(self, batch_size:int)->list[Record]:
+        """
+        Get up to batch_size next Records (empty list when exhausted)
+        """
+        rlist = list()
+        for record in self:
+            rlist.append(record)
+            if len(rlist) >= batch_size: break
+        return rlist
+
+    def fetch_column_batch(self, batch_size:int)->Record_Batch:
+        """
+        Get up to batch_size next rows as a columnar Record_Batch (empty when exhausted)
+        """
+        batch = Record_Batch(self.table.key_index, self.num_columns)
+        while len(batch) < batch_size:
+            try:
+                batch.append(*self.__next_row())
+            except StopIteration:
+                break
+        return batch
+
+    def close(self)->None:
+        """
+        Stop iterating
+        """
+        if self.is_closed: return
+        self.is_closed = True
+        self.__rows.close()
@@ -1,8 +1,11 @@
 import os
-from threading import RLock
+from threading import Event, RLock, Thread
 
+import lstore.config as Config
 from lstore.bufferpool import BUFFERPOOL
 from lstore.disk import Disk
+from lstore.log_info import LOG_MANAGER
+from lstore.recovery_info import Recovery
 from lstore.table import Table
 
 class Database():
@@ -12,9 +15,11 @@ class Database():
         self.db_path = ""
 
         self.lock:RLock = RLock()
+        self.checkpointer:Thread = None
+        self.checkpointer_stop:Event = Event()
 
     def __get_tables(self)->tuple[list[str],int]:
-        table_dirs = Disk.list_directories_in_path(self.db_path)
+        table_dirs = [_ for _ in Disk.list_directories_in_path(self.db_path) if os.path.isdir(_)]
         return (table_dirs, len(table_dirs))
 
     def __load_tables(self)->None:
@@ -27,21 +32,79 @@ class Database():
                     metadata["table_path"],
                     metadata["num_columns"],
                     metadata["key_index"],
-                    metadata["num_records"]
+                    metadata["num_records"],
+                    metadata.get("free_rid_blocks"),
                 )
 
-    def open(self, path:str)->None:
+    def __rebuild_indices(self, indexed_columns:dict[str,list[int]])->None:
+        """
+        Create indices dropped by recovery again (key indices are created when their table loads)
+        """
+        for table_path, column_indices in indexed_columns.items():
+            table = self.tables[os.path.basename(table_path)]
+            for column_index in column_indices:
+                if column_index != table.key_index: table.index.create_index(column_index)
+
+    def __flush_pages(self, lsn:int)->None:
+        BUFFERPOOL.flush_dirty_frames(lsn)
+        with self.lock:
+            tables = list(self.tables.values())
+        for table in tables:
+            table.persist_metadata()
+
+    def checkpoint(self)->None:
+        """
+        Take a fuzzy checkpoint now: write dirty pages out and truncate the log
+        (also done in the background as the log grows, and on close)
+        """
+        LOG_MANAGER.checkpoint(self.__flush_pages, BUFFERPOOL.get_dirty_page_table)
+
+    def __checkpoint_periodically(self)->None:
+        """
+        Take a fuzzy checkpoint whenever the log grew past Config.CHECKPOINT_LOG_SIZE
+        (transactions keep running meanwhile)
+        """
+        while not self.checkpointer_stop.wait(Config.CHECKPOINT_INTERVAL):
+            if LOG_MANAGER.get_log_size() >= Config.CHECKPOINT_LOG_SIZE: self.checkpoint()
+
+    def open(self, path:str, durability=Config.DURABILITY)->None:
+        """
+        Open (or create) the database at path. durability (a log_info.Durability or its
+        value) is when commits become durable, unless a transaction asks for another one.
+        """
         self.tables = dict()
         self.db_path = path
+        log_path = os.path.join(path, Config.WAL_FILE_NAME)
+        indexed_columns = dict()
         try:
             Disk.create_path_directory(path)
         except FileExistsError:
             print(f"Database at path {path} already exists.")
+            # replay the log of a database that was not closed before loading its tables
+            indexed_columns = Recovery(path, log_path).run()
             self.__load_tables()
+            self.__rebuild_indices(indexed_columns)
         else:
             print(f"Database at path {path} created.")
+        LOG_MANAGER.open(log_path, durability)
+        # recovered pages are on disk: later restarts start from here (and the log no longer ends with a CLOSE)
+        self.checkpoint()
+        self.checkpointer_stop.clear()
+        self.checkpointer = Thread(target=self.__checkpoint_periodically, name="lstore-checkpointer", daemon=True)
+        self.checkpointer.start()
 
     def close(self):
+        # nothing to close if the database was never opened (or is already closed)
+        if self.tables == None: return
+        # persist the largest RIDs handed out as high-water marks
+        for table in self.tables.values():
+            table.rid_allocator.flush()
+        # stop background checkpoints, write every dirty page out and close the log
+        self.checkpointer_stop.set()
+        if self.checkpointer != None: self.checkpointer.join()
+        self.checkpointer = None
+        self.checkpoint()
+        LOG_MANAGER.close()
         # delete tables (causes cascade of deletes)
         del self.tables
         self.tables = None
@@ -68,6 +131,8 @@ class Database():
         }
         Disk.write_to_path_metadata(table_path, metadata)
         table = Table(table_path, num_columns, key_index, 0)
+        # tables only exist in memory if the database was not opened
+        if self.tables != None: self.tables[name] = table
         return table
 
     def drop_table(self, name:str)->None:
@@ -1,7 +1,12 @@
 import io
 import os
+import threading
 from pickle import load, dump
 
+# files (and directories) this process wrote since the last Disk.sync
+unsynced_paths:set[str] = set()
+unsynced_paths_lock:threading.Lock = threading.Lock()
+
 class Disk:
 
   def create_path_directory(path:str)->None:
@@ -9,17 +14,39 @@ class Disk:
     os.mkdir(path)
 
   def list_directories_in_path(path:str)->list[str]:
-    rlist = os.listdir(path)
-    try: rlist.remove(".metadata.pkl")
-    except ValueError: pass
+    # skip metadata (and metadata being written)
+    rlist = [_ for _ in os.listdir(path) if not _.startswith(".metadata.pkl")]
     try: rlist.remove("index")
     except ValueError: pass
     rlist = [os.path.join(path, _) for _ in rlist]
     return rlist
 
   def write_to_path_metadata(path:str, metadata:dict)->None:
-    with io.open(os.path.join(path, ".metadata.pkl"), 'wb') as f:
+    # write a temporary file and rename it over the metadata, so concurrent readers never see a partial file
+    tmp_path = os.path.join(path, f".metadata.pkl.{threading.get_ident()}.tmp")
+    with io.open(tmp_path, 'wb') as f:
       dump(metadata, f)
+    os.replace(tmp_path, os.path.join(path, ".metadata.pkl"))
+    Disk.mark_written(os.path.join(path, ".metadata.pkl"))
+
+  def mark_written(path:str)->None:
+    # the file (and its directory entry) must be synced by the next Disk.sync
+    with unsynced_paths_lock:
+      unsynced_paths.add(path)
+      unsynced_paths.add(os.path.dirname(path))
+
+  def sync()->None:
+    # make the writes of this process so far durable: fsync each file and directory it wrote once
+    with unsynced_paths_lock:
+      paths = list(unsynced_paths)
+      unsynced_paths.clear()
+    for path in paths:
+      # gone since (e.g. a dropped table), or a directory that can't be opened on this platform
+      try: fd = os.open(path, os.O_RDONLY)
+      except OSError: continue
+      try: os.fsync(fd)
+      except OSError: pass
+      finally: os.close(fd)
 
   def read_from_path_metadata(path:str)->dict:
     with io.open(os.path.join(path, ".metadata.pkl"), 'rb') as f:
@@ -5,18 +5,27 @@ from threading import RLock
 
 from lstore.disk import Disk
 from lstore.bufferpool import BUFFERPOOL
-from lstore.record_info import RID
+from lstore.record_info import get_page_range_index, get_base_page_index, get_tail_page_index
 import lstore.config as Config
 
 # source for bplustree module: https://github.com/NicolasLM/bplustree
 
 
+def load_rids(data:bytes)->set[int]:
+    """
+    Unpickle a set of RIDs (older index files may still hold RID objects).
+    """
+    return {int(_) for _ in loads(data)}
+
+
 class Index_Column:
 
     def __init__(self, file_path: str, order: int) -> None:
         self.file_path = file_path
         self.tree = BPlusTree(filename=file_path, order=order)
         self.is_key = False
+        # read-through cache of decoded entries (invalidated on every write to an entry)
+        self.cache:dict[object,frozenset[int]] = dict()
 
         self.latch:RLock = RLock()
 
@@ -26,7 +35,19 @@ class Index_Column:
         """
         self.tree.close()
 
-    def __add_rid_to_non_existant_entry_value(self, entry_value, rid: RID) -> None:
+    def detach_from_disk(self) -> None:
+        """
+        Read the tree through private read-only file handles (in a forked process: the
+        inherited handles share their offset with the parent). The tree file only changes
+        on close and the WAL is append-only, so this keeps reading the tree as of the fork.
+        bplustree has no read-only mode, so this relies on its private fields (the version
+        is pinned in requirements.txt).
+        """
+        memory = self.tree._mem
+        memory._fd = open(self.file_path, mode='rb', buffering=0)
+        memory._wal._fd = open(memory._wal.filename, mode='rb', buffering=0)
+
+    def __add_rid_to_non_existant_entry_value(self, entry_value, rid: int) -> None:
         """
         Adds an RID to a non-existant entry value of the column's tree.
 
@@ -34,9 +55,10 @@ class Index_Column:
         """
         if entry_value in self.tree:
             raise KeyError
+        self.cache.pop(entry_value, None)
         self.tree[entry_value] = dumps({rid})
 
-    def __add_rid_to_existing_entry_value(self, entry_value, rid: RID) -> None:
+    def __add_rid_to_existing_entry_value(self, entry_value, rid: int) -> None:
         """
         Adds an RID to an existing entry value of the column's tree.
 
@@ -44,13 +66,14 @@ class Index_Column:
         """
         if not entry_value in self.tree:
             raise KeyError
-        entry_value_set = set(loads(self.tree[entry_value]))
+        entry_value_set = load_rids(self.tree[entry_value])
         if rid in entry_value_set:
             raise KeyError
         entry_value_set.add(rid)
+        self.cache.pop(entry_value, None)
         self.tree[entry_value] = dumps(entry_value_set)
 
-    def __remove_rid_from_entry_value(self, entry_value, removed_rid:RID) -> None:
+    def __remove_rid_from_entry_value(self, entry_value, removed_rid:int) -> None:
         """
         Deletes an RID from a specified entry value of the column's tree.
 
@@ -58,11 +81,9 @@ class Index_Column:
         """
         if not entry_value in self.tree:
             raise KeyError
-        entry_value_set = set(loads(self.tree[entry_value]))
-        for rid in entry_value_set:
-            if int(rid) == int(removed_rid):
-                entry_value_set.remove(rid)
-                break
+        entry_value_set = load_rids(self.tree[entry_value])
+        entry_value_set.discard(removed_rid)
+        self.cache.pop(entry_value, None)
         self.tree[entry_value] = dumps(entry_value_set)
 
     def set_as_primary_key(self):
@@ -75,7 +96,7 @@ class Index_Column:
             else:
                 self.__add_rid_to_existing_entry_value(entry_value, rid)
 
-    def update_value(self, old_entry_value, new_entry_value, rid: RID) -> None:
+    def update_value(self, old_entry_value, new_entry_value, rid: int) -> None:
         with self.latch:
             self.__remove_rid_from_entry_value(old_entry_value, rid)
             if not new_entry_value in self.tree:
@@ -83,23 +104,31 @@ class Index_Column:
             else:
                 self.__add_rid_to_existing_entry_value(new_entry_value, rid)
 
-    def delete_value(self, entry_value, rid: RID) -> None:
+    def delete_value(self, entry_value, rid: int) -> None:
         with self.latch:
             self.__remove_rid_from_entry_value(entry_value, rid)
 
-    def get_single_entry(self, entry_value) -> set[RID]:
+    def get_single_entry(self, entry_value) -> set[int]:
         with self.latch:
-            if not entry_value in self.tree:
-                return {}
-            return set(loads(self.tree[entry_value]))
-
-    def get_ranged_entry(self, lower_bound, upper_bound) -> set[RID]:
+            if entry_value in self.cache:
+                return set(self.cache[entry_value])
+            # single tree lookup (checking membership first would search the tree twice)
+            rids = self.tree.get(entry_value)
+            if rids is None:
+                return set()
+            if len(self.cache) >= Config.INDEX_CACHE_SIZE:
+                self.cache.clear()
+            self.cache[entry_value] = frozenset(load_rids(rids))
+            return set(self.cache[entry_value])
+
+    def get_ranged_entry(self, lower_bound, upper_bound) -> set[int]:
         with self.latch:
             rset = set()
             try:
                 for key, rids in self.tree.items():
-                    if lower_bound <= key and key <= upper_bound:
-                        rset = rset.union(set(loads(rids)))
+                    # a missing bound leaves the range open on that side
+                    if (lower_bound == None or lower_bound <= key) and (upper_bound == None or key <= upper_bound):
+                        rset = rset.union(load_rids(rids))
             except RuntimeError:  # bypasses issue w/ using iteration on tree
                 pass
             return rset
@@ -125,9 +154,19 @@ class Index:
             # always have an index for the primary key
             self.create_index(primary_key_index)
 
+    def detach_from_disk(self) -> None:
+        """
+        Stop sharing index files with the parent process (see Index_Column.detach_from_disk)
+        """
+        with self.latch:
+            for index_column in self.indices.values():
+                index_column.detach_from_disk()
+
     def __load_column_indices(self) -> None:
         with self.latch:
             for column_db_file in os.listdir(self.index_dir_path):
+                # skip tree WAL files
+                if not column_db_file.endswith(".db"): continue
                 column_index = int(column_db_file.removesuffix(".db"))
                 column_index_path = os.path.join(self.index_dir_path, column_db_file)
                 self.indices[column_index] = Index_Column(column_index_path, self.order)
@@ -162,12 +201,14 @@ class Index:
             # add column index values and their respective RIDs to the new tree
             num_records:int = Disk.read_from_path_metadata(os.path.dirname(self.index_dir_path))["num_records"]
             for rid in range(1, num_records+1):
-                rid = RID(rid)
                 # get info of rid's base page
-                base_page_path = os.path.join(os.path.dirname(self.index_dir_path), f"PR{rid.get_page_range_index()}", f"BP{rid.get_base_page_index()}")
-                assert os.path.isdir(base_page_path)
+                base_page_path = os.path.join(os.path.dirname(self.index_dir_path), f"PR{get_page_range_index(rid)}", f"BP{get_base_page_index(rid)}")
+                # skip RIDs that were allocated but never written, or deleted
+                if not os.path.isdir(base_page_path) or BUFFERPOOL.is_record_deleted(rid, base_page_path): continue
                 tid = BUFFERPOOL.get_indirection_tid(rid, base_page_path)
-                tail_page_path = os.path.join(os.path.dirname(self.index_dir_path), f"PR{tid.get_page_range_index()}", f"TP{tid.get_tail_page_index()}")
+                tail_page_path = os.path.join(os.path.dirname(self.index_dir_path), f"PR{get_page_range_index(rid)}", f"TP{get_tail_page_index(tid)}")
+                # deleted records start their versions with a tombstone
+                if tid != -1 and BUFFERPOOL.is_record_deleted(tid, tail_page_path): continue
                 schema_encoding = BUFFERPOOL.get_schema_encoding(rid, base_page_path)
                 if not schema_encoding[column_index]: entry_val = BUFFERPOOL.get_record_entry(rid, base_page_path, column_index)
                 else:                                 entry_val = BUFFERPOOL.get_record_entry(tid, tail_page_path, column_index)
@@ -187,10 +228,11 @@ class Index:
             if self.__is_index_key(column_index):
                 raise ValueError
             assert column_index in self.indices
-            del self.indices[column_index]
+            # close the tree now (prepared selects may still reference the column), or its WAL file would outlive it
+            self.indices.pop(column_index).tree.close()
             os.remove(self.__get_column_index_filename(column_index))
 
-    def insert(self, record_columns:tuple, rid:RID) -> None:
+    def insert(self, record_columns:tuple, rid:int) -> None:
         """
         Adds record information to the created index columns.
         """
@@ -200,7 +242,7 @@ class Index:
                 if i in self.indices:
                     self.indices[i].add_value(record_entry_value, rid)
 
-    def delete(self, record_columns:tuple, rid:RID) -> None:
+    def delete(self, record_columns:tuple, rid:int) -> None:
         """
         Deletes record information from the created index columns.
         """
@@ -210,7 +252,7 @@ class Index:
                 if i in self.indices:
                     self.indices[i].delete_value(record_entry_value, rid)
 
-    def locate(self, entry_value, column_index: int) -> set[RID]:
+    def locate(self, entry_value, column_index: int) -> set[int]:
         """
         Returns the location of all records with the given value
         within a specified column.
@@ -220,10 +262,10 @@ class Index:
                 raise KeyError
             return self.indices[column_index].get_single_entry(entry_value)
 
-    def locate_range(self, begin, end, column_index: int) -> set[RID]:
+    def locate_range(self, begin, end, column_index: int) -> set[int]:
         """
         Returns the RIDs of all records with values in a specified column
-        between "begin" and "end" (bounds-inclusive).
+        between "begin" and "end" (bounds-inclusive, None for an open end).
         """
         with self.latch:
             if not column_index in self.indices:
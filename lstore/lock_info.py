@@ -1,51 +1,425 @@
 import threading
-from collections import defaultdict
+from collections import deque
+from enum import Enum
+from itertools import count
+from math import inf
+from time import monotonic
 
+import lstore.config as Config
+
+
+class Lock_Mode(Enum):
+    IS = 0
+    IX = 1
+    S = 2
+    SIX = 3
+    X = 4
+
+
+class Conflict_Policy(Enum):
+    WAIT = 0       # wait for the lock (until the lock timeout)
+    NO_WAIT = 1    # fail immediately
+    WAIT_DIE = 2   # older requesters wait, younger ones fail
+    WOUND_WAIT = 3 # older requesters wound (fail) younger holders, younger ones wait
+    DETECT = 4     # wait, failing the youngest owner of any cycle in the waits-for graph
+
+
+# modes that can be held by different owners at the same time
+COMPATIBLE_MODES:dict[Lock_Mode,set[Lock_Mode]] = {
+    Lock_Mode.IS:  {Lock_Mode.IS, Lock_Mode.IX, Lock_Mode.S, Lock_Mode.SIX},
+    Lock_Mode.IX:  {Lock_Mode.IS, Lock_Mode.IX},
+    Lock_Mode.S:   {Lock_Mode.IS, Lock_Mode.S},
+    Lock_Mode.SIX: {Lock_Mode.IS},
+    Lock_Mode.X:   set(),
+}
+
+# intention mode taken on every ancestor of a locked resource
+INTENTION_MODES:dict[Lock_Mode,Lock_Mode] = {
+    Lock_Mode.IS:  Lock_Mode.IS,
+    Lock_Mode.S:   Lock_Mode.IS,
+    Lock_Mode.IX:  Lock_Mode.IX,
+    Lock_Mode.SIX: Lock_Mode.IX,
+    Lock_Mode.X:   Lock_Mode.IX,
+}
+
+SHARED_MODES:set[Lock_Mode] = {Lock_Mode.IS, Lock_Mode.S}
+
+# use Config.LOCK_TIMEOUT (or Config.TRANSACTION_LOCK_TIMEOUT for transactions)
+DEFAULT_TIMEOUT = -1
+
+
+def combine_modes(held_mode:Lock_Mode, requested_mode:Lock_Mode)->Lock_Mode:
+    """
+    Get the weakest mode that is at least as strong as both modes
+    """
+    if held_mode == requested_mode: return held_mode
+    modes = {held_mode, requested_mode}
+    if Lock_Mode.X in modes:                        return Lock_Mode.X
+    if Lock_Mode.SIX in modes:                      return Lock_Mode.SIX
+    if modes == {Lock_Mode.IX, Lock_Mode.S}:        return Lock_Mode.SIX
+    if Lock_Mode.S in modes:                        return Lock_Mode.S
+    return Lock_Mode.IX
+
+
+def is_covered_by(held_mode:Lock_Mode, requested_mode:Lock_Mode)->bool:
+    """
+    Check if an ancestor held in held_mode already grants requested_mode on its descendants
+    """
+    if held_mode == Lock_Mode.X: return True
+    return held_mode in (Lock_Mode.S, Lock_Mode.SIX) and requested_mode in SHARED_MODES
+
+
+class Resource_Lock:
+
+    def __init__(self, mutex:threading.Lock)->None:
+        self.holders:dict[object,Lock_Mode] = dict()
+        self.wait_queue:deque               = deque() # [[owner, mode]]
+        self.condition                      = threading.Condition(mutex)
+
+    def is_free(self)->bool:
+        return not len(self.holders) and not len(self.wait_queue)
 
 
 class Lock_Manager:
+    """
+    Multi-granularity lock manager. Resources are tuples whose prefixes are their
+    ancestors: (table path,), (table path, page range index), (table path, page range
+    index, RID). Locking a resource takes the matching intention lock on each ancestor
+    first. Blocked requests wait in a FIFO queue per resource. An owner holding more
+    than Config.LOCK_ESCALATION_THRESHOLD RID locks in a page range is escalated to a
+    page range lock.
+
+    Locks taken while a transaction runs on the thread belong to the transaction and
+    are kept until it commits or aborts (strict 2PL); other operations get their own
+    owner and release their locks when they finish.
+
+    Conflicting requests are handled according to the conflict policy. Owners are
+    ordered by timestamp (smaller is older); a transaction keeps its timestamp when it
+    is retried so it eventually becomes the oldest. A wounded owner fails its pending
+    and next lock requests, which makes its transaction abort.
+    """
+
+    def __init__(self, prefer_writers:bool=Config.LOCK_PREFER_WRITERS, conflict_policy=Config.LOCK_CONFLICT_POLICY)->None:
+        if isinstance(conflict_policy, str):
+            conflict_policy = Conflict_Policy[conflict_policy]
+        self.prefer_writers:bool                           = prefer_writers
+        self.conflict_policy:Conflict_Policy               = conflict_policy
+        self.locks:dict[tuple,Resource_Lock]               = dict()
+        self.owner_locks:dict[object,dict[tuple,Lock_Mode]] = dict()
+        self.owner_row_counts:dict[object,dict[tuple,int]]  = dict()
+        self.timestamps:dict[object,int]                   = dict()
+        self.waiting:dict[object,tuple[Resource_Lock,list]] = dict() # owner: (lock, waiter) it is queued on
+        self.wounded:set                                   = set()
+        self.conflicts:set                                 = set()   # owners that had a lock request fail
+
+        self.mutex:threading.Lock = threading.Lock()
+        self.owner_ids            = count()
+        self.timestamp_counter    = count()
+        self.context              = threading.local() # transaction running on the thread
+
+    def new_owner(self)->str:
+        """
+        Get a fresh owner for locks taken by a single operation
+        """
+        return f"op{next(self.owner_ids)}"
 
-    def __init__(self)->None:
-        self.locks:defaultdict[int,RWL] = defaultdict(RWL)
+    def set_conflict_policy(self, conflict_policy)->None:
+        """
+        Change how conflicting lock requests are handled (Conflict_Policy or its name)
+        """
+        if isinstance(conflict_policy, str):
+            conflict_policy = Conflict_Policy[conflict_policy]
+        with self.mutex:
+            self.conflict_policy = conflict_policy
 
-    def acquire_read(self, page_range_index:int, search_key=None)->bool:
-        return self.locks[page_range_index].acquire_read()
+    def new_timestamp(self)->int:
+        """
+        Get a timestamp younger than every timestamp handed out so far
+        """
+        with self.mutex:
+            return next(self.timestamp_counter)
 
-    def acquire_write(self, page_range_index:int)->bool:
-        return self.locks[page_range_index].acquire_write()
-    
-    def release_read(self, page_range_index:int)->None:
-        self.locks[page_range_index].release_read()
+    def begin_transaction(self, transaction_id:int, timestamp:int=None, lock_timeout:float=DEFAULT_TIMEOUT)->None:
+        """
+        Make locks taken by this thread belong to the transaction. Pass the timestamp
+        of the first attempt when retrying so the transaction keeps its age.
+        lock_timeout overrides Config.TRANSACTION_LOCK_TIMEOUT for its lock requests.
+        """
+        self.context.transaction_id = transaction_id
+        self.context.lock_timeout = Config.TRANSACTION_LOCK_TIMEOUT if lock_timeout == DEFAULT_TIMEOUT else lock_timeout
+        self.context.lock_wait_time = 0
+        with self.mutex:
+            self.timestamps[transaction_id] = next(self.timestamp_counter) if timestamp == None else timestamp
 
-    def release_write(self, page_range_index:int)->None:
-        self.locks[page_range_index].release_write()
+    def end_transaction(self, transaction_id:int)->None:
+        """
+        Release the transaction's locks (on commit/abort)
+        """
+        if getattr(self.context, "transaction_id", None) == transaction_id:
+            self.context.transaction_id = None
+        self.release_all(transaction_id)
 
+    def get_lock_wait_time(self)->float:
+        """
+        Get seconds the transaction running (or last run) on this thread waited for locks
+        """
+        return getattr(self.context, "lock_wait_time", 0)
 
-class RWL:
+    def get_owner(self):
+        """
+        Get owner for the locks of an operation: the running transaction if any, else a fresh owner
+        """
+        transaction_id = getattr(self.context, "transaction_id", None)
+        if transaction_id != None: return transaction_id
+        return self.new_owner()
 
-    def __init__(self)->None:
-        self.num_readers:int = 0
-        self.is_writer:bool  = False
-        self.lock            = threading.RLock()
+    def is_transaction_owner(self, owner)->bool:
+        return owner == getattr(self.context, "transaction_id", None)
 
-    def acquire_read(self)->bool:
-        with self.lock:
-            if self.is_writer:
+    def had_conflict(self, owner)->bool:
+        """
+        Check if a lock request of owner failed (timed out, died, was wounded or deadlocked)
+        """
+        with self.mutex:
+            return owner in self.conflicts
+
+    def clear_conflicts(self, owner)->bool:
+        """
+        Forget that lock requests of owner failed, so a transaction can retry them after
+        rolling back to a savepoint. Returns False if owner was wounded (it must abort
+        to let an older owner in).
+        """
+        with self.mutex:
+            if owner in self.wounded: return False
+            self.conflicts.discard(owner)
+            return True
+
+    def release_operation(self, owner)->None:
+        """
+        Release an operation's locks, unless they belong to a transaction
+        """
+        if not self.is_transaction_owner(owner):
+            self.release_all(owner)
+
+    def release_operation_resource(self, owner, resource:tuple)->None:
+        """
+        Release a lock early (e.g. when a scan leaves a page range), unless it belongs to a transaction
+        """
+        if not self.is_transaction_owner(owner):
+            self.release(owner, resource)
+
+    def __can_grant(self, lock:Resource_Lock, waiter:list)->bool:
+        owner, mode = waiter
+        for holder, held_mode in lock.holders.items():
+            if holder != owner and not held_mode in COMPATIBLE_MODES[mode]: return False
+        # upgrades skip the queue (waiting behind requests that wait on us would deadlock)
+        if owner in lock.holders: return True
+        for queued_waiter in lock.wait_queue:
+            if queued_waiter is waiter:
+                if not self.prefer_writers or not mode in SHARED_MODES: return True
+            elif not queued_waiter[1] in COMPATIBLE_MODES[mode]:
+                return False
+        return True
+
+    def __get_blockers(self, lock:Resource_Lock, waiter:list)->list:
+        """
+        Get owners waiter is waiting for: incompatible holders and incompatible requests queued ahead of it
+        """
+        owner, mode = waiter
+        blockers = [holder for holder, held_mode in lock.holders.items() if holder != owner and not held_mode in COMPATIBLE_MODES[mode]]
+        if owner in lock.holders: return blockers
+        for queued_waiter in lock.wait_queue:
+            if queued_waiter is waiter: break
+            if queued_waiter[0] != owner and not queued_waiter[1] in COMPATIBLE_MODES[mode]:
+                blockers.append(queued_waiter[0])
+        return blockers
+
+    def __is_older(self, owner, other_owner)->bool:
+        return self.timestamps.get(owner, inf) < self.timestamps.get(other_owner, inf)
+
+    def __wound(self, owner)->None:
+        self.wounded.add(owner)
+        # wake the victim if it is waiting so it fails right away
+        if owner in self.waiting:
+            self.waiting[owner][0].condition.notify_all()
+
+    def __find_deadlock_victim(self, owner):
+        """
+        Search the waits-for graph for a cycle through owner. Returns the youngest
+        owner of the cycle, or None if there is no cycle.
+        """
+        stack = [(owner, [owner])]
+        visited = set()
+        while len(stack):
+            waiting_owner, path = stack.pop()
+            if not waiting_owner in self.waiting: continue
+            for blocker in self.__get_blockers(*self.waiting[waiting_owner]):
+                if blocker == owner:
+                    return max(path, key=lambda _: self.timestamps.get(_, inf))
+                if not blocker in visited:
+                    visited.add(blocker)
+                    stack.append((blocker, path + [blocker]))
+        return None
+
+    def __resolve_conflict(self, owner, lock:Resource_Lock, waiter:list)->bool:
+        """
+        Apply the conflict policy to a blocked request. Returns False if the request must fail.
+        """
+        if owner in self.wounded: return False
+        match self.conflict_policy:
+            case Conflict_Policy.NO_WAIT:
                 return False
-            self.num_readers += 1
+            case Conflict_Policy.WAIT_DIE:
+                return all(self.__is_older(owner, blocker) for blocker in self.__get_blockers(lock, waiter))
+            case Conflict_Policy.WOUND_WAIT:
+                for blocker in self.__get_blockers(lock, waiter):
+                    if self.__is_older(owner, blocker): self.__wound(blocker)
+            case Conflict_Policy.DETECT:
+                victim = self.__find_deadlock_victim(owner)
+                if victim == owner: return False
+                if victim != None: self.__wound(victim)
         return True
 
-    def acquire_write(self)->bool:
-        with self.lock:
-            if self.is_writer or self.num_readers:
+    def __acquire_one(self, owner, resource:tuple, mode:Lock_Mode, blocking:bool, timeout:float)->bool:
+        if not resource in self.locks:
+            self.locks[resource] = Resource_Lock(self.mutex)
+        lock = self.locks[resource]
+        if owner in lock.holders:
+            mode = combine_modes(lock.holders[owner], mode)
+            if mode == lock.holders[owner]: return True
+        waiter = [owner, mode]
+        if not self.__can_grant(lock, waiter):
+            if not blocking: return False
+            wait_start = monotonic()
+            deadline = None if timeout == None else wait_start + timeout
+            lock.wait_queue.append(waiter)
+            self.waiting[owner] = (lock, waiter)
+            try:
+                is_granted = False
+                while not self.__can_grant(lock, waiter):
+                    if not self.__resolve_conflict(owner, lock, waiter): return False
+                    remaining = None if deadline == None else deadline - monotonic()
+                    if remaining != None and remaining <= 0: return False
+                    lock.condition.wait(remaining)
+                is_granted = True
+            finally:
+                self.context.lock_wait_time = self.get_lock_wait_time() + monotonic() - wait_start
+                lock.wait_queue.remove(waiter)
+                del self.waiting[owner]
+                # waiters queued behind this one may now be grantable
+                lock.condition.notify_all()
+                if not is_granted and lock.is_free():
+                    del self.locks[resource]
+        lock.holders[owner] = mode
+        if not owner in self.owner_locks:
+            self.owner_locks[owner] = dict()
+        self.owner_locks[owner][resource] = mode
+        return True
+
+    def __release_one(self, owner, resource:tuple)->None:
+        lock = self.locks[resource]
+        del lock.holders[owner]
+        del self.owner_locks[owner][resource]
+        lock.condition.notify_all()
+        if lock.is_free():
+            del self.locks[resource]
+
+    def __escalate(self, owner, page_range_resource:tuple)->None:
+        row_resources = [_ for _ in self.owner_locks[owner] if len(_) == len(page_range_resource) + 1 and _[:-1] == page_range_resource]
+        mode = Lock_Mode.S
+        if any(not self.owner_locks[owner][_] in SHARED_MODES for _ in row_resources): mode = Lock_Mode.X
+        # escalation is an optimization: give up instead of waiting
+        if not self.__acquire_one(owner, page_range_resource, mode, False, None): return
+        for row_resource in row_resources:
+            self.__release_one(owner, row_resource)
+        self.owner_row_counts[owner][page_range_resource] = 0
+
+    def acquire(self, owner, resource:tuple, mode:Lock_Mode, blocking:bool=True, timeout:float=DEFAULT_TIMEOUT)->bool:
+        """
+        Lock resource (and its ancestors in intention mode) for owner.
+        Returns False if the lock could not be acquired in time.
+        """
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.context.lock_timeout if self.is_transaction_owner(owner) else Config.LOCK_TIMEOUT
+        with self.mutex:
+            if not owner in self.timestamps:
+                self.timestamps[owner] = next(self.timestamp_counter)
+            if owner in self.wounded:
+                self.conflicts.add(owner)
                 return False
-            self.is_writer = True
+            held_locks = self.owner_locks.get(owner, dict())
+            # already covered by a coarser lock (e.g. after escalation)
+            for i in range(1, len(resource)):
+                if resource[:i] in held_locks and is_covered_by(held_locks[resource[:i]], mode): return True
+
+            is_new_lock = not resource in held_locks
+            for i in range(1, len(resource) + 1):
+                requested_mode = mode if i == len(resource) else INTENTION_MODES[mode]
+                if not self.__acquire_one(owner, resource[:i], requested_mode, blocking, timeout):
+                    self.conflicts.add(owner)
+                    return False
+
+            # count RID locks per page range for escalation
+            if len(resource) == 3 and is_new_lock:
+                if not owner in self.owner_row_counts:
+                    self.owner_row_counts[owner] = dict()
+                row_counts = self.owner_row_counts[owner]
+                row_counts[resource[:2]] = row_counts.get(resource[:2], 0) + 1
+                if row_counts[resource[:2]] > Config.LOCK_ESCALATION_THRESHOLD:
+                    self.__escalate(owner, resource[:2])
         return True
 
-    def release_read(self)->None:
-        with self.lock:
-            self.num_readers -= 1
+    def release(self, owner, resource:tuple)->None:
+        """
+        Release a single lock held by owner (its descendants' locks are released too)
+        """
+        with self.mutex:
+            for held_resource in list(self.owner_locks.get(owner, dict())):
+                if held_resource[:len(resource)] == resource:
+                    self.__release_one(owner, held_resource)
+            for page_range_resource in list(self.owner_row_counts.get(owner, dict())):
+                if page_range_resource[:len(resource)] == resource:
+                    del self.owner_row_counts[owner][page_range_resource]
+
+    def release_all(self, owner)->None:
+        """
+        Release every lock held by owner (and forget about it)
+        """
+        with self.mutex:
+            for held_resource in list(self.owner_locks.get(owner, dict())):
+                self.__release_one(owner, held_resource)
+            self.owner_locks.pop(owner, None)
+            self.owner_row_counts.pop(owner, None)
+            self.timestamps.pop(owner, None)
+            self.wounded.discard(owner)
+            self.conflicts.discard(owner)
+
+    def get_held_mode(self, owner, resource:tuple)->Lock_Mode:
+        """
+        Get mode owner holds resource in (None if not held)
+        """
+        with self.mutex:
+            return self.owner_locks.get(owner, dict()).get(resource)
+
+    def get_owner_locks(self, owner)->dict[tuple,Lock_Mode]:
+        """
+        Get {resource: mode} of every lock held by owner
+        """
+        with self.mutex:
+            return dict(self.owner_locks.get(owner, dict()))
+
+    def get_lock_holders(self)->dict[tuple,dict]:
+        """
+        Get {resource: {owner: mode}} of every held lock, plus queued requests
+        under the "waiting" key of each resource (for diagnostics)
+        """
+        with self.mutex:
+            rdict = dict()
+            for resource, lock in self.locks.items():
+                rdict[resource] = {owner: mode.name for owner, mode in lock.holders.items()}
+                if len(lock.wait_queue):
+                    rdict[resource]["waiting"] = [(owner, mode.name) for owner, mode in lock.wait_queue]
+            return rdict
+
 
-    def release_write(self)->None:
-        with self.lock:
-            self.is_writer = False
+LOCK_MANAGER = Lock_Manager()
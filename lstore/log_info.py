@@ -0,0 +1,450 @@
+import io
+import os
+import threading
+from enum import Enum
+from pickle import dumps, loads
+from struct import Struct
+from time import sleep
+from zlib import crc32
+
+import lstore.config as Config
+from lstore.disk import Disk
+
+# length and checksum of every log record (a torn record at the end of the log is ignored)
+RECORD_HEADER = Struct(">II")
+
+
+class Log_Type(Enum):
+    WRITE = 0      # entries of a page were overwritten (before and after images)
+    COMMIT = 1
+    ABORT = 2      # the transaction's writes were rolled back (by the WRITE records before it)
+    CHECKPOINT = 3 # pages hold every write before its redo LSN (see Log_Manager.checkpoint)
+    CLOSE = 4      # the database was closed after a checkpoint: its pages and indices are all on disk
+
+
+class Durability(Enum):
+    FSYNC = "FSYNC" # a commit waits until the log is fsynced up to it
+    GROUP = "GROUP" # same, but the flushing committer waits Config.WAL_GROUP_COMMIT_DELAY for others to share its fsync
+    ASYNC = "ASYNC" # a commit does not wait, the log is flushed every Config.WAL_ASYNC_FLUSH_INTERVAL seconds
+    NONE = "NONE"   # nothing is logged: changes are only durable once a checkpoint or close writes the pages out
+
+
+class Log_Record:
+    """
+    Physiological log record: a WRITE holds the page path, the RID/TID it wrote and
+    (column, old value, new value) of every entry it overwrote. prev_lsn chains the
+    records of a transaction (None for writes outside transactions). A CHECKPOINT
+    holds (redo LSN, end LSN, dirty page table, active transactions) as its data.
+    """
+    __slots__ = ("lsn", "type", "transaction_id", "prev_lsn", "page_path", "id", "writes", "data")
+
+    def __init__(self, lsn:int, type:Log_Type, transaction_id=None, prev_lsn:int=None, page_path:str=None, id:int=None, writes:list=None, data=None)->None:
+        self.lsn:int              = lsn
+        self.type:Log_Type        = type
+        self.transaction_id       = transaction_id
+        self.prev_lsn:int         = prev_lsn
+        self.page_path:str        = page_path
+        self.id:int               = id
+        self.writes:list[tuple[int,int,int]] = writes
+        self.data                 = data
+
+    def to_bytes(self)->bytes:
+        payload = dumps((self.lsn, self.type.value, self.transaction_id, self.prev_lsn, self.page_path, self.id, self.writes, self.data))
+        return RECORD_HEADER.pack(len(payload), crc32(payload)) + payload
+
+    @staticmethod
+    def from_bytes(payload:bytes)->"Log_Record":
+        lsn, type, transaction_id, prev_lsn, page_path, id, writes, data = loads(payload)
+        return Log_Record(lsn, Log_Type(type), transaction_id, prev_lsn, page_path, id, writes, data)
+
+
+class Undo_Record:
+    """
+    Undo of one change of a running transaction: a page write (restored from its
+    before-images) or an unlogged change, e.g. to an index (undone by undo(*args)).
+    A change deferred until commit (done by on_commit(*args)) has nothing to undo.
+    """
+    __slots__ = ("page_path", "id", "writes", "undo", "on_commit", "args")
+
+    def __init__(self, page_path:str=None, id:int=None, writes:list=None, undo=None, on_commit=None, args:tuple=None)->None:
+        self.page_path:str                   = page_path
+        self.id:int                          = id
+        self.writes:list[tuple[int,int,int]] = writes
+        self.undo                            = undo
+        self.on_commit                       = on_commit
+        self.args:tuple                      = args
+
+    def get_undo_entries(self)->list[tuple[int,int]]:
+        """
+        Get (physical page index, value) entries that undo the page write
+        """
+        # a record written to an empty slot is only unlinked (emptied RID): readers
+        # without locks may still be reading its other entries
+        for column, old, new in self.writes:
+            if column == Config.RID_COLUMN and old == 0 and new != 0:
+                return [(Config.RID_COLUMN, 0)]
+        return [(column, old) for column, old, _ in reversed(self.writes)]
+
+
+def read_log_records(log_path:str, with_offsets:bool=False):
+    """
+    Yield records of the log file at log_path in LSN order (stops at a torn record),
+    or (byte offset, record) pairs if with_offsets
+    """
+    if not os.path.isfile(log_path): return
+    with io.open(log_path, 'rb') as f:
+        while True:
+            offset = f.tell()
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size: return
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or crc32(payload) != checksum: return
+            yield (offset, Log_Record.from_bytes(payload)) if with_offsets else Log_Record.from_bytes(payload)
+
+
+def copy_file_bytes(source, destination, start:int, end:int)->None:
+    """
+    Copy bytes start to end of the open file source to the end of the open file destination
+    """
+    source.seek(start)
+    while start < end:
+        data = source.read(min(end - start, Config.WAL_BUFFER_SIZE))
+        if not len(data): return
+        destination.write(data)
+        start += len(data)
+
+
+class Log_Manager:
+    """
+    Write-ahead log of a database. Page writes are appended to an in-memory buffer;
+    a commit appends its COMMIT record and waits until the log is durable up to it.
+    Concurrent committers share one write+fsync (group commit): the first one to
+    flush writes out everything buffered so far, the others wait for it. Data pages
+    are written lazily, but never before the log records of their writes (see
+    Frame.write_frame_to_disk).
+    """
+
+    def __init__(self)->None:
+        self.log_path:str          = None
+        self.file                  = None
+        self.next_lsn:int          = 1
+        self.flushed_lsn:int       = 0      # log is durable up to here
+        self.buffer:list[bytes]    = list() # records appended since the last flush
+        self.buffer_size:int       = 0      # bytes
+        self.is_flushing:bool      = False
+        self.is_detached:bool      = False
+        self.durability:Durability = Durability(Config.DURABILITY) # of the database (commits may ask for another one)
+        self.flusher:threading.Thread = None # flushes the log in the background for ASYNC commits
+        self.last_lsns:dict[object,int] = dict() # last LSN of each running transaction
+        self.first_lsns:dict[object,int] = dict() # first LSN of each running transaction (oldest record its rollback needs)
+        self.log_size:int          = 0      # bytes logged since the last checkpoint
+        self.checkpoint_mutex:threading.Lock = threading.Lock()
+
+        self.condition:threading.Condition = threading.Condition()
+        self.context                       = threading.local() # transaction running on the thread and its undo log
+
+    def open(self, log_path:str, durability=Config.DURABILITY)->None:
+        """
+        Append to the log at log_path (LSNs continue after its last record)
+        """
+        self.close()
+        with self.condition:
+            self.durability = Durability(durability)
+            self.log_path = log_path
+            self.next_lsn = 1
+            for record in read_log_records(log_path):
+                self.next_lsn = record.lsn + 1
+            self.flushed_lsn = self.next_lsn - 1
+            self.file = io.open(log_path, 'ab')
+
+    def close(self)->None:
+        """
+        Flush and close the log (after the checkpoint of a database closing)
+        """
+        if self.file == None: return
+        # tells recovery the database was closed cleanly
+        if not self.is_detached: self.__append(Log_Type.CLOSE)
+        self.flush()
+        with self.condition:
+            # a background flush may still be writing
+            while self.is_flushing: self.condition.wait()
+            self.file.close()
+            self.file = None
+            self.log_path = None
+            self.last_lsns = dict()
+            self.first_lsns = dict()
+
+    def detach(self)->None:
+        """
+        Never write to the log file from now on. Used by forked worker processes,
+        which must not append (copies of) the parent's buffered records.
+        """
+        with self.condition:
+            self.is_detached = True
+            self.buffer = list()
+            self.buffer_size = 0
+
+    def __is_logging(self)->bool:
+        return self.file != None and self.durability != Durability.NONE
+
+    def __flush_periodically(self)->None:
+        while True:
+            sleep(Config.WAL_ASYNC_FLUSH_INTERVAL)
+            with self.condition:
+                if self.file == None:
+                    self.flusher = None
+                    return
+            self.flush()
+
+    def __start_flusher(self)->None:
+        with self.condition:
+            if self.flusher != None or self.is_detached: return
+            self.flusher = threading.Thread(target=self.__flush_periodically, daemon=True)
+            self.flusher.start()
+
+    def __append(self, type:Log_Type, transaction_id=None, page_path:str=None, id:int=None, writes:list=None, data=None)->int:
+        with self.condition:
+            lsn = self.next_lsn
+            self.next_lsn += 1
+            record = Log_Record(lsn, type, transaction_id, self.last_lsns.get(transaction_id), page_path, id, writes, data)
+            if transaction_id != None:
+                self.last_lsns[transaction_id] = lsn
+                self.first_lsns.setdefault(transaction_id, lsn)
+            data = record.to_bytes()
+            self.buffer.append(data)
+            self.buffer_size += len(data)
+            self.log_size += len(data)
+            is_full = self.buffer_size >= Config.WAL_BUFFER_SIZE
+        # long runs of writes without commits are written out as they go
+        if is_full: self.flush(lsn)
+        return lsn
+
+    def begin_transaction(self, transaction_id)->None:
+        """
+        Make page writes of this thread belong to the transaction
+        """
+        self.context.transaction_id = transaction_id
+        self.context.undo_log = list() # changes of this run of the transaction (latest last)
+        self.context.is_undoing = False
+
+    def __get_undo_log(self)->list[Undo_Record]:
+        """
+        Get undo log of the transaction running on this thread (None if there is none or it is rolling back)
+        """
+        if getattr(self.context, "transaction_id", None) == None or self.context.is_undoing: return None
+        return self.context.undo_log
+
+    def log_write(self, page_path:str, id:int, writes:list[tuple[int,int,int]])->int:
+        """
+        Log (column, old value, new value) entries about to be written to id in the page
+        at page_path. Returns the LSN of the record (0 if there is no log).
+        """
+        undo_log = self.__get_undo_log()
+        if undo_log != None: undo_log.append(Undo_Record(page_path, id, writes))
+        if not self.__is_logging(): return 0
+        return self.__append(Log_Type.WRITE, getattr(self.context, "transaction_id", None), page_path, id, writes)
+
+    def log_undo(self, undo, *args)->None:
+        """
+        Make a rollback of the transaction running on this thread call undo(*args), for
+        changes that are not page writes (indices, RID allocation)
+        """
+        undo_log = self.__get_undo_log()
+        if undo_log != None: undo_log.append(Undo_Record(undo=undo, args=args))
+
+    def log_commit(self, on_commit, *args)->bool:
+        """
+        Make the commit of the transaction running on this thread call on_commit(*args),
+        for changes other transactions must not see before (a rollback drops it). Returns
+        False if there is no transaction: the caller's own write commits when it ends.
+        """
+        undo_log = self.__get_undo_log()
+        if undo_log == None: return False
+        undo_log.append(Undo_Record(on_commit=on_commit, args=args))
+        return True
+
+    def end_commit(self)->None:
+        """
+        Make the changes deferred with log_commit by the transaction that committed on this thread
+        """
+        on_commit_records = getattr(self.context, "on_commit_records", list())
+        self.context.on_commit_records = list()
+        for undo_record in on_commit_records:
+            undo_record.on_commit(*undo_record.args)
+
+    def get_savepoint(self)->int:
+        """
+        Get a savepoint of the transaction running on this thread, to roll back to with rollback_transaction
+        """
+        return len(getattr(self.context, "undo_log", list()))
+
+    def rollback_transaction(self, transaction_id, write_entries, savepoint:int=0)->None:
+        """
+        Undo the changes the transaction made on this thread since savepoint (see
+        get_savepoint; all of them by default), latest first (a run of a transaction
+        stays on one thread, see begin_transaction). Page writes get their
+        before-images back through write_entries(id, page_path, entries); these are
+        logged as writes of the transaction, so recovery repeats them. The cost is
+        proportional to the changes undone.
+        """
+        undo_log = getattr(self.context, "undo_log", list())
+        self.context.transaction_id = transaction_id
+        self.context.is_undoing = True
+        try:
+            while len(undo_log) > savepoint:
+                undo_record = undo_log.pop()
+                if undo_record.on_commit != None: continue
+                if undo_record.undo != None: undo_record.undo(*undo_record.args)
+                else: write_entries(undo_record.id, undo_record.page_path, undo_record.get_undo_entries())
+        finally:
+            self.context.is_undoing = False
+
+    def __end_transaction(self, transaction_id, type:Log_Type)->int:
+        self.context.transaction_id = None
+        if type == Log_Type.COMMIT:
+            self.context.on_commit_records = [_ for _ in self.context.undo_log if _.on_commit != None]
+        self.context.undo_log = list()
+        if not self.__is_logging(): return 0
+        lsn = self.__append(type, transaction_id)
+        with self.condition:
+            self.last_lsns.pop(transaction_id, None)
+            self.first_lsns.pop(transaction_id, None)
+        return lsn
+
+    def commit_transaction(self, transaction_id, durability=None)->int:
+        """
+        Log the commit of the transaction and wait until it is durable, as required by
+        durability (the database's if None). The transaction can only be durable if the
+        database logs (its durability is not NONE). Returns the LSN of the commit (0 if
+        it was not logged).
+        """
+        lsn = self.__end_transaction(transaction_id, Log_Type.COMMIT)
+        self.make_durable(lsn, durability)
+        return lsn
+
+    def make_durable(self, lsn:int, durability=None)->None:
+        """
+        Wait until the log is durable up to lsn, as required by durability (the database's if None)
+        """
+        if not lsn: return
+        match Durability(durability or self.durability):
+            case Durability.FSYNC: self.flush(lsn)
+            case Durability.GROUP: self.flush(lsn, is_grouped=True)
+            case Durability.ASYNC: self.__start_flusher()
+
+    def abort_transaction(self, transaction_id)->None:
+        """
+        Log the end of the transaction after its rollback (see rollback_transaction)
+        """
+        self.__end_transaction(transaction_id, Log_Type.ABORT)
+
+    def flush(self, lsn:int=None, is_grouped:bool=False)->None:
+        """
+        Make the log durable up to lsn (everything appended so far if None). A grouped
+        flush first gives concurrent committers a moment to join it.
+        """
+        with self.condition:
+            if lsn == None: lsn = self.next_lsn - 1
+            # wait for the flush in progress unless it already covers lsn, then lead the next one
+            while self.flushed_lsn < lsn and self.is_flushing:
+                self.condition.wait()
+            if self.flushed_lsn >= lsn: return
+            self.is_flushing = True
+        last_lsn = 0
+        try:
+            # give concurrent committers a moment to join this flush
+            if is_grouped and Config.WAL_GROUP_COMMIT_DELAY: sleep(Config.WAL_GROUP_COMMIT_DELAY)
+            with self.condition:
+                data = b"".join(self.buffer)
+                last_lsn = self.next_lsn - 1
+                self.buffer = list()
+                self.buffer_size = 0
+            if not self.is_detached and self.file != None:
+                self.file.write(data)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+        finally:
+            with self.condition:
+                self.is_flushing = False
+                self.flushed_lsn = max(self.flushed_lsn, last_lsn)
+                self.condition.notify_all()
+
+    def get_log_size(self)->int:
+        """
+        Get bytes logged since the last checkpoint
+        """
+        return self.log_size
+
+    def checkpoint(self, flush_pages, get_dirty_page_table)->None:
+        """
+        Fuzzy checkpoint, taken while transactions keep running. flush_pages(lsn) writes
+        out the pages dirtied before lsn (and anything else that must be on disk, like
+        page range metadata). Then a CHECKPOINT record logs the dirty page table
+        (get_dirty_page_table(): {page path: LSN of its first write not on disk}) and
+        the active transactions. Recovery redoes from its redo LSN, the oldest LSN of
+        either, so the log before it is dropped.
+        """
+        if self.file == None or self.is_detached: return
+        with self.checkpoint_mutex:
+            with self.condition:
+                begin_lsn = self.next_lsn
+            flush_pages(begin_lsn)
+            with self.condition:
+                # writes logged from here on are redone whatever the dirty page table says
+                end_lsn = self.next_lsn
+                active_transactions = dict(self.first_lsns)
+            dirty_page_table = get_dirty_page_table()
+            # pages written out before the checkpoint must not be lost with the log records it drops (whatever the durability of commits)
+            if self.durability != Durability.NONE: Disk.sync()
+            redo_lsn = min([end_lsn, *dirty_page_table.values(), *active_transactions.values()])
+            with self.condition:
+                self.log_size = 0
+            self.flush(self.__append(Log_Type.CHECKPOINT, data=(redo_lsn, end_lsn, dirty_page_table, active_transactions)))
+            self.__truncate(redo_lsn)
+
+    def __get_flushed_size(self)->int:
+        """
+        Get size of the log file once no flush is writing to it (call with self.condition held)
+        """
+        while self.is_flushing: self.condition.wait()
+        return os.path.getsize(self.log_path)
+
+    def __truncate(self, lsn:int)->None:
+        """
+        Drop the records before lsn from the log file. The records kept are copied to a
+        new file without blocking appends and flushes; only what was flushed meanwhile is
+        copied while they wait, before the new file replaces the log.
+        """
+        with self.condition:
+            if self.file == None: return
+            log_path = self.log_path
+            end = self.__get_flushed_size()
+        # the log file only grows meanwhile (records before end stay as they are)
+        start = end
+        for offset, record in read_log_records(log_path, with_offsets=True):
+            if offset >= end: break
+            if record.lsn >= lsn:
+                start = offset
+                break
+        truncated_path = log_path + ".tmp"
+        with io.open(log_path, 'rb') as source, io.open(truncated_path, 'wb') as f:
+            copy_file_bytes(source, f, start, end)
+            f.flush()
+            os.fsync(f.fileno())
+            with self.condition:
+                # the log was closed (or reopened elsewhere) meanwhile
+                if self.file == None or self.log_path != log_path:
+                    f.close()
+                    os.remove(truncated_path)
+                    return
+                # keep flushes out while the rest is copied and the file is replaced
+                copy_file_bytes(source, f, end, self.__get_flushed_size())
+                f.flush()
+                os.fsync(f.fileno())
+                self.file.close()
+                os.replace(truncated_path, log_path)
+                self.file = io.open(log_path, 'ab')
+
+
+LOG_MANAGER = Log_Manager()
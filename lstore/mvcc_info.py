@@ -0,0 +1,168 @@
+import threading
+from time import time_ns
+
+
+class Snapshot:
+    """
+    Versions a reader may see: versions written by itself, or written before its
+    timestamp by writers that had finished (and not aborted) when it was taken.
+    """
+    __slots__ = ("timestamp", "active_timestamps", "aborted_timestamps", "has_write_conflict", "has_newer_conflict")
+
+    def __init__(self, timestamp:int, active_timestamps:frozenset, aborted_timestamps:frozenset)->None:
+        self.timestamp:int                = timestamp
+        self.active_timestamps:frozenset  = active_timestamps
+        self.aborted_timestamps:frozenset = aborted_timestamps
+        self.has_write_conflict:bool      = False
+        self.has_newer_conflict:bool      = False # a conflicting version was written by a younger writer (it never becomes visible)
+
+    def is_visible(self, timestamp:int)->bool:
+        """
+        Check if a version written at timestamp is visible in the snapshot
+        """
+        if timestamp == self.timestamp: return True
+        return timestamp < self.timestamp and not timestamp in self.active_timestamps and not timestamp in self.aborted_timestamps
+
+    def is_write_conflict(self, latest_timestamp:int)->bool:
+        """
+        Check if the latest version of a record was written by a concurrent writer (first updater wins)
+        """
+        return not self.is_visible(latest_timestamp) and not latest_timestamp in self.aborted_timestamps
+
+
+class Version_Manager:
+    """
+    Hands out logical timestamps (microseconds, strictly increasing) and snapshots.
+    Every version is stamped with the timestamp of its writer: a transaction uses its
+    begin timestamp for all of its writes, a single operation gets its own.
+    """
+
+    def __init__(self)->None:
+        self.last_timestamp:int        = 0
+        self.active_timestamps:set     = set()
+        self.aborted_timestamps:set    = set() # of aborted transactions whose writes are not rolled back yet
+
+        self.mutex:threading.Lock = threading.Lock()
+        self.context              = threading.local() # snapshot of the transaction running on the thread
+
+    def __new_timestamp(self)->int:
+        self.last_timestamp = max(self.last_timestamp + 1, time_ns() // 1000)
+        return self.last_timestamp
+
+    def new_timestamp(self)->int:
+        """
+        Get a timestamp younger than every timestamp handed out so far
+        """
+        with self.mutex:
+            return self.__new_timestamp()
+
+    def __new_snapshot(self, is_writer:bool)->Snapshot:
+        with self.mutex:
+            timestamp = self.__new_timestamp()
+            snapshot = Snapshot(timestamp, frozenset(self.active_timestamps), frozenset(self.aborted_timestamps))
+            if is_writer: self.active_timestamps.add(timestamp)
+            return snapshot
+
+    def begin_transaction(self)->int:
+        """
+        Take the snapshot the transaction running on this thread reads from. Returns its timestamp.
+        """
+        self.context.snapshot = self.__new_snapshot(True)
+        return self.context.snapshot.timestamp
+
+    def end_transaction(self, is_committed:bool)->bool:
+        """
+        Make the transaction's writes visible to new snapshots (or hide them until they
+        are rolled back, see end_rollback, if it aborted). Returns whether it ran into a
+        write-write conflict.
+        """
+        snapshot = getattr(self.context, "snapshot", None)
+        if snapshot == None: return False
+        self.context.snapshot = None
+        with self.mutex:
+            if not is_committed:
+                self.aborted_timestamps.add(snapshot.timestamp)
+                self.context.aborted_timestamp = snapshot.timestamp
+            self.active_timestamps.discard(snapshot.timestamp)
+        return snapshot.has_write_conflict
+
+    def end_rollback(self)->None:
+        """
+        Forget the timestamp of the transaction that aborted on this thread once its writes
+        are rolled back: no version carries it anymore, so new snapshots need not hide it
+        (snapshots taken meanwhile keep it)
+        """
+        timestamp = getattr(self.context, "aborted_timestamp", None)
+        if timestamp == None: return
+        self.context.aborted_timestamp = None
+        with self.mutex:
+            self.aborted_timestamps.discard(timestamp)
+
+    def refresh_transaction_snapshot(self)->None:
+        """
+        Make the transaction running on this thread see the writers older than it that
+        finished since its snapshot was taken (e.g. to run queries again after rolling
+        back to a savepoint). Its writes keep its timestamp.
+        """
+        snapshot = getattr(self.context, "snapshot", None)
+        if snapshot == None: return
+        with self.mutex:
+            self.context.snapshot = Snapshot(snapshot.timestamp, frozenset(self.active_timestamps - {snapshot.timestamp}), frozenset(self.aborted_timestamps))
+
+    def get_transaction_snapshot(self)->Snapshot:
+        """
+        Get snapshot of the transaction running on this thread (None if there is none)
+        """
+        return getattr(self.context, "snapshot", None)
+
+    def get_read_snapshot(self)->Snapshot:
+        """
+        Get snapshot a read should use: the running transaction's, else a fresh one.
+        A fresh snapshot is None when no writer is in flight and no aborted write is
+        waiting to be rolled back (every version in storage is then visible).
+        """
+        snapshot = getattr(self.context, "snapshot", None)
+        if snapshot != None: return snapshot
+        if not len(self.active_timestamps) and not len(self.aborted_timestamps): return None
+        return self.__new_snapshot(False)
+
+    def get_scan_snapshot(self)->Snapshot:
+        """
+        Same as get_read_snapshot, but always takes a snapshot outside transactions: a
+        scan read lazily (e.g. by a cursor) must not see writes committed meanwhile
+        """
+        snapshot = getattr(self.context, "snapshot", None)
+        if snapshot != None: return snapshot
+        return self.__new_snapshot(False)
+
+    def get_oldest_active_timestamp(self)->int:
+        """
+        Get timestamp of the oldest transaction (or write) in flight (None if there is none).
+        Every snapshot taken from now on sees what committed before it.
+        """
+        with self.mutex:
+            if not len(self.active_timestamps): return None
+            return min(self.active_timestamps)
+
+    def begin_write(self)->int:
+        """
+        Get timestamp to stamp the versions of a write with
+        """
+        snapshot = getattr(self.context, "snapshot", None)
+        if snapshot != None: return snapshot.timestamp
+        with self.mutex:
+            timestamp = self.__new_timestamp()
+            self.active_timestamps.add(timestamp)
+            return timestamp
+
+    def end_write(self, timestamp:int)->None:
+        """
+        Finish a write started with begin_write (transactions' writes finish when they end)
+        """
+        snapshot = getattr(self.context, "snapshot", None)
+        if snapshot != None and snapshot.timestamp == timestamp: return
+        with self.mutex:
+            self.active_timestamps.discard(timestamp)
+
+
+VERSION_MANAGER = Version_Manager()
@@ -5,9 +5,11 @@ from threading import RLock
 from copy import deepcopy
 
 import lstore.config as Config
+from lstore.aggregate_info import Partial_Aggregate
 from lstore.disk import Disk
 from lstore.bufferpool import BUFFERPOOL
-from lstore.record_info import Record, RID, TID
+from lstore.mvcc_info import Snapshot
+from lstore.record_info import Record, get_base_page_index, get_tail_page_index
 
 class Page_Type(Enum):
     ANY = 0
@@ -30,14 +32,21 @@ class Page_Range:
         self.__load_pages()
 
     def __del__(self)->None:
-        metadata = Disk.read_from_path_metadata(self.page_range_path)
-        metadata["latest_tid"] = self.latest_tid
-        Disk.write_to_path_metadata(self.page_range_path, metadata)
+        self.persist_metadata()
         del self.base_pages
         self.base_pages = None
         del self.tail_pages
         self.tail_pages = None
 
+    def persist_metadata(self)->None:
+        """
+        Write latest TID of the page range to its metadata
+        """
+        with self.latch:
+            metadata = Disk.read_from_path_metadata(self.page_range_path)
+            metadata["latest_tid"] = self.latest_tid
+            Disk.write_to_path_metadata(self.page_range_path, metadata)
+
     def __get_pages(self, page_type:Page_Type)->tuple[list[str],int]:
         page_dirs:list[str] = Disk.list_directories_in_path(self.page_range_path)
         for page_dir in page_dirs:
@@ -122,78 +131,157 @@ class Page_Range:
         #     # determine number of columns
         #     num_columns:dict = Disk.read_from_path_metadata(os.path.dirname(self.page_range_path))["num_columns"]
 
-    def insert_record(self, record:Record)->None:
+    def insert_record(self, record:Record, timestamp:int=None)->None:
         """
         Insert record to a base page in a page range.
         """
         self.__access_base_page(record.get_base_page_index())
-        self.base_pages[record.get_base_page_index()].insert_record(record)
+        self.base_pages[record.get_base_page_index()].insert_record(record, timestamp)
 
-    def get_record_columns(self, rid:RID, rollback_version:int)->tuple:
+    def __get_version_tid(self, rid:int, rollback_version:int, snapshot:Snapshot=None)->int:
         """
-        Get Record columns
+        Get TID holding the requested version of a Record (-1 if the base record holds it).
+        With a snapshot, versions are counted from the latest one visible in it; returns
+        None if the Record itself is not visible (or its delete is).
         """
-        columns = list()
-        # print(f"GETTING COLUMNS FOR RID {rid} WITH {abs(rollback_version)} ROLLBACKS")
-        tid = self.base_pages[rid.get_base_page_index()].get_indirection_tid(rid)
-        schema_encoding = self.base_pages[rid.get_base_page_index()].get_schema_encoding(rid)
-        while rollback_version < 0 and int(tid) != -1:
-            tid = self.tail_pages[tid.get_tail_page_index()].get_indirection_tid(tid)
+        tid = self.base_pages[get_base_page_index(rid)].get_indirection_tid(rid)
+        # a deleted Record starts its versions with a tombstone (see delete_record)
+        if tid != -1 and self.tail_pages[get_tail_page_index(tid)].is_record_deleted(tid):
+            if snapshot == None or snapshot.is_visible(self.tail_pages[get_tail_page_index(tid)].get_timestamp(tid)): return None
+            tid = self.tail_pages[get_tail_page_index(tid)].get_indirection_tid(tid)
+        if snapshot != None:
+            while tid != -1 and not snapshot.is_visible(self.tail_pages[get_tail_page_index(tid)].get_timestamp(tid)):
+                tid = self.tail_pages[get_tail_page_index(tid)].get_indirection_tid(tid)
+            if tid == -1 and not snapshot.is_visible(self.base_pages[get_base_page_index(rid)].get_timestamp(rid)):
+                return None
+        while rollback_version < 0 and tid != -1:
+            tid = self.tail_pages[get_tail_page_index(tid)].get_indirection_tid(tid)
             rollback_version += 1
+        return tid
+
+    def __get_record_entry(self, rid:int, tid:int, schema_encoding:bitarray, column_index:int)->int:
+        if not schema_encoding[column_index] or tid == -1:
+            return self.base_pages[get_base_page_index(rid)].select_record(rid, column_index)
+        return self.tail_pages[get_tail_page_index(tid)].select_record(tid, column_index)
+
+    def get_record_columns(self, rid:int, rollback_version:int, column_indices:list=None, snapshot:Snapshot=None)->list:
+        """
+        Get Record columns (only the ones in column_indices, in that order, if given).
+        With a snapshot, the version visible in it is read (None if the Record is not visible).
+        """
+        # print(f"GETTING COLUMNS FOR RID {rid} WITH {abs(rollback_version)} ROLLBACKS")
+        tid = self.__get_version_tid(rid, rollback_version, snapshot)
+        if tid == None: return None
+        schema_encoding = self.base_pages[get_base_page_index(rid)].get_schema_encoding(rid)
         # print(f"ACCESSING TID {tid}")
-        for i, bit in enumerate(schema_encoding):
-            if not bit or int(tid) == -1:
-                columns.append(self.base_pages[rid.get_base_page_index()].select_record(rid, i))
-            else:
-                columns.append(self.tail_pages[tid.get_tail_page_index()].select_record(tid, i))
-        # print(f"RID {rid} HAS COLUMNS {columns}")
-        return tuple(columns)
+        if column_indices == None: column_indices = range(len(schema_encoding))
+        if tid == -1:
+            return self.base_pages[get_base_page_index(rid)].select_record_entries(rid, column_indices)
+        # read base and tail entries with one bufferpool access each
+        base_column_indices = [i for i in column_indices if not schema_encoding[i]]
+        tail_column_indices = [i for i in column_indices if schema_encoding[i]]
+        entries = dict(zip(base_column_indices, self.base_pages[get_base_page_index(rid)].select_record_entries(rid, base_column_indices)))
+        entries.update(zip(tail_column_indices, self.tail_pages[get_tail_page_index(tid)].select_record_entries(tid, tail_column_indices)))
+        return [entries[i] for i in column_indices]
+
+    def get_latest_timestamp(self, rid:int)->int:
+        """
+        Get timestamp of the latest version of a Record
+        """
+        tid = self.base_pages[get_base_page_index(rid)].get_indirection_tid(rid)
+        if tid == -1: return self.base_pages[get_base_page_index(rid)].get_timestamp(rid)
+        return self.tail_pages[get_tail_page_index(tid)].get_timestamp(tid)
+
+    def get_version_stamp(self, rid:int)->int:
+        """
+        Get stamp that changes whenever Record is updated or deleted (its base indirection TID, 0 once deleted)
+        """
+        if self.is_record_deleted(rid): return 0
+        return self.base_pages[get_base_page_index(rid)].get_indirection_tid(rid)
 
-    def update_record(self, rid:RID, old_columns:tuple, new_columns:tuple)->None:
+    def is_record_deleted(self, rid:int, snapshot:Snapshot=None)->bool:
+        """
+        Check if Record has been deleted as of snapshot (in its latest version if None),
+        or was never written
+        """
+        if not get_base_page_index(rid) in self.base_pages: return True
+        if self.base_pages[get_base_page_index(rid)].is_record_deleted(rid): return True
+        tid = self.base_pages[get_base_page_index(rid)].get_indirection_tid(rid)
+        if tid == -1 or not self.tail_pages[get_tail_page_index(tid)].is_record_deleted(tid): return False
+        return snapshot == None or snapshot.is_visible(self.tail_pages[get_tail_page_index(tid)].get_timestamp(tid))
+
+    def aggregate_records(self, rids:list[int], aggregate_column_index:int, group_by_column_index:int=None, rollback_version:int=0, skip_deleted:bool=False, snapshot:Snapshot=None)->dict:
+        """
+        Partially aggregate Records of this page range. Only the aggregated (and grouped)
+        columns are read. Returns {group value: Partial_Aggregate} (group value is None
+        if not grouping).
+        """
+        partials:dict = dict()
+        for rid in rids:
+            if skip_deleted and self.is_record_deleted(rid, snapshot): continue
+            tid = self.__get_version_tid(rid, rollback_version, snapshot)
+            if tid == None: continue
+            schema_encoding = self.base_pages[get_base_page_index(rid)].get_schema_encoding(rid)
+            value = self.__get_record_entry(rid, tid, schema_encoding, aggregate_column_index)
+            group_value = None
+            if group_by_column_index != None:
+                group_value = self.__get_record_entry(rid, tid, schema_encoding, group_by_column_index)
+            if not group_value in partials:
+                partials[group_value] = Partial_Aggregate()
+            partials[group_value].add(value)
+        return partials
+
+    def update_record(self, rid:int, old_columns:tuple, new_columns:tuple, timestamp:int=None)->None:
         """
         Update Record
         """
-        self.__access_base_page(rid.get_base_page_index())
-        tid = self.base_pages[rid.get_base_page_index()].get_indirection_tid(rid)
+        self.__append_version(rid, old_columns, new_columns, timestamp)
+
+    def __append_version(self, rid:int, old_columns:tuple, new_columns:tuple, timestamp:int=None, is_tombstone:bool=False)->None:
+        self.__access_base_page(get_base_page_index(rid))
+        tid = self.base_pages[get_base_page_index(rid)].get_indirection_tid(rid)
 
         # convert columns to lists
         old_columns = list(old_columns)
         new_columns = list(new_columns)
 
         # adjust schema encoding
-        schema_encoding = self.base_pages[rid.get_base_page_index()].get_schema_encoding(rid)
+        schema_encoding = self.base_pages[get_base_page_index(rid)].get_schema_encoding(rid)
         for i in range(len(old_columns)):
             if new_columns[i] != None and old_columns[i] != new_columns[i]:
                 schema_encoding[i] = True
                 old_columns[i] = new_columns[i]
-        self.base_pages[rid.get_base_page_index()].set_schema_encoding(rid, schema_encoding)
+        self.base_pages[get_base_page_index(rid)].set_schema_encoding(rid, schema_encoding)
 
-        # increment number of TIDs in a page range
-        self.latest_tid += 1
-        new_tid = TID(deepcopy(self.latest_tid))
-        self.__access_tail_page(new_tid.get_tail_page_index())
+        # increment number of TIDs in a page range (other records of the page range may be updated concurrently)
+        with self.latch:
+            self.latest_tid += 1
+            new_tid = self.latest_tid
+            self.__access_tail_page(get_tail_page_index(new_tid))
 
         # write new data to new TID
         key_index = Disk.read_from_path_metadata(os.path.dirname(self.page_range_path))["key_index"]
-        new_record = Record(new_tid, key_index, tuple(old_columns))
-        self.tail_pages[new_tid.get_tail_page_index()].insert_record(new_record)
+        new_record = Record(new_tid, key_index, old_columns)
+        self.tail_pages[get_tail_page_index(new_tid)].insert_record(new_record, timestamp)
+        if is_tombstone: self.tail_pages[get_tail_page_index(new_tid)].delete_record(new_tid)
 
-        # handle indirection
-        self.base_pages[rid.get_base_page_index()].set_indirection_tid(rid, new_tid)
-        if not int(tid) == -1:
-            self.tail_pages[new_tid.get_tail_page_index()].set_indirection_tid(new_tid, tid)
+        # handle indirection (link the new version before publishing it, readers walk the chain without locks)
+        if not tid == -1:
+            self.tail_pages[get_tail_page_index(new_tid)].set_indirection_tid(new_tid, tid)
+        self.base_pages[get_base_page_index(rid)].set_indirection_tid(rid, new_tid)
 
         # print(f"UPDATED COLUMNS FOR RID {rid} TO {old_columns}")
 
         # perform merging if necessary
         # self.__merge()
 
-    def delete_record(self, rid:RID)->None:
+    def delete_record(self, rid:int, columns:tuple, timestamp:int=None)->None:
         """
-        Delete Record
+        Delete Record (its latest columns are given) by linking a tombstone, a copy of
+        its latest version marked deleted, in front of its versions. Snapshots that
+        can't see the tombstone's timestamp keep reading the versions behind it.
         """
-        self.__access_base_page(rid.get_base_page_index())
-        self.base_pages[rid.get_base_page_index()].delete_record(rid)
+        self.__append_version(rid, columns, [None] * len(columns), timestamp, is_tombstone=True)
 
 
 class Base_Page:
@@ -202,47 +290,59 @@ class Base_Page:
         self.base_page_path = base_page_path
         self.base_page_index = base_page_index
 
-    def insert_record(self, record:Record)->None:
+    def insert_record(self, record:Record, timestamp:int=None)->None:
         """
         Insert Base Record
         """
-        BUFFERPOOL.insert_record(record, self.base_page_path)
+        BUFFERPOOL.insert_record(record, self.base_page_path, timestamp)
+
+    def get_timestamp(self, rid:int)->int:
+        """
+        Get timestamp for Base Record
+        """
+        return BUFFERPOOL.get_timestamp(rid, self.base_page_path)
 
-    def get_schema_encoding(self, rid:RID)->bitarray:
+    def get_schema_encoding(self, rid:int)->bitarray:
         """
         Get schema encoding for Base Record
         """
         return BUFFERPOOL.get_schema_encoding(rid, self.base_page_path)
 
-    def set_schema_encoding(self, rid:RID, schema_encoding:bitarray)->None:
+    def set_schema_encoding(self, rid:int, schema_encoding:bitarray)->None:
         """
         Set schema encoding for Base Record
         """
         BUFFERPOOL.set_schema_encoding(rid, schema_encoding, self.base_page_path)
 
-    def get_indirection_tid(self, rid:RID)->TID:
+    def get_indirection_tid(self, rid:int)->int:
         """
         Get indirection for Base Record
         """
         return BUFFERPOOL.get_indirection_tid(rid, self.base_page_path)
 
-    def set_indirection_tid(self, rid:RID, tid:TID)->None:
+    def set_indirection_tid(self, rid:int, tid:int)->None:
         """
         Set indirection for Base Record
         """
         BUFFERPOOL.set_indirection_tid(rid, tid, self.base_page_path)
 
-    def select_record(self, rid:RID, column_index:int)->int:
+    def select_record(self, rid:int, column_index:int)->int:
         """
         Select Base Record
         """
         return BUFFERPOOL.get_record_entry(rid, self.base_page_path, column_index)
 
-    def delete_record(self, rid:RID)->None:
+    def select_record_entries(self, rid:int, column_indices:list)->list[int]:
         """
-        Delete Base Record
+        Select several entries of a Base Record
         """
-        BUFFERPOOL.delete_record(rid, self.base_page_path)
+        return BUFFERPOOL.get_record_entries(rid, self.base_page_path, column_indices)
+
+    def is_record_deleted(self, rid:int)->bool:
+        """
+        Check if Base Record is deleted
+        """
+        return BUFFERPOOL.is_record_deleted(rid, self.base_page_path)
 
 
 class Tail_Page:
@@ -251,25 +351,49 @@ class Tail_Page:
         self.tail_page_path = tail_page_path
         self.tail_page_index = tail_page_index
 
-    def insert_record(self, record:Record)->None:
+    def insert_record(self, record:Record, timestamp:int=None)->None:
         """
         Insert Tail Record
         """
-        BUFFERPOOL.insert_record(record, self.tail_page_path)
+        BUFFERPOOL.insert_record(record, self.tail_page_path, timestamp)
+
+    def get_timestamp(self, tid:int)->int:
+        """
+        Get timestamp for Tail Record
+        """
+        return BUFFERPOOL.get_timestamp(tid, self.tail_page_path)
 
-    def select_record(self, tid:TID, column_index:int)->int:
+    def select_record(self, tid:int, column_index:int)->int:
         """
         Select Tail Record
         """ 
         return BUFFERPOOL.get_record_entry(tid, self.tail_page_path, column_index)
 
-    def get_indirection_tid(self, tid:TID)->TID:
+    def select_record_entries(self, tid:int, column_indices:list)->list[int]:
+        """
+        Select several entries of a Tail Record
+        """
+        return BUFFERPOOL.get_record_entries(tid, self.tail_page_path, column_indices)
+
+    def delete_record(self, tid:int)->None:
+        """
+        Mark Tail Record deleted (a tombstone)
+        """
+        BUFFERPOOL.delete_record(tid, self.tail_page_path)
+
+    def is_record_deleted(self, tid:int)->bool:
+        """
+        Check if Tail Record is a tombstone
+        """
+        return BUFFERPOOL.is_record_deleted(tid, self.tail_page_path)
+
+    def get_indirection_tid(self, tid:int)->int:
         """
         Get indirection for Tail Record
         """
         return BUFFERPOOL.get_indirection_tid(tid, self.tail_page_path)
 
-    def set_indirection_tid(self, tid:TID, indirection_tid:TID)->None:
+    def set_indirection_tid(self, tid:int, indirection_tid:int)->None:
         """
         Set indirection for Tail Record
         """
@@ -0,0 +1,225 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import lstore.config as Config
+from lstore.aggregate_info import Aggregate_Type, Partial_Aggregate, merge_partial_aggregates
+from lstore.bufferpool import BUFFERPOOL
+from lstore.lock_info import Lock_Mode
+from lstore.record_info import Record, Record_Batch, get_page_range_index, get_base_page_index, get_tail_page_index
+from lstore.table import Table
+
+
+class Page_Range_Reader:
+    """
+    Reads records of a page range straight from its page files (used by scan worker
+    processes, which do not share the bufferpool). There is no snapshot check: it reads
+    the latest version on disk, so callers lock the page range against writers first.
+    """
+
+    def __init__(self, page_range_path:str, num_columns:int)->None:
+        self.page_range_path:str = page_range_path
+        self.num_columns:int     = num_columns
+        self.physical_pages:dict[tuple[str,int],bytes] = dict()
+
+    def __read_entry(self, page_dir:str, physical_page_index:int, id:int)->int:
+        if not (page_dir, physical_page_index) in self.physical_pages:
+            with io.open(os.path.join(self.page_range_path, page_dir, f"{physical_page_index}.bin"), 'rb') as f:
+                self.physical_pages[(page_dir, physical_page_index)] = f.read()
+        offset = (id - 1) * Config.RECORD_FIELD_SIZE % Config.PHYSICAL_PAGE_SIZE
+        return int.from_bytes(self.physical_pages[(page_dir, physical_page_index)][offset:offset+Config.RECORD_FIELD_SIZE], "big", signed=True)
+
+    def is_record_deleted(self, rid:int)->bool:
+        base_page_dir = f"BP{get_base_page_index(rid)}"
+        if not os.path.isdir(os.path.join(self.page_range_path, base_page_dir)): return True
+        if self.__read_entry(base_page_dir, Config.RID_COLUMN, rid) == 0: return True
+        # deleted records start their versions with a tombstone (a tail record with an emptied RID)
+        tid = self.__read_entry(base_page_dir, Config.INDIRECTION_COLUMN, rid)
+        return tid != -1 and self.__read_entry(f"TP{get_tail_page_index(tid)}", Config.RID_COLUMN, tid) == 0
+
+    def get_record_columns(self, rid:int, rollback_version:int, column_indices)->list:
+        base_page_dir = f"BP{get_base_page_index(rid)}"
+        tid = self.__read_entry(base_page_dir, Config.INDIRECTION_COLUMN, rid)
+        while rollback_version < 0 and tid != -1:
+            tid = self.__read_entry(f"TP{get_tail_page_index(tid)}", Config.INDIRECTION_COLUMN, tid)
+            rollback_version += 1
+        schema_encoding = self.__read_entry(base_page_dir, Config.SCHEMA_ENCODING_COLUMN, rid)
+        columns = list()
+        for i in column_indices:
+            if not (schema_encoding >> (self.num_columns - 1 - i)) & 1 or tid == -1:
+                columns.append(self.__read_entry(base_page_dir, i + Config.NUM_METADATA_COLUMNS, rid))
+            else:
+                columns.append(self.__read_entry(f"TP{get_tail_page_index(tid)}", i + Config.NUM_METADATA_COLUMNS, tid))
+        return columns
+
+
+def _get_rids(rids):
+    # full scans send (first RID, last RID) bounds instead of every RID
+    if isinstance(rids, tuple): return range(rids[0], rids[1] + 1)
+    return rids
+
+
+def _aggregate_page_range(page_range_path:str, num_columns:int, rids, aggregate_column_index:int, group_by_column_index:int, rollback_version:int, skip_deleted:bool)->dict:
+    reader = Page_Range_Reader(page_range_path, num_columns)
+    column_indices = [aggregate_column_index] if group_by_column_index == None else [aggregate_column_index, group_by_column_index]
+    partials:dict = dict()
+    for rid in _get_rids(rids):
+        if skip_deleted and reader.is_record_deleted(rid): continue
+        columns = reader.get_record_columns(rid, rollback_version, column_indices)
+        group_value = None if group_by_column_index == None else columns[1]
+        if not group_value in partials:
+            partials[group_value] = Partial_Aggregate()
+        partials[group_value].add(columns[0])
+    return partials
+
+
+def _select_page_range(page_range_path:str, num_columns:int, rids, search_key, search_key_index:int, selected_columns:list, rollback_version:int, skip_deleted:bool)->list[tuple[int,list]]:
+    reader = Page_Range_Reader(page_range_path, num_columns)
+    rlist = list()
+    for rid in _get_rids(rids):
+        if skip_deleted and reader.is_record_deleted(rid): continue
+        columns = reader.get_record_columns(rid, rollback_version, range(num_columns))
+        if search_key_index != None and columns[search_key_index] != search_key: continue
+        if selected_columns != None:
+            columns = [_ for i, _ in enumerate(columns) if selected_columns[i] == 1]
+        rlist.append((rid, columns))
+    return rlist
+
+
+class Parallel_Scan_Executor:
+    """
+    Splits scans (sums, aggregates and full-scan selects) of a table by page range
+    across worker processes and merges their partial results. Each worker reads the
+    page files directly, so dirty frames of the table are flushed before dispatching.
+    """
+
+    def __init__(self, table:Table, max_workers:int=Config.NUM_SCAN_PROCESSES)->None:
+        self.table:Table                   = table
+        self.max_workers:int               = max_workers
+        self.executor:ProcessPoolExecutor  = None
+
+    def __del__(self)->None:
+        self.shutdown()
+
+    def __get_executor(self)->ProcessPoolExecutor:
+        if self.executor == None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers or None)
+        return self.executor
+
+    def __get_rid_groups(self, start_range=None, end_range=None, search_key=None, search_key_index:int=None)->tuple[dict,bool]:
+        """
+        Get {page range index: RIDs} to scan and whether deleted records must be skipped
+        (index entries of deleted records stay while older snapshots may read them).
+        """
+        try:
+            if start_range != None or end_range != None:
+                rids = self.table.index.locate_range(start_range, end_range, self.table.key_index)
+            elif search_key_index != None:
+                rids = self.table.index.locate(search_key, search_key_index)
+            else:
+                raise KeyError
+        except KeyError:
+            # full scan: send RID bounds of each page range
+            num_records_per_page_range = Config.NUM_RECORDS_PER_PAGE * Config.NUM_BASE_PAGES_PER_PAGE_RANGE
+            rid_groups = dict()
+            for first_rid in range(1, self.table.num_records + 1, num_records_per_page_range):
+                last_rid = min(first_rid + num_records_per_page_range - 1, self.table.num_records)
+                rid_groups[get_page_range_index(first_rid)] = (first_rid, last_rid)
+            return (rid_groups, True)
+
+        rid_groups = dict()
+        for rid in sorted(rids):
+            if not get_page_range_index(rid) in rid_groups:
+                rid_groups[get_page_range_index(rid)] = list()
+            rid_groups[get_page_range_index(rid)].append(rid)
+        return (rid_groups, True)
+
+    def __run(self, rid_groups:dict, func, *args)->list:
+        """
+        Run func on every page range (in parallel) while holding its read lock.
+        Returns results in page range order.
+        """
+        page_range_indices = sorted(rid_groups)
+        owner = self.table.lock_manager.get_owner()
+        try:
+            for page_range_index in page_range_indices:
+                if not self.table.lock_manager.acquire(owner, (self.table.table_path, page_range_index), Lock_Mode.S): raise TimeoutError
+            # workers read from disk, so write out the table's dirty frames first
+            BUFFERPOOL.flush_frames(self.table.table_path)
+            futures = [
+                self.__get_executor().submit(
+                    func,
+                    os.path.join(self.table.table_path, f"PR{page_range_index}"),
+                    self.table.num_columns,
+                    rid_groups[page_range_index],
+                    *args,
+                )
+                for page_range_index in page_range_indices
+            ]
+            return [future.result() for future in futures]
+        finally:
+            self.table.lock_manager.release_operation(owner)
+
+    def __aggregate(self, aggregate_column_index:int, start_range, end_range, group_by_column_index:int, rollback_version:int)->dict:
+        rid_groups, skip_deleted = self.__get_rid_groups(start_range, end_range)
+        results = self.__run(rid_groups, _aggregate_page_range, aggregate_column_index, group_by_column_index, rollback_version, skip_deleted)
+        partials:dict = dict()
+        for page_range_partials in results:
+            merge_partial_aggregates(partials, page_range_partials)
+        return partials
+
+    def aggregate_records(self, aggregate_type:Aggregate_Type, aggregate_column_index:int, start_range=None, end_range=None, group_by_column_index:int=None, rollback_version:int=0):
+        """
+        Parallel version of Table.aggregate_records
+        """
+        try:
+            partials = self.__aggregate(aggregate_column_index, start_range, end_range, group_by_column_index, rollback_version)
+        except Exception:
+            return False
+        if group_by_column_index == None:
+            return partials.get(None, Partial_Aggregate()).get_result(aggregate_type)
+        return {group_value: partial.get_result(aggregate_type) for group_value, partial in partials.items()}
+
+    def sum_records(self, start_range, end_range, aggregate_column_index:int, rollback_version:int=0)->int:
+        """
+        Parallel version of Table.sum_records
+        """
+        try:
+            partials = self.__aggregate(aggregate_column_index, start_range, end_range, None, rollback_version)
+        except Exception:
+            return False
+        return partials.get(None, Partial_Aggregate()).total
+
+    def select_records(self, search_key, search_key_index:int, selected_columns:list=None, rollback_version:int=0)->list[Record]:
+        """
+        Parallel version of Table.select_record (worthwhile for full table scans)
+        """
+        rid_groups, skip_deleted = self.__get_rid_groups(search_key=search_key, search_key_index=search_key_index)
+        try:
+            results = self.__run(rid_groups, _select_page_range, search_key, search_key_index, selected_columns, rollback_version, skip_deleted)
+        except Exception:
+            return False
+        return [Record(rid, self.table.key_index, columns) for page_range_records in results for rid, columns in page_range_records]
+
+    def select_batch(self, search_key, search_key_index:int, selected_columns:list=None, rollback_version:int=0)->Record_Batch:
+        """
+        Same as select_records, but returns the rows as a columnar Record_Batch
+        """
+        rid_groups, skip_deleted = self.__get_rid_groups(search_key=search_key, search_key_index=search_key_index)
+        try:
+            results = self.__run(rid_groups, _select_page_range, search_key, search_key_index, selected_columns, rollback_version, skip_deleted)
+        except Exception:
+            return False
+        batch = Record_Batch(self.table.key_index, self.table.num_columns if selected_columns == None else sum(selected_columns))
+        for page_range_records in results:
+            for rid, columns in page_range_records:
+                batch.append(rid, columns)
+        return batch
+
+    def shutdown(self)->None:
+        """
+        Stop worker processes
+        """
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
@@ -1,3 +1,9 @@
+import lstore.config as Config
+from lstore.aggregate_info import Aggregate_Type
+from lstore.cursor import Cursor
+from lstore.mvcc_info import VERSION_MANAGER
+from lstore.parallel_scan import Parallel_Scan_Executor
+from lstore.record_info import Record_Batch
 from lstore.table import Table
 
 
@@ -7,9 +13,25 @@ class Query:
     Queries that fail must return False
     Queries that succeed should return the result or True
     Any query that crashes (due to exceptions) should return False
+    If parallel (by default if Config.NUM_SCAN_PROCESSES is set), sums, aggregates and
+    selects on columns without an index scan page ranges in worker processes
     """
-    def __init__(self, table:Table):
+    def __init__(self, table:Table, parallel:bool=None):
         self.table = table
+        self.parallel_scan:Parallel_Scan_Executor = None
+        if parallel or (parallel == None and Config.NUM_SCAN_PROCESSES):
+            self.parallel_scan = Parallel_Scan_Executor(table)
+
+
+    """
+    # internal Method
+    # Get the parallel scan executor if scans should use it. Its workers read the latest
+    # committed version of each record (Page_Range_Reader has no snapshot), so reads
+    # inside transactions (which must see their snapshot and own writes) stay serial.
+    """
+    def __get_parallel_scan(self)->Parallel_Scan_Executor:
+        if self.parallel_scan == None or VERSION_MANAGER.get_transaction_snapshot() != None: return None
+        return self.parallel_scan
 
     
     """
@@ -41,7 +63,7 @@ class Query:
     # Assume that select will never be called on a key that doesn't exist
     """
     def select(self, search_key, search_key_index:int, projected_columns_index:int):
-        return self.table.select_record(search_key, search_key_index, projected_columns_index)
+        return self.select_version(search_key, search_key_index, projected_columns_index, 0)
 
 
     
@@ -56,8 +78,42 @@ class Query:
     # Assume that select will never be called on a key that doesn't exist
     """
     def select_version(self, search_key, search_key_index, projected_columns_index, relative_version):
+        parallel_scan = self.__get_parallel_scan()
+        if parallel_scan != None and not search_key_index in self.table.index.indices:
+            return parallel_scan.select_records(search_key, search_key_index, projected_columns_index, relative_version)
         return self.table.select_record(search_key, search_key_index, projected_columns_index, relative_version)
 
+
+    """
+    # Prepare a select on a column once and get a fast callable for repeated point queries
+    # :param search_key_index: the column index you want to search based on
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # Returns a function select(search_key, relative_version=0) returning a list of Record objects
+    """
+    def prepare_select(self, search_key_index:int, projected_columns_index:list=None):
+        return self.table.prepare_select(search_key_index, projected_columns_index)
+
+
+    """
+    # Read matching records lazily with a cursor
+    # :param search_key: the value you want to search based on (ignored if search_key_index is None)
+    # :param search_key_index: the column index you want to search based on (None to read every record)
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # :param limit: maximum number of records to read (None for no limit)
+    # :param relative_version: the relative version of the record you need to retreive.
+    # Returns a Cursor that yields Record objects in page order
+    """
+    def select_cursor(self, search_key, search_key_index:int, projected_columns_index:list=None, limit:int=None, relative_version:int=0)->Cursor:
+        return Cursor(self.table, search_key, search_key_index, projected_columns_index, relative_version, limit)
+
+
+    """
+    # Same as select, but returns a columnar Record_Batch instead of a list of Record objects
+    # Returns False if the select fails
+    """
+    def select_batch(self, search_key, search_key_index:int, projected_columns_index:list=None, relative_version:int=0)->Record_Batch:
+        return self.table.select_batch(search_key, search_key_index, projected_columns_index, relative_version)
+
     
     """
     # Update a record with specified key and columns
@@ -77,7 +133,7 @@ class Query:
     # Returns False if no record exists in the given range
     """
     def sum(self, start_range, end_range, aggregate_column_index)->int:
-        return self.table.sum_records(start_range, end_range, aggregate_column_index)
+        return self.sum_version(start_range, end_range, aggregate_column_index, 0)
 
     
     """
@@ -90,22 +146,98 @@ class Query:
     # Returns False if no record exists in the given range
     """
     def sum_version(self, start_range, end_range, aggregate_column_index, relative_version):
+        parallel_scan = self.__get_parallel_scan()
+        if parallel_scan != None:
+            return parallel_scan.sum_records(start_range, end_range, aggregate_column_index, relative_version)
         return self.table.sum_records(start_range, end_range, aggregate_column_index, relative_version)
 
+
+    """
+    :param aggregate_type: Aggregate_Type  # COUNT, SUM, MIN, MAX or AVG
+    :param aggregate_column_index: int     # Index of desired column to aggregate
+    :param start_range: int                # Start of the primary key range to aggregate (None for no lower bound)
+    :param end_range: int                  # End of the primary key range to aggregate (None for no upper bound)
+    :param group_by_column_index: int      # Index of column to group by (None for no grouping)
+    :param relative_version: the relative version of the record you need to retreive.
+    # Returns the aggregate value upon success, or {group value: aggregate value} if grouping
+    # Returns False if no record exists in the given range (COUNT returns 0)
+    """
+    def aggregate(self, aggregate_type:Aggregate_Type, aggregate_column_index:int, start_range=None, end_range=None, group_by_column_index:int=None, relative_version:int=0):
+        parallel_scan = self.__get_parallel_scan()
+        if parallel_scan != None:
+            return parallel_scan.aggregate_records(aggregate_type, aggregate_column_index, start_range, end_range, group_by_column_index, relative_version)
+        return self.table.aggregate_records(aggregate_type, aggregate_column_index, start_range, end_range, group_by_column_index, relative_version)
+
+
+    """
+    # Returns the number of records in the given primary key range (or whole table)
+    """
+    def count(self, start_range=None, end_range=None, aggregate_column_index:int=None)->int:
+        if aggregate_column_index == None: aggregate_column_index = self.table.key_index
+        return self.aggregate(Aggregate_Type.COUNT, aggregate_column_index, start_range, end_range)
+
+
+    """
+    # Returns the minimum of a column in the given primary key range (or whole table)
+    # Returns False if no record exists in the given range
+    """
+    def min(self, start_range=None, end_range=None, aggregate_column_index:int=None):
+        if aggregate_column_index == None: aggregate_column_index = self.table.key_index
+        return self.aggregate(Aggregate_Type.MIN, aggregate_column_index, start_range, end_range)
+
+
+    """
+    # Returns the maximum of a column in the given primary key range (or whole table)
+    # Returns False if no record exists in the given range
+    """
+    def max(self, start_range=None, end_range=None, aggregate_column_index:int=None):
+        if aggregate_column_index == None: aggregate_column_index = self.table.key_index
+        return self.aggregate(Aggregate_Type.MAX, aggregate_column_index, start_range, end_range)
+
+
+    """
+    # Returns the average of a column in the given primary key range (or whole table)
+    # Returns False if no record exists in the given range
+    """
+    def avg(self, start_range=None, end_range=None, aggregate_column_index:int=None)->float:
+        if aggregate_column_index == None: aggregate_column_index = self.table.key_index
+        return self.aggregate(Aggregate_Type.AVG, aggregate_column_index, start_range, end_range)
+
+
+    """
+    :param group_by_column_index: int      # Index of column to group by
+    :param aggregate_column_index: int     # Index of desired column to aggregate
+    :param aggregate_type: Aggregate_Type  # aggregate applied to each group (SUM by default)
+    # Returns {group value: aggregate value} for the given primary key range (or whole table)
+    """
+    def group_by(self, group_by_column_index:int, aggregate_column_index:int, aggregate_type:Aggregate_Type=Aggregate_Type.SUM, start_range=None, end_range=None)->dict:
+        return self.aggregate(aggregate_type, aggregate_column_index, start_range, end_range, group_by_column_index)
+
     
     """
     incremenets one column of the record
-    this implementation should work if your select and update queries already work
     :param key: the primary of key of the record to increment
     :param column: the column to increment
     # Returns True is increment is successful
     # Returns False if no record matches key or if target record is locked by 2PL.
     """
     def increment(self, key, column):
-        r = self.select(key, self.table.key_index, [1] * self.table.num_columns)[0]
-        if r is not False:
-            updated_columns = [None] * self.table.num_columns
-            updated_columns[column] = r[column] + 1
-            u = self.update(key, *updated_columns)
-            return u
-        return False
+        return self.table.increment_record(key, column)
+
+
+    """
+    # Atomically add amount to one column of the record (read and written under one record lock)
+    # Returns True if the add is successful
+    # Returns False if no record matches key or if target record is locked by 2PL.
+    """
+    def add(self, key, column:int, amount:int)->bool:
+        return self.table.increment_record(key, column, amount)
+
+
+    """
+    # Atomically set one column of the record to new_value if it currently is expected_value
+    # Returns True if the column was set
+    # Returns False if it holds another value, no record matches key or target record is locked by 2PL.
+    """
+    def compare_and_set(self, key, column:int, expected_value:int, new_value:int)->bool:
+        return self.table.compare_and_set_record(key, column, expected_value, new_value)
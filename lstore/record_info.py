@@ -1,10 +1,47 @@
+import threading
+from enum import Enum
+
 import lstore.config as Config
 
+NUM_RECORDS_PER_PAGE_RANGE = Config.NUM_RECORDS_PER_PAGE * Config.NUM_BASE_PAGES_PER_PAGE_RANGE
+
+
+def get_page_range_index(rid:int)->int:
+    """
+    Get Page Range index rid is in
+    """
+    return (abs(rid) - 1) // NUM_RECORDS_PER_PAGE_RANGE
+
+
+def get_base_page_index(rid:int)->int:
+    """
+    Get Base Page index rid is in
+    """
+    return ((abs(rid) - 1) // Config.NUM_RECORDS_PER_PAGE) % Config.NUM_BASE_PAGES_PER_PAGE_RANGE
+
+
+def get_tail_page_index(tid:int)->int:
+    """
+    Get Tail Page index tid is in
+    """
+    return (abs(tid) - 1) // Config.NUM_RECORDS_PER_PAGE
+
+
 class RID:
+    """
+    Thin wrapper around an int RID. Internally RIDs are passed around as plain ints;
+    use the module-level functions to locate them.
+    """
+    __slots__ = ("rid",)
 
     def __init__(self, rid:int)->None:
         self.rid:int = int(rid)
 
+    def __setstate__(self, state)->None:
+        # index files written before RID was slotted pickled its __dict__ ({"rid": rid})
+        if isinstance(state, tuple): state = state[1]
+        self.rid = int(state["rid"])
+
     def __repr__(self)->str:
         return str(self.rid)
 
@@ -14,55 +51,162 @@ class RID:
     def __int__(self)->int:
         return self.rid
 
+    def __eq__(self, other)->bool:
+        return self.rid == int(other)
+
+    def __hash__(self)->int:
+        return hash(self.rid)
+
     def get_page_range_index(self)->int:
         """
         Get Page Range index rid is in
         """
-        return (abs(self.rid) - 1) // (Config.NUM_RECORDS_PER_PAGE * Config.NUM_BASE_PAGES_PER_PAGE_RANGE)
+        return get_page_range_index(self.rid)
 
     def get_base_page_index(self)->int:
         """
         Get Base Page index rid is in
         """
-        return ((abs(self.rid)- 1) // Config.NUM_RECORDS_PER_PAGE) % Config.NUM_BASE_PAGES_PER_PAGE_RANGE
+        return get_base_page_index(self.rid)
 
 
 class TID(RID):
-
-    def __init__(self, rid:int)->None:
-        super().__init__(rid)
-
-    def __int__(self)->int:
-        return self.rid
+    __slots__ = ()
 
     def get_tail_page_index(self)->int:
         """
         Get Tail Page index tid is in
         """
-        return (abs(self.rid) - 1) // Config.NUM_RECORDS_PER_PAGE
+        return get_tail_page_index(self.rid)
+
+
+class Insert_Partition(Enum):
+    NONE = "NONE"             # threads take blocks of Config.RID_BLOCK_SIZE RIDs
+    BASE_PAGE = "BASE_PAGE"   # each thread fills a base page of its own
+    PAGE_RANGE = "PAGE_RANGE" # each thread fills a page range of its own
+
+
+class RID_Allocator:
+    """
+    Hands out RIDs of a table without a disk write per record. Each thread takes
+    blocks of RIDs (so concurrent inserts only meet on the allocator's mutex once per
+    block); with an insert partition, blocks are whole base pages or page ranges, so
+    concurrent inserters also write to different frames and page ranges. Only the
+    high-water mark is persisted, in batches of Config.RID_PERSIST_BATCH RIDs. RIDs
+    below the high-water mark may never be written (unused block tails, failed inserts,
+    RIDs reserved before a crash), so scans treat unwritten RIDs like deleted ones. On
+    close, the unused block tails are persisted too and handed out first once the table
+    is opened again.
+    """
+
+    def __init__(self, high_water_mark:int, persist, partition=Config.INSERT_PARTITION, free_blocks:list=None)->None:
+        self.next_rid:int        = high_water_mark + 1 # first RID of the next block
+        self.high_water_mark:int = high_water_mark     # RIDs up to here are reserved on disk
+        self.persist             = persist             # persist(high water mark, free blocks) writes them to disk
+        self.partition:Insert_Partition = Insert_Partition(partition)
+        self.free_blocks:list[list[int]] = [list(block) for block in free_blocks or []] # unused RIDs below next_rid
+
+        self.mutex:threading.Lock = threading.Lock()
+        self.context              = threading.local() # block of the thread: [next RID, last RID]
+        self.blocks:dict[int,list[int]] = dict()      # current block of each thread (by thread id)
+        self.max_used_rid:int     = high_water_mark   # largest RID handed out from blocks no thread holds anymore
+
+        # free blocks are handed out at most once, even if the table is not closed again
+        if len(self.free_blocks): self.persist(self.high_water_mark)
+
+    def __get_block_size(self)->int:
+        if self.partition == Insert_Partition.BASE_PAGE: return Config.NUM_RECORDS_PER_PAGE
+        if self.partition == Insert_Partition.PAGE_RANGE: return NUM_RECORDS_PER_PAGE_RANGE
+        return Config.RID_BLOCK_SIZE
+
+    def __allocate_block(self)->list[int]:
+        block_size = self.__get_block_size()
+        with self.mutex:
+            # the thread's previous block (or that of a finished thread with the same id)
+            previous_block = self.blocks.get(threading.get_ident())
+            if previous_block != None: self.max_used_rid = max(self.max_used_rid, previous_block[0] - 1)
+            if len(self.free_blocks):
+                block = self.blocks[threading.get_ident()] = self.free_blocks.pop()
+                return block
+            first_rid = self.next_rid
+            # partition blocks start on a page (range) boundary
+            if self.partition != Insert_Partition.NONE:
+                first_rid = (first_rid - 1 + block_size - 1) // block_size * block_size + 1
+            block = [first_rid, first_rid + block_size - 1]
+            self.next_rid = first_rid + block_size
+            if block[1] > self.high_water_mark:
+                self.high_water_mark = block[1] + Config.RID_PERSIST_BATCH
+                self.persist(self.high_water_mark)
+            self.blocks[threading.get_ident()] = block
+            return block
+
+    def allocate(self)->int:
+        """
+        Get an unused RID (RIDs allocated by one thread increase)
+        """
+        block = getattr(self.context, "block", None)
+        if block == None or block[0] > block[1]:
+            block = self.context.block = self.__allocate_block()
+        rid = block[0]
+        block[0] += 1
+        return rid
+
+    def release(self, rid:int)->None:
+        """
+        Take back the RID this thread allocated last (its insert was rolled back), so
+        that the thread's next insert reuses it
+        """
+        block = getattr(self.context, "block", None)
+        if block != None and block[0] - 1 == rid: block[0] -= 1
+
+    def __get_max_rid(self)->int:
+        return max([self.max_used_rid] + [block[0] - 1 for block in self.blocks.values()])
+
+    def get_max_rid(self)->int:
+        """
+        Get largest RID handed out so far (unused tails of the threads' blocks excluded)
+        """
+        with self.mutex:
+            return self.__get_max_rid()
+
+    def flush(self)->None:
+        """
+        Persist the largest RID handed out as the high-water mark, and the unused RIDs
+        below it as free blocks (on close, once inserts stopped)
+        """
+        with self.mutex:
+            self.high_water_mark = self.__get_max_rid()
+            free_blocks = [
+                [block[0], min(block[1], self.high_water_mark)]
+                for block in self.free_blocks + list(self.blocks.values())
+                if block[0] <= min(block[1], self.high_water_mark)
+            ]
+            self.persist(self.high_water_mark, free_blocks)
 
 
 class Record:
+    __slots__ = ("rid", "key_index", "columns")
 
     def __init__(self, rid:int, key_index:int, columns:list)->None:
-        self.rid:RID       = RID(rid)
+        self.rid:int       = int(rid)
         self.key_index:int = key_index
-        self.columns:list = list(columns)
+        # columns built internally are already fresh lists, so avoid copying them
+        self.columns:list  = columns if type(columns) is list else list(columns)
 
     def __str__(self)->str:
         return f"RID {self.rid}: {self.columns}"
 
-    def get_rid(self)->RID:
+    def get_rid(self)->int:
         """
-        Get RID  
+        Get RID
         """
         return self.rid
 
-    def set_rid(self, new_rid:RID)->None:
+    def set_rid(self, new_rid:int)->None:
         """
-        Set RID  
+        Set RID
         """
-        self.rid = new_rid
+        self.rid = int(new_rid)
 
     def get_columns(self)->list:
         """
@@ -74,10 +218,44 @@ class Record:
         """
         Get Page Range index for Record RID
         """
-        return self.rid.get_page_range_index()
+        return get_page_range_index(self.rid)
 
     def get_base_page_index(self)->int:
         """
         Get Base Page index for Record RID
         """
-        return self.rid.get_base_page_index()
+        return get_base_page_index(self.rid)
+
+
+class Record_Batch:
+    """
+    Columnar batch of results: one list of RIDs and one list of values per column.
+    Records are only materialized when iterating.
+    """
+    __slots__ = ("key_index", "rids", "columns")
+
+    def __init__(self, key_index:int, num_columns:int)->None:
+        self.key_index:int       = key_index
+        self.rids:list[int]      = list()
+        self.columns:list[list]  = [list() for _ in range(num_columns)]
+
+    def __len__(self)->int:
+        return len(self.rids)
+
+    def __iter__(self):
+        for i, rid in enumerate(self.rids):
+            yield Record(rid, self.key_index, [column[i] for column in self.columns])
+
+    def append(self, rid:int, columns:list)->None:
+        """
+        Add a row to the batch
+        """
+        self.rids.append(rid)
+        for i, entry_value in enumerate(columns):
+            self.columns[i].append(entry_value)
+
+    def get_column(self, column_index:int)->list:
+        """
+        Get every value of a (projected) column in the batch
+        """
+        return self.columns[column_index]
@@ -0,0 +1,144 @@
+import os
+import shutil
+
+from lstore.bufferpool import BUFFERPOOL
+from lstore.disk import Disk
+from lstore.log_info import Log_Type, Log_Record, read_log_records
+
+
+class Recovery:
+    """
+    ARIES-style restart of a database from its write-ahead log. Analysis starts at the
+    redo LSN of the last checkpoint. Page writes from there on are repeated (redo),
+    including rollbacks of aborted transactions, except those that the checkpoint's
+    dirty page table shows were already on disk. Then the writes of transactions that
+    neither committed nor finished rolling back are undone from their before-images
+    in reverse LSN order. Checkpoints truncate the log, so the work done here is
+    bounded by how much was logged since the last one.
+
+    Runs before the tables are loaded and before the log is reopened: its writes go
+    to the bufferpool but are not logged (redoing or undoing them again is harmless).
+    """
+
+    def __init__(self, db_path:str, log_path:str)->None:
+        self.db_path:str                  = db_path
+        self.log_path:str                 = log_path
+        self.records:list[Log_Record]     = list() # WRITE records since the redo LSN of the last checkpoint
+        self.checkpoint:Log_Record        = None
+        self.losers:set                   = set()  # transactions that did not commit or abort
+        self.table_paths:set[str]         = set()  # tables written since the last checkpoint
+        self.is_closed:bool               = False  # whether the database was closed cleanly (the log ends with a CLOSE)
+
+    def __analyze(self)->None:
+        for record in read_log_records(self.log_path):
+            if record.type == Log_Type.CHECKPOINT: self.checkpoint = record
+            self.is_closed = record.type == Log_Type.CLOSE
+        redo_lsn = 0 if self.checkpoint == None else self.checkpoint.data[0]
+        finished = set()
+        for record in read_log_records(self.log_path):
+            if record.lsn < redo_lsn: continue
+            match record.type:
+                case Log_Type.COMMIT | Log_Type.ABORT:
+                    # an aborted transaction was rolled back by the writes before its ABORT
+                    finished.add(record.transaction_id)
+                case Log_Type.WRITE:
+                    self.records.append(record)
+        # writes outside transactions are autocommitted
+        self.losers = {record.transaction_id for record in self.records if record.transaction_id != None} - finished
+
+    def __access_page(self, page_path:str)->bool:
+        """
+        Create the directories of a page whose creation did not survive the crash.
+        Returns False if its table does not exist.
+        """
+        page_range_path = os.path.dirname(page_path)
+        table_path = os.path.dirname(page_range_path)
+        if not os.path.isdir(table_path): return False
+        if not os.path.isdir(page_range_path):
+            Disk.create_path_directory(page_range_path)
+            Disk.write_to_path_metadata(page_range_path, {
+                "page_range_path": page_range_path,
+                "page_range_index": int(os.path.basename(page_range_path).removeprefix("PR")),
+                "latest_tid": 0,
+                "tps_index": 0,
+            })
+        if not os.path.isdir(page_path):
+            Disk.create_path_directory(page_path)
+            page_type = "base" if os.path.basename(page_path)[:2] == "BP" else "tail"
+            Disk.write_to_path_metadata(page_path, {
+                f"{page_type}_page_path": page_path,
+                f"{page_type}_page_index": int(os.path.basename(page_path)[2:]),
+            })
+        self.table_paths.add(table_path)
+        return True
+
+    def __is_on_disk(self, record:Log_Record)->bool:
+        """
+        Check if the last checkpoint knew the write of record had reached its page on disk
+        """
+        if self.checkpoint == None: return False
+        _, end_lsn, dirty_page_table, _ = self.checkpoint.data
+        if record.lsn >= end_lsn: return False
+        return record.lsn < dirty_page_table.get(record.page_path, end_lsn)
+
+    def __redo(self)->None:
+        for record in self.records:
+            if self.__is_on_disk(record): continue
+            if not self.__access_page(record.page_path): continue
+            BUFFERPOOL.write_entries(record.id, record.page_path, [(column, new) for column, _, new in record.writes])
+
+    def __undo(self)->None:
+        for record in reversed(self.records):
+            if not record.transaction_id in self.losers or not os.path.isdir(record.page_path): continue
+            BUFFERPOOL.write_entries(record.id, record.page_path, [(column, old) for column, old, _ in reversed(record.writes)])
+
+    def __restore_metadata(self)->None:
+        """
+        Make RID and TID counters cover every record written since the last checkpoint
+        """
+        max_ids:dict[str,int] = dict()
+        for record in self.records:
+            max_ids[record.page_path] = max(max_ids.get(record.page_path, 0), record.id)
+        for page_path, max_id in max_ids.items():
+            if not os.path.isdir(page_path): continue
+            page_range_path = os.path.dirname(page_path)
+            match os.path.basename(page_path)[:2]:
+                case "BP": path, key = os.path.dirname(page_range_path), "num_records"
+                case "TP": path, key = page_range_path, "latest_tid"
+            metadata = Disk.read_from_path_metadata(path)
+            if metadata[key] < max_id:
+                metadata[key] = max_id
+                Disk.write_to_path_metadata(path, metadata)
+
+    def __drop_indices(self)->dict[str,list[int]]:
+        """
+        Delete indices of the tables written since the last checkpoint (they are not
+        logged), or of every table if the database was not closed cleanly: index files
+        are written apart from the pages, so they may hold entries of writes lost in the
+        crash (e.g. the unlogged ones of NONE durability). Returns {table path: indexed
+        column indices} to rebuild them from.
+        """
+        indexed_columns = dict()
+        if not self.is_closed:
+            self.table_paths.update(_ for _ in Disk.list_directories_in_path(self.db_path) if os.path.isdir(_))
+        for table_path in self.table_paths:
+            index_dir_path = os.path.join(table_path, "index")
+            if not os.path.isdir(index_dir_path): continue
+            indexed_columns[table_path] = sorted(
+                int(filename.removesuffix(".db")) for filename in os.listdir(index_dir_path) if filename.endswith(".db")
+            )
+            shutil.rmtree(index_dir_path)
+        return indexed_columns
+
+    def run(self)->dict[str,list[int]]:
+        """
+        Recover the pages of the database. Returns {table path: column indices} of the
+        indices to rebuild (empty if there was nothing to recover).
+        """
+        self.__analyze()
+        if not len(self.records) and self.is_closed: return dict()
+        self.__redo()
+        self.__undo()
+        self.__restore_metadata()
+        BUFFERPOOL.commit_writes_to_disk()
+        return self.__drop_indices()
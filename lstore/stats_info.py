@@ -0,0 +1,135 @@
+import json
+import threading
+from math import ceil, log2
+from time import monotonic
+
+import lstore.config as Config
+
+
+class Latency_Histogram:
+    """
+    Log-scale histogram of latencies (seconds). Bucket b holds latencies up to
+    Config.STATS_MIN_LATENCY * 2 ** (b / Config.STATS_BUCKETS_PER_DOUBLING), so
+    percentiles are exact to a few percent in constant memory.
+    """
+
+    def __init__(self)->None:
+        self.buckets:dict[int,int] = dict()
+        self.count:int             = 0
+        self.total:float           = 0
+        self.max:float             = 0
+
+    def __get_bucket(self, latency:float)->int:
+        if latency <= Config.STATS_MIN_LATENCY: return 0
+        return ceil(log2(latency / Config.STATS_MIN_LATENCY) * Config.STATS_BUCKETS_PER_DOUBLING)
+
+    def record(self, latency:float)->None:
+        bucket = self.__get_bucket(latency)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def get_percentile(self, percentile:float)->float:
+        """
+        Get the latency that a fraction percentile (0 to 1) of the recorded latencies are at or below (0 if none)
+        """
+        rank = max(1, ceil(percentile * self.count))
+        num_latencies = 0
+        for bucket in sorted(self.buckets):
+            num_latencies += self.buckets[bucket]
+            if num_latencies >= rank:
+                return min(Config.STATS_MIN_LATENCY * 2 ** (bucket / Config.STATS_BUCKETS_PER_DOUBLING), self.max)
+        return 0
+
+    def to_dict(self)->dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0,
+            "p50": self.get_percentile(0.5),
+            "p99": self.get_percentile(0.99),
+            "p999": self.get_percentile(0.999),
+            "max": self.max,
+        }
+
+
+class Transaction_Stats:
+    """
+    Outcomes and latencies of transactions: commits, aborts by reason, retries, time
+    spent waiting for locks, latency histograms of transactions (from their first
+    attempt until they commit or give up) and of each query type, and commits per
+    Config.STATS_THROUGHPUT_INTERVAL. Each TransactionWorker keeps its own, and every
+    worker also records into TRANSACTION_STATS. to_dict/to_json export them.
+    """
+
+    def __init__(self)->None:
+        self.mutex:threading.Lock = threading.Lock()
+        self.reset()
+
+    def __getstate__(self)->dict:
+        # copies (e.g. of a TransactionWorker) get their own mutex
+        state = self.__dict__.copy()
+        del state["mutex"]
+        return state
+
+    def __setstate__(self, state:dict)->None:
+        self.__dict__.update(state)
+        self.mutex = threading.Lock()
+
+    def reset(self)->None:
+        with self.mutex:
+            self.start_time:float                  = monotonic()
+            self.num_commits:int                   = 0
+            self.aborts:dict[str,int]              = dict() # number of aborted runs by reason
+            self.num_retries:int                   = 0
+            self.lock_wait_time:float              = 0      # seconds
+            self.transaction_latencies:Latency_Histogram = Latency_Histogram()
+            self.query_latencies:dict[str,Latency_Histogram] = dict()
+            self.throughput:list[int]              = list() # commits per interval since start_time
+
+    def record_run(self, is_committed:bool, abort_reason:str, lock_wait_time:float, query_latencies:list[tuple[str,float]], is_retry:bool)->None:
+        """
+        Record a run of a transaction. query_latencies is [(query name, seconds)] of its queries.
+        """
+        with self.mutex:
+            if is_committed:
+                self.num_commits += 1
+                interval = int((monotonic() - self.start_time) / Config.STATS_THROUGHPUT_INTERVAL)
+                if len(self.throughput) <= interval: self.throughput.extend([0] * (interval + 1 - len(self.throughput)))
+                self.throughput[interval] += 1
+            else:
+                self.aborts[abort_reason] = self.aborts.get(abort_reason, 0) + 1
+            if is_retry: self.num_retries += 1
+            self.lock_wait_time += lock_wait_time
+            for query_name, latency in query_latencies:
+                if not query_name in self.query_latencies:
+                    self.query_latencies[query_name] = Latency_Histogram()
+                self.query_latencies[query_name].record(latency)
+
+    def record_transaction(self, latency:float)->None:
+        """
+        Record the latency of a transaction (once it committed or gave up)
+        """
+        with self.mutex:
+            self.transaction_latencies.record(latency)
+
+    def to_dict(self)->dict:
+        with self.mutex:
+            return {
+                "elapsed": monotonic() - self.start_time,
+                "commits": self.num_commits,
+                "aborts": sum(self.aborts.values()),
+                "aborts_by_reason": dict(self.aborts),
+                "retries": self.num_retries,
+                "lock_wait_time": self.lock_wait_time,
+                "transaction_latency": self.transaction_latencies.to_dict(),
+                "query_latencies": {query_name: histogram.to_dict() for query_name, histogram in self.query_latencies.items()},
+                "throughput_interval": Config.STATS_THROUGHPUT_INTERVAL,
+                "throughput": list(self.throughput),
+            }
+
+    def to_json(self, **kwargs)->str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+TRANSACTION_STATS = Transaction_Stats()
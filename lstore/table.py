@@ -1,28 +1,58 @@
 import os
-from copy import deepcopy
+from collections import deque
+from functools import partial
+from itertools import groupby
 from threading import RLock
+from weakref import WeakValueDictionary
 
+import lstore.config as Config
+from lstore.aggregate_info import Aggregate_Type, Partial_Aggregate, merge_partial_aggregates
 from lstore.disk import Disk
-from lstore.lock_info import Lock_Manager
-from lstore.record_info import Record, RID
+from lstore.lock_info import Lock_Manager, Lock_Mode, LOCK_MANAGER
+from lstore.log_info import Log_Manager, LOG_MANAGER
+from lstore.mvcc_info import Snapshot, Version_Manager, VERSION_MANAGER
+from lstore.record_info import RID_Allocator, Record, Record_Batch, get_page_range_index
 from lstore.page_info import Page_Range
 from lstore.index import Index
+from lstore.workspace_info import Workspace, Workspace_Manager, WORKSPACE_MANAGER
+
+
+# tables by path, to find a table from a message of another process
+open_tables:WeakValueDictionary = WeakValueDictionary()
+
+def get_open_table(table_path:str)->"Table":
+    return open_tables[table_path]
+
+
+def persist_num_records(table_path:str, num_records:int, free_rid_blocks:list=None)->None:
+    """
+    Write RID high-water mark (and unused RID blocks below it) of a table to its metadata
+    """
+    metadata = Disk.read_from_path_metadata(table_path)
+    metadata["num_records"] = num_records
+    metadata["free_rid_blocks"] = free_rid_blocks or []
+    Disk.write_to_path_metadata(table_path, metadata)
 
 
 class Table:
 
-    def __init__(self, table_path:str, num_columns:int, key_index:int, num_records:int)->None:
+    def __init__(self, table_path:str, num_columns:int, key_index:int, num_records:int, free_rid_blocks:list=None)->None:
         self.table_path:str                   = table_path
         self.num_columns:int                  = num_columns
         self.key_index:int                    = key_index
-        self.num_records:int                  = num_records
+        self.rid_allocator:RID_Allocator      = RID_Allocator(num_records, partial(persist_num_records, table_path), free_blocks=free_rid_blocks)
 
         self.index:Index                      = Index(self.table_path, self.num_columns, self.key_index)
-        self.lock_manager:Lock_Manager        = Lock_Manager()
+        self.lock_manager:Lock_Manager        = LOCK_MANAGER
+        self.version_manager:Version_Manager  = VERSION_MANAGER
+        self.workspace_manager:Workspace_Manager = WORKSPACE_MANAGER
+        self.log_manager:Log_Manager          = LOG_MANAGER
         self.latch:RLock                      = RLock()
+        self.deleted_entries:deque            = deque() # (timestamp, columns, RID) of committed deletes still in the index
 
         self.page_ranges:dict[int,Page_Range] = dict()
         self.__load_page_ranges()
+        open_tables[self.table_path] = self
 
     def __del__(self)->None:
         # delete page ranges
@@ -32,14 +62,22 @@ class Table:
         del self.index
         self.index = None
 
-    def __increment_num_records(self)->None:
-        # increment number of records in memory
-        self.num_records += 1
+    @property
+    def num_records(self)->int:
+        """
+        Get largest RID allocated so far (RIDs up to it may be unwritten or deleted)
+        """
+        return self.rid_allocator.get_max_rid()
 
-        # increment number of records in data
-        metadata = Disk.read_from_path_metadata(self.table_path)
-        metadata["num_records"] = self.num_records
-        Disk.write_to_path_metadata(self.table_path, metadata)
+    def persist_metadata(self)->None:
+        """
+        Write latest TIDs of the page ranges to their metadata (at checkpoints)
+        """
+        self.__purge_deleted_entries()
+        with self.latch:
+            page_ranges = list(self.page_ranges.values())
+        for page_range in page_ranges:
+            page_range.persist_metadata()
 
     def __get_page_ranges(self)->tuple[list[str],int]:
         page_range_dirs = Disk.list_directories_in_path(self.table_path)
@@ -85,41 +123,216 @@ class Table:
             if not page_range_index in self.page_ranges:
                 self.__create_page_range(page_range_index)
 
-    def __get_columns(self, rid:RID, rollback_version:int=0)->tuple:
+    def __group_rids_by_page_range(self, rids)->dict[int,list[int]]:
+        """
+        Group RIDs by page range index (both in page order).
+        """
+        groups:dict[int,list[int]] = dict()
+        for rid in sorted(rids):
+            page_range_index = get_page_range_index(rid)
+            if not page_range_index in groups:
+                groups[page_range_index] = list()
+            groups[page_range_index].append(rid)
+        return groups
+
+    def __get_scan_rids(self):
+        """
+        Lazily yield the RIDs a full table scan visits in page order: those of base pages
+        that were written (reserved but unwritten base pages are skipped as a whole).
+        """
+        num_records = self.num_records
+        with self.latch:
+            base_pages = sorted(
+                (page_range_index, base_page_index)
+                for page_range_index, page_range in self.page_ranges.items()
+                for base_page_index in list(page_range.base_pages)
+            )
+        for page_range_index, base_page_index in base_pages:
+            first_rid = (page_range_index * Config.NUM_BASE_PAGES_PER_PAGE_RANGE + base_page_index) * Config.NUM_RECORDS_PER_PAGE + 1
+            yield from range(first_rid, min(first_rid + Config.NUM_RECORDS_PER_PAGE - 1, num_records) + 1)
+
+    def __get_columns(self, rid:int, rollback_version:int=0, snapshot:Snapshot=None)->list:
+        with self.latch:
+            # reads never create page ranges (an RID without one was never written)
+            if not get_page_range_index(rid) in self.page_ranges: return None
+            return self.page_ranges[get_page_range_index(rid)].get_record_columns(rid, rollback_version, snapshot=snapshot)
+
+    def __is_record_deleted(self, rid:int, snapshot:Snapshot=None)->bool:
+        with self.latch:
+            if not get_page_range_index(rid) in self.page_ranges: return True
+            return self.page_ranges[get_page_range_index(rid)].is_record_deleted(rid, snapshot)
+
+    def __retire_deleted_entry(self, columns:list, rid:int)->None:
+        """
+        Remove a record whose delete committed from the index once no running
+        transaction may still read it (older snapshots find it through the index)
+        """
+        with self.latch:
+            self.deleted_entries.append((self.version_manager.new_timestamp(), columns, rid))
+        self.__purge_deleted_entries()
+
+    def __purge_deleted_entries(self)->None:
+        oldest_timestamp = self.version_manager.get_oldest_active_timestamp()
         with self.latch:
-            self.__access_page_range(rid.get_page_range_index())
-            return self.page_ranges[rid.get_page_range_index()].get_record_columns(rid, rollback_version)
+            while len(self.deleted_entries) and (oldest_timestamp == None or self.deleted_entries[0][0] < oldest_timestamp):
+                _, columns, rid = self.deleted_entries.popleft()
+                self.index.delete(columns, rid)
+
+    def __locate_key(self, primary_key)->set[int]:
+        """
+        Locate the RID of the record with primary_key for a write, leaving out records
+        whose delete the writer can see (index entries stay until the delete commits)
+        """
+        snapshot = self.version_manager.get_read_snapshot()
+        return {rid for rid in self.index.locate(primary_key, self.key_index) if not self.__is_record_deleted(rid, snapshot)}
+
+    def __lock_record(self, owner, rid:int, lock_mode:Lock_Mode)->bool:
+        return self.lock_manager.acquire(owner, (self.table_path, get_page_range_index(rid), rid), lock_mode)
+
+    def __has_write_conflict(self, rid:int)->bool:
+        """
+        Check (after locking rid) if a transaction would overwrite a version it can't see
+        """
+        snapshot = self.version_manager.get_transaction_snapshot()
+        if snapshot == None: return False
+        self.__access_page_range(get_page_range_index(rid))
+        latest_timestamp = self.page_ranges[get_page_range_index(rid)].get_latest_timestamp(rid)
+        if snapshot.is_write_conflict(latest_timestamp):
+            snapshot.has_write_conflict = True
+            if latest_timestamp > snapshot.timestamp: snapshot.has_newer_conflict = True
+        return snapshot.has_write_conflict
+
+    def __record_read(self, workspace:Workspace, rid:int, snapshot:Snapshot)->None:
+        """
+        Remember the version an optimistic transaction read, for validation at commit
+        """
+        if not workspace.is_validating: return
+        page_range = self.page_ranges[get_page_range_index(rid)]
+        workspace.record_read(self, rid, page_range.get_version_stamp(rid))
+        # reading an older version than the latest one can never validate
+        if snapshot != None and snapshot.is_write_conflict(page_range.get_latest_timestamp(rid)):
+            workspace.has_conflict = True
+
+    def __locate_written_record(self, workspace:Workspace, primary_key, snapshot:Snapshot)->tuple[int,object,list]:
+        """
+        Find the record with primary_key as the transaction sees it (with its buffered
+        writes). Returns (RID or None, inserted primary key or None, columns) as in
+        Workspace.get_written_records, or None if there is no such record.
+        """
+        for rid, inserted_key, columns in workspace.get_written_records(self):
+            if columns != None and columns[self.key_index] == primary_key: return (rid, inserted_key, columns)
+        for rid in self.index.locate(primary_key, self.key_index):
+            # deleted (or given another key) by the transaction
+            if workspace.is_record_written(self, rid): continue
+            # a record committed after the snapshot is written as it is now (and fails validation)
+            columns = self.__get_columns(rid, 0, snapshot)
+            if columns == None: columns = self.__get_columns(rid)
+            # deleted (its index entry stays until the delete commits)
+            if columns == None: continue
+            return (rid, None, columns)
+        return None
+
+    def __buffer_write(self, workspace:Workspace, method_name:str, args:tuple, primary_key=None):
+        """
+        Defer a write of an optimistic or deferred transaction until it commits. Later
+        reads of the transaction see the written record.
+        """
+        snapshot = self.version_manager.get_transaction_snapshot()
+        if primary_key == None:
+            columns = list(args[0])
+            if len(columns) != self.num_columns: return False
+            if self.__locate_written_record(workspace, columns[self.key_index], snapshot) != None: return False
+            workspace.buffer_write(self, method_name, args)
+            workspace.write_record(self, None, columns[self.key_index], columns)
+            return None
+        record = self.__locate_written_record(workspace, primary_key, snapshot)
+        if record == None: return False
+        rid, inserted_key, columns = record
+        if method_name == "update_record":
+            new_columns = args[1]
+            if len(new_columns) != self.num_columns: return False
+            columns = [old if new == None else new for old, new in zip(columns, new_columns)]
+        else:
+            columns = None
+        if rid != None:
+            self.__access_page_range(get_page_range_index(rid))
+            # the written record must not change before commit either
+            self.__record_read(workspace, rid, snapshot)
+        workspace.buffer_write(self, method_name, args, rid)
+        workspace.write_record(self, rid, inserted_key, columns)
+        return True
+
+    def __get_written_rows(self, workspace:Workspace, rollback_version:int)->tuple[set[int],list[tuple[int,list]]]:
+        """
+        Get RIDs of the records the transaction running on this thread has buffered writes
+        to, and (RID, columns) of the records as written (RID 0 if inserted). Only the
+        latest version (rollback_version 0) sees buffered writes.
+        """
+        if workspace == None or not workspace.is_buffering or rollback_version != 0: return (set(), list())
+        written = workspace.get_written_records(self)
+        written_rids = {rid for rid, _, _ in written if rid != None}
+        return (written_rids, [(rid or 0, columns) for rid, _, columns in written if columns != None])
+
+    def validate_reads(self, version_stamps:dict[int,int], write_rids:set[int])->bool:
+        """
+        Lock the records an optimistic transaction read (S) or writes (X) and check
+        they are still at the version it saw. Locks are kept until the transaction ends.
+        """
+        owner = self.lock_manager.get_owner()
+        for rid in sorted(set(version_stamps) | write_rids):
+            if not self.__lock_record(owner, rid, Lock_Mode.X if rid in write_rids else Lock_Mode.S): return False
+            self.__access_page_range(get_page_range_index(rid))
+            if rid in version_stamps and self.page_ranges[get_page_range_index(rid)].get_version_stamp(rid) != version_stamps[rid]: return False
+        return True
+
+    def __project_columns(self, columns:list, selected_columns:list)->list:
+        if selected_columns == None: return columns
+        if len(columns) != len(selected_columns): raise Exception
+        return [_ for i, _ in enumerate(columns) if selected_columns[i] == 1]
 
     def insert_record(self, columns:tuple)->None:
         """
         Insert record to table.
         """
-        # lock RID
-        while not self.lock_manager.acquire_write(RID(self.num_records + 1).get_page_range_index()): pass
+        workspace = self.workspace_manager.get_workspace()
+        if workspace != None and workspace.is_buffering:
+            return self.__buffer_write(workspace, "insert_record", (columns,))
 
-        # create RID from num_records (base RID starts at 1)
-        rid = RID(self.num_records + 1)
+        owner = self.lock_manager.get_owner()
+        timestamp = self.version_manager.begin_write()
 
         # perform checks that may cause operation to be aborted
         try:
             # number of columns in inserted column is wrong
             if len(columns) != self.num_columns: raise Exception
             # key already exists in table
-            if len(self.index.locate(columns[self.key_index], self.key_index)): raise Exception
-        except Exception:
-            return False
-        else:
-            # create record
+            if len(self.__locate_key(columns[self.key_index])): raise Exception
+
+            # create RID (base RID starts at 1)
+            rid = self.rid_allocator.allocate()
+            self.log_manager.log_undo(self.rid_allocator.release, rid)
+
+            # lock RID
+            if not self.__lock_record(owner, rid, Lock_Mode.X): raise Exception
+
+            # insert to physical disk before the index, readers find records through the index without locks
             record = Record(rid, self.key_index, columns)
-            # insert to index
-            self.index.insert(record.get_columns(), rid)
-            # insert to physical disk
             self.__access_page_range(record.get_page_range_index())
-            self.page_ranges[record.get_page_range_index()].insert_record(record)
-            # apply new num_records to table's metadata
-            self.__increment_num_records()
+            self.page_ranges[record.get_page_range_index()].insert_record(record, timestamp)
+
+            with self.latch:
+                # recheck key now that concurrent inserts can't slip in between check and index insert
+                if len(self.__locate_key(columns[self.key_index])):
+                    self.page_ranges[record.get_page_range_index()].delete_record(rid, record.get_columns(), timestamp)
+                    raise Exception
+                # insert to index
+                self.index.insert(record.get_columns(), rid)
+                self.log_manager.log_undo(self.index.delete, record.get_columns(), rid)
+        except Exception:
+            return False
         finally:
-            self.lock_manager.release_write(rid.get_page_range_index())
+            self.version_manager.end_write(timestamp)
+            self.lock_manager.release_operation(owner)
 
     def select_record(self, search_key, search_key_index:int, selected_columns:list=None, rollback_version:int=0)->list[Record]:
         """
@@ -128,33 +341,126 @@ class Table:
         rlist = list()
 
         # get specific RIDs from index
+        skip_deleted = False
         try:
             rids = self.index.locate(search_key, search_key_index)
-        # if no index available, conduct full table scan
+        # if no index available, conduct full table scan (skipping unwritten and deleted RIDs)
         except KeyError:
-            rids = {RID(i) for i in range(1, self.num_records + 1)}
+            rids = self.__get_scan_rids()
+            skip_deleted = True
 
-        # construct a list of records
-        for rid in rids:
-            # lock RID
-            while not self.lock_manager.acquire_read(rid.get_page_range_index(), search_key): pass
-
-            try:
+        # construct a list of records from the snapshot (no locks, writers don't block readers)
+        snapshot = self.version_manager.get_read_snapshot()
+        workspace = self.workspace_manager.get_workspace()
+        written_rids, written_rows = self.__get_written_rows(workspace, rollback_version)
+        try:
+            for rid in rids:
+                if rid in written_rids: continue
+                if skip_deleted and self.__is_record_deleted(rid, snapshot): continue
                 # access column values from disk
-                columns = self.__get_columns(rid, rollback_version)
+                columns = self.__get_columns(rid, rollback_version, snapshot)
+                # record not visible in snapshot
+                if columns == None: continue
+                if workspace != None: self.__record_read(workspace, rid, snapshot)
                 # conditional that avoids creating records for non-searched info (only really useful for full table scans)
                 if columns[search_key_index] != search_key: continue
                 # construct record and add to records list
-                if selected_columns != None:
-                    if len(columns) != len(selected_columns): raise Exception
-                    columns = tuple([_ for i, _ in enumerate(columns) if selected_columns[i] == 1])
-                rlist.append(Record(rid, self.key_index, columns))
+                rlist.append(Record(rid, self.key_index, self.__project_columns(columns, selected_columns)))
+            # records as the transaction wrote them
+            for rid, columns in written_rows:
+                if columns[search_key_index] == search_key:
+                    rlist.append(Record(rid, self.key_index, self.__project_columns(columns, selected_columns)))
+        except Exception:
+            return False
+
+        return rlist
+
+    def prepare_select(self, search_key_index:int, selected_columns:list=None):
+        """
+        Resolve everything a select on search_key_index can know ahead of time (index column,
+        projection, column count checks) and return a specialized
+        select(search_key, rollback_version=0)->list[Record] callable.
+        Falls back to select_record when no index exists on the column (or it was dropped).
+        """
+        if selected_columns != None and len(selected_columns) != self.num_columns: raise ValueError
+        if not search_key_index in self.index.indices:
+            return lambda search_key, rollback_version=0: self.select_record(search_key, search_key_index, selected_columns, rollback_version)
+
+        index_column = self.index.indices[search_key_index]
+        indices = self.index.indices
+        page_ranges = self.page_ranges
+        version_manager = self.version_manager
+        workspace_manager = self.workspace_manager
+        key_index = self.key_index
+        # read the search key first, then only the projected columns
+        column_indices = [search_key_index] + [i for i in range(self.num_columns) if selected_columns == None or selected_columns[i] == 1]
+
+        def prepared_select(search_key, rollback_version:int=0)->list[Record]:
+            if indices.get(search_key_index) is not index_column:
+                return self.select_record(search_key, search_key_index, selected_columns, rollback_version)
+            # optimistic transactions record what they read
+            if workspace_manager.get_workspace() != None:
+                return self.select_record(search_key, search_key_index, selected_columns, rollback_version)
+            rlist = list()
+            snapshot = version_manager.get_read_snapshot()
+            try:
+                for rid in index_column.get_single_entry(search_key):
+                    page_range_index = get_page_range_index(rid)
+                    if not page_range_index in page_ranges:
+                        return self.select_record(search_key, search_key_index, selected_columns, rollback_version)
+                    columns = page_ranges[page_range_index].get_record_columns(rid, rollback_version, column_indices, snapshot)
+                    if columns == None or columns[0] != search_key: continue
+                    rlist.append(Record(rid, key_index, columns[1:]))
             except Exception:
                 return False
-            finally:
-                self.lock_manager.release_read(rid.get_page_range_index())
+            return rlist
 
-        return rlist
+        return prepared_select
+
+    def scan_rows(self, search_key=None, search_key_index:int=None, selected_columns:list=None, rollback_version:int=0):
+        """
+        Lazily yield matching (RID, projected columns) rows from Table in page order. Rows are
+        read from the snapshot taken when the scan starts (without locks). If search_key_index
+        is None, every record is yielded.
+        """
+        # get specific RIDs from index (grouped by page range), otherwise scan page ranges lazily
+        try:
+            if search_key_index == None: raise KeyError
+            rid_groups = self.__group_rids_by_page_range(self.index.locate(search_key, search_key_index)).items()
+            skip_deleted = False
+        except KeyError:
+            rid_groups = groupby(self.__get_scan_rids(), get_page_range_index)
+            skip_deleted = True
+
+        snapshot = self.version_manager.get_scan_snapshot()
+        workspace = self.workspace_manager.get_workspace()
+        written_rids, written_rows = self.__get_written_rows(workspace, rollback_version)
+        for page_range_index, page_range_rids in rid_groups:
+            self.__access_page_range(page_range_index)
+            page_range = self.page_ranges[page_range_index]
+            for rid in page_range_rids:
+                if rid in written_rids: continue
+                if skip_deleted and page_range.is_record_deleted(rid, snapshot): continue
+                columns = page_range.get_record_columns(rid, rollback_version, snapshot=snapshot)
+                if columns == None: continue
+                if workspace != None: self.__record_read(workspace, rid, snapshot)
+                if search_key_index != None and columns[search_key_index] != search_key: continue
+                yield (rid, self.__project_columns(columns, selected_columns))
+        for rid, columns in written_rows:
+            if search_key_index != None and columns[search_key_index] != search_key: continue
+            yield (rid, self.__project_columns(columns, selected_columns))
+
+    def select_batch(self, search_key, search_key_index:int, selected_columns:list=None, rollback_version:int=0)->Record_Batch:
+        """
+        Select matching rows from Table as a columnar Record_Batch (no per-row Record)
+        """
+        batch = Record_Batch(self.key_index, self.num_columns if selected_columns == None else sum(selected_columns))
+        try:
+            for rid, columns in self.scan_rows(search_key, search_key_index, selected_columns, rollback_version):
+                batch.append(rid, columns)
+        except Exception:
+            return False
+        return batch
 
     def sum_records(self, start_range, end_range, aggregate_column_index:int, rollback_version:int=0)->int:
         """
@@ -163,44 +469,150 @@ class Table:
         rsum = 0
 
         # get RIDs
+        skip_deleted = False
         try:
             rids = self.index.locate_range(start_range, end_range, self.key_index)
         except KeyError:
-            rids = {RID(i) for i in range(1, self.num_records + 1)}
+            rids = self.__get_scan_rids()
+            skip_deleted = True
 
-        for rid in rids:
-            # lock RID
-            while not self.lock_manager.acquire_read(rid.get_page_range_index()): pass
-
-            try:
-                # access column from disk
-                columns = self.__get_columns(rid, rollback_version)
+        snapshot = self.version_manager.get_read_snapshot()
+        workspace = self.workspace_manager.get_workspace()
+        written_rids, written_rows = self.__get_written_rows(workspace, rollback_version)
+        try:
+            for page_range_index, page_range_rids in self.__group_rids_by_page_range(rids).items():
+                for rid in page_range_rids:
+                    if rid in written_rids: continue
+                    if skip_deleted and self.__is_record_deleted(rid, snapshot): continue
+                    # access column from disk (as of the snapshot)
+                    columns = self.__get_columns(rid, rollback_version, snapshot)
+                    if columns == None: continue
+                    if workspace != None: self.__record_read(workspace, rid, snapshot)
+                    rsum += columns[aggregate_column_index]
+            for _, columns in written_rows:
+                if start_range != None and columns[self.key_index] < start_range: continue
+                if end_range != None and columns[self.key_index] > end_range: continue
                 rsum += columns[aggregate_column_index]
-            except Exception:
-                return False
-            finally:
-                self.lock_manager.release_read(rid.get_page_range_index())
+        except Exception:
+            return False
 
         return rsum
 
+    def aggregate_records(self, aggregate_type:Aggregate_Type, aggregate_column_index:int, start_range=None, end_range=None, group_by_column_index:int=None, rollback_version:int=0):
+        """
+        Aggregate Records from Table over a primary key range (or the whole table if no range
+        is given), optionally grouped by one column. Partial aggregates are computed per
+        page range and merged.
+        """
+        partials:dict = dict()
+
+        # get RIDs (skip deleted records only when doing a full table scan)
+        skip_deleted = False
+        try:
+            if start_range == None and end_range == None: raise KeyError
+            rids = self.index.locate_range(start_range, end_range, self.key_index)
+        except KeyError:
+            rids = self.__get_scan_rids()
+            skip_deleted = True
+
+        snapshot = self.version_manager.get_read_snapshot()
+        workspace = self.workspace_manager.get_workspace()
+        written_rids, written_rows = self.__get_written_rows(workspace, rollback_version)
+        try:
+            for page_range_index, page_range_rids in self.__group_rids_by_page_range(rids).items():
+                if len(written_rids): page_range_rids = [rid for rid in page_range_rids if not rid in written_rids]
+                self.__access_page_range(page_range_index)
+                merge_partial_aggregates(partials, self.page_ranges[page_range_index].aggregate_records(
+                    page_range_rids, aggregate_column_index, group_by_column_index, rollback_version, skip_deleted, snapshot
+                ))
+                if workspace != None:
+                    for rid in page_range_rids:
+                        if not self.page_ranges[page_range_index].is_record_deleted(rid, snapshot): self.__record_read(workspace, rid, snapshot)
+            for _, columns in written_rows:
+                if start_range != None and columns[self.key_index] < start_range: continue
+                if end_range != None and columns[self.key_index] > end_range: continue
+                group_value = None if group_by_column_index == None else columns[group_by_column_index]
+                if not group_value in partials: partials[group_value] = Partial_Aggregate()
+                partials[group_value].add(columns[aggregate_column_index])
+        except Exception:
+            return False
+
+        if group_by_column_index == None:
+            return partials.get(None, Partial_Aggregate()).get_result(aggregate_type)
+        return {group_value: partial.get_result(aggregate_type) for group_value, partial in partials.items()}
+
     def update_record(self, primary_key, new_columns:tuple)->bool:
         """
         Update Record from Table
         """
+        workspace = self.workspace_manager.get_workspace()
+        if workspace != None and workspace.is_buffering:
+            return self.__buffer_write(workspace, "update_record", (primary_key, new_columns), primary_key)
+        return self.__update_record(primary_key, lambda _: new_columns)
+
+    def __modify_column(self, primary_key, column_index:int, modify)->bool:
+        """
+        Set a column of the record with primary_key to modify(its latest value), or fail
+        if that is None. The value is read and written under one lock of the record.
+        """
+        workspace = self.workspace_manager.get_workspace()
+        if workspace != None and workspace.is_buffering:
+            # buffered as the update it computes (reading the value makes optimistic transactions validate it)
+            record = self.__locate_written_record(workspace, primary_key, self.version_manager.get_transaction_snapshot())
+            if record == None or not 0 <= column_index < self.num_columns: return False
+            new_value = modify(record[2][column_index])
+            if new_value == None: return False
+            new_columns = [None] * self.num_columns
+            new_columns[column_index] = new_value
+            return self.__buffer_write(workspace, "update_record", (primary_key, tuple(new_columns)), primary_key)
+
+        def get_new_columns(old_columns:list)->list:
+            new_value = modify(old_columns[column_index])
+            if new_value == None: return None
+            new_columns = [None] * self.num_columns
+            new_columns[column_index] = new_value
+            return new_columns
+        return self.__update_record(primary_key, get_new_columns)
+
+    def increment_record(self, primary_key, column_index:int, amount:int=1)->bool:
+        """
+        Atomically add amount to a column of the record with primary_key
+        """
+        return self.__modify_column(primary_key, column_index, lambda value: value + amount)
+
+    def compare_and_set_record(self, primary_key, column_index:int, expected_value:int, new_value:int)->bool:
+        """
+        Atomically set a column of the record with primary_key to new_value if it is
+        expected_value. Returns False if it is not.
+        """
+        return self.__modify_column(primary_key, column_index, lambda value: new_value if value == expected_value else None)
+
+    def __update_record(self, primary_key, get_new_columns)->bool:
+        """
+        Update the record with primary_key to get_new_columns(its latest columns) (None
+        fails the update). The columns are read after the record is locked.
+        """
         # identify RID
-        rids = self.index.locate(primary_key, self.key_index)
-        if len(rids) == 0: return
+        rids = self.__locate_key(primary_key)
+        if len(rids) == 0: return False
         assert len(rids) == 1
         rid = rids.pop()
 
         # lock RID
-        while not self.lock_manager.acquire_write(rid.get_page_range_index()): pass
+        owner = self.lock_manager.get_owner()
+        if not self.__lock_record(owner, rid, Lock_Mode.X):
+            self.lock_manager.release_operation(owner)
+            return False
+        timestamp = self.version_manager.begin_write()
 
         # perform checks that may abort the operation
         try:
-            # get old columns associated to RID
-            old_columns = deepcopy(self.__get_columns(rid))
-            if len(old_columns) != len(new_columns): raise Exception
+            # the latest version was written by a concurrent transaction
+            if self.__has_write_conflict(rid): raise Exception
+            # get old columns associated to RID (skipping versions of aborted transactions)
+            old_columns = self.__get_columns(rid, 0, self.version_manager.get_read_snapshot())
+            new_columns = get_new_columns(old_columns)
+            if new_columns == None or len(old_columns) != len(new_columns): raise Exception
 
             # only update if the new columns are changing values in the record
             is_update_necessary = False
@@ -213,36 +625,54 @@ class Table:
         else:
             # update entry values associated to RID in index
             self.index.update(old_columns, new_columns, rid)
+            updated_columns = [old if new == None else new for old, new in zip(old_columns, new_columns)]
+            self.log_manager.log_undo(self.index.update, updated_columns, old_columns, rid)
             # update record in disk
             # print(f"UPDATING KEY {primary_key} OF RID {rid} AND ORIGINAL COLUMNS {old_columns} WITH NEW COLUMNS {new_columns}")
-            self.__access_page_range(rid.get_page_range_index())
-            self.page_ranges[rid.get_page_range_index()].update_record(rid, old_columns, new_columns)
+            self.__access_page_range(get_page_range_index(rid))
+            self.page_ranges[get_page_range_index(rid)].update_record(rid, old_columns, new_columns, timestamp)
             return True
         finally:
-            self.lock_manager.release_write(rid.get_page_range_index())
+            self.version_manager.end_write(timestamp)
+            self.lock_manager.release_operation(owner)
 
     def delete_record(self, primary_key)->bool:
         """
         Delete Record from Table
         """
-        rids = self.index.locate(primary_key, self.key_index)
+        workspace = self.workspace_manager.get_workspace()
+        if workspace != None and workspace.is_buffering:
+            return self.__buffer_write(workspace, "delete_record", (primary_key,), primary_key)
+
+        rids = self.__locate_key(primary_key)
+        if len(rids) == 0: return False
         assert len(rids) == 1
         rid = rids.pop()
 
         # lock RID
-        while not self.lock_manager.acquire_write(rid.get_page_range_index()): pass
+        owner = self.lock_manager.get_owner()
+        if not self.__lock_record(owner, rid, Lock_Mode.X):
+            self.lock_manager.release_operation(owner)
+            return False
+        timestamp = self.version_manager.begin_write()
+        deleted_columns = None
 
         try:
-            # delete record from index
-            columns = self.__get_columns(rid)
+            # the latest version was written by a concurrent transaction
+            if self.__has_write_conflict(rid): raise Exception
+            # get columns associated to RID (skipping versions of aborted transactions)
+            columns = self.__get_columns(rid, 0, self.version_manager.get_read_snapshot())
+            if columns == None: raise Exception
         except Exception:
             return False
         else:
-            # delete info associated to RID in index
-            self.index.delete(columns, rid)
-            # delete record from disk
-            self.__access_page_range(rid.get_page_range_index())
-            self.page_ranges[rid.get_page_range_index()].delete_record(rid)
+            # delete record from disk (snapshots older than the delete still read it)
+            self.__access_page_range(get_page_range_index(rid))
+            self.page_ranges[get_page_range_index(rid)].delete_record(rid, columns, timestamp)
+            # delete info associated to RID in index after the delete commits (readers find the record until then)
+            if not self.log_manager.log_commit(self.__retire_deleted_entry, columns, rid): deleted_columns = columns
             return True
         finally:
-            self.lock_manager.release_write(rid.get_page_range_index())
+            self.version_manager.end_write(timestamp)
+            if deleted_columns != None: self.__retire_deleted_entry(deleted_columns, rid)
+            self.lock_manager.release_operation(owner)
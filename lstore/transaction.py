@@ -1,19 +1,51 @@
+from enum import Enum
+from itertools import count
+from random import uniform
+from time import perf_counter, sleep
+
+import lstore.config as Config
 from lstore.bufferpool import BUFFERPOOL
+from lstore.lock_info import DEFAULT_TIMEOUT, LOCK_MANAGER
+from lstore.log_info import Durability, LOG_MANAGER
+from lstore.mvcc_info import VERSION_MANAGER
 from lstore.table import Table
+from lstore.workspace_info import Workspace, WORKSPACE_MANAGER
+
+
+class Transaction_Mode(Enum):
+    LOCKING = "2PL"    # writes lock records as they run (strict 2PL)
+    OPTIMISTIC = "OCC" # writes are buffered, reads are validated at commit
+    DEFERRED = "DEFERRED" # writes are buffered and lock records at commit, only write conflicts abort (snapshot isolation)
+
+
+class Abort_Reason(Enum):
+    CONFLICT = "CONFLICT"         # a lock could not be taken in time, or a write-write conflict
+    VALIDATION = "VALIDATION"     # records read by an optimistic transaction changed before it committed
+    QUERY_FAILED = "QUERY_FAILED" # a query returned False for another reason (e.g. a missing or duplicate key)
 
 
-num_transactions = 0
+# ids own locks and log records, so they must be unique even if transactions are created concurrently
+transaction_ids = count()
 
 class Transaction:
 
-    def __init__(self):
+    def __init__(self, mode=Config.TRANSACTION_MODE, durability=None):
         """
-        Creates a transaction object.
+        Creates a transaction object. durability (a log_info.Durability or its value)
+        overrides the database's for its commit.
         """
-        global num_transactions
-        self.id:int = num_transactions
-        num_transactions += 1
+        self.id:int = next(transaction_ids)
         self.queries:list[tuple] = list() # [(query method, (args))]
+        self.savepoints:list[int] = list() # indices of the queries savepoints were added before
+        self.mode:Transaction_Mode = Transaction_Mode(mode)
+        self.timestamp:int       = None   # age used to resolve lock conflicts (kept across retries)
+        self.lock_conflict:bool  = False  # whether the last run aborted because of a lock (or write-write) conflict
+        self.abort_reason:Abort_Reason = None # why the last run aborted (None if it committed)
+        self.query_latencies:list[tuple[str,float]] = list() # (query name, seconds) of the queries of the last run
+        self.results:list        = list() # results of the queries of the last run
+        self.lock_timeout:float  = DEFAULT_TIMEOUT # seconds a query waits for a lock (Config.TRANSACTION_LOCK_TIMEOUT by default)
+        self.durability:Durability = None if durability == None else Durability(durability)
+        self.commit_lsn:int      = 0      # LSN of the commit of the last run (0 if not logged)
 
     def add_query(self, query, table:Table, *args):
         """
@@ -28,19 +60,187 @@ class Transaction:
         # use grades_table for aborting
 
 
-    def run(self):
-        for query, args in self.queries:
-            result = query(*args)
-            # If the query has failed the transaction should abort
+    def add_savepoint(self)->None:
+        """
+        Add a savepoint after the queries added so far. If a later query of a locking
+        (2PL) transaction fails because of a lock conflict, the transaction rolls back
+        to the last savepoint and runs the queries since then again (up to
+        Config.SAVEPOINT_MAX_RETRIES times) instead of aborting. Locks it already
+        holds are kept. The queries run again also see what transactions older than it
+        committed meanwhile (as a statement of a read committed transaction would), but
+        never versions of younger ones: a write-write conflict with one aborts the
+        transaction at once. Optimistic and deferred transactions only conflict at
+        commit, so they abort as usual.
+        """
+        self.savepoints.append(len(self.queries))
+
+    def set_mode(self, mode)->None:
+        """
+        Choose how the transaction handles concurrency (Transaction_Mode or its value, e.g. "OCC")
+        """
+        self.mode = Transaction_Mode(mode)
+
+    def run(self, is_durable:bool=True):
+        """
+        Run the queries and commit. Returns True if the transaction committed. Unless
+        is_durable, the commit returns without waiting for the log: make it durable
+        later with LOG_MANAGER.make_durable(commit_lsn, durability).
+        """
+        # locks taken by the queries belong to this transaction until it commits or aborts (strict 2PL)
+        if self.timestamp == None:
+            self.timestamp = LOCK_MANAGER.new_timestamp()
+        self.lock_conflict = False
+        self.abort_reason = None
+        LOCK_MANAGER.begin_transaction(self.id, self.timestamp, self.lock_timeout)
+        # page writes of the queries are logged as the transaction's
+        LOG_MANAGER.begin_transaction(self.id)
+        # reads see the snapshot taken here (MVCC), writes still lock
+        VERSION_MANAGER.begin_transaction()
+        # optimistic and deferred transactions buffer their writes in a workspace until commit
+        if self.mode != Transaction_Mode.LOCKING:
+            WORKSPACE_MANAGER.begin(Workspace(is_validating=self.mode == Transaction_Mode.OPTIMISTIC))
+        self.results = list()
+        self.query_latencies = list()
+        savepoint = None # (query index, undo log savepoint) of the last savepoint reached
+        num_savepoint_retries = 0
+        i = 0
+        while i < len(self.queries):
+            if i in self.savepoints and (savepoint == None or savepoint[0] != i):
+                savepoint = (i, LOG_MANAGER.get_savepoint())
+                num_savepoint_retries = 0
+            query, args = self.queries[i]
+            result = self.__run_query(query, args)
+            # If the query has failed the transaction should abort (or retry the queries since the last savepoint)
             if result == False:
-                return self.abort()
+                if savepoint == None or num_savepoint_retries >= Config.SAVEPOINT_MAX_RETRIES: return self.abort()
+                if not self.__rollback_to_savepoint(savepoint[1]): return self.abort()
+                num_savepoint_retries += 1
+                del self.results[savepoint[0]:]
+                i = savepoint[0]
+                # jitter keeps conflicting transactions from retrying in lockstep
+                sleep(uniform(0, min(Config.TRANSACTION_RETRY_BACKOFF * 2 ** num_savepoint_retries, Config.MAX_TRANSACTION_RETRY_BACKOFF)))
+                continue
+            self.results.append(result)
+            i += 1
+        if self.mode != Transaction_Mode.LOCKING and not self.__validate():
+            return self.abort()
+        return self.commit(is_durable)
+
+    def execute(self)->tuple[bool,Workspace]:
+        """
+        Run the queries optimistically without committing (e.g. in a worker process):
+        writes are only buffered into the returned workspace. Returns (whether every
+        query succeeded, workspace); commit the workspace with commit_workspace.
+        """
+        workspace = Workspace()
+        VERSION_MANAGER.begin_transaction()
+        WORKSPACE_MANAGER.begin(workspace)
+        try:
+            self.results = list()
+            self.query_latencies = list()
+            for query, args in self.queries:
+                result = self.__run_query(query, args)
+                if result == False: return (False, workspace)
+                self.results.append(result)
+            return (True, workspace)
+        finally:
+            WORKSPACE_MANAGER.end()
+            # nothing was written, so the snapshot just ends
+            VERSION_MANAGER.end_transaction(True)
+
+    def commit_workspace(self, workspace:Workspace)->bool:
+        """
+        Validate the reads of a workspace filled by execute and apply its writes
+        """
+        if self.timestamp == None:
+            self.timestamp = LOCK_MANAGER.new_timestamp()
+        self.lock_conflict = False
+        self.abort_reason = None
+        LOCK_MANAGER.begin_transaction(self.id, self.timestamp, self.lock_timeout)
+        LOG_MANAGER.begin_transaction(self.id)
+        VERSION_MANAGER.begin_transaction()
+        WORKSPACE_MANAGER.begin(workspace)
+        if not self.__validate():
+            return self.abort()
         return self.commit()
 
+    def __run_query(self, query, args:tuple):
+        start_time = perf_counter()
+        try:
+            return query(*args)
+        finally:
+            self.query_latencies.append((getattr(query, "__name__", type(query).__name__), perf_counter() - start_time))
+
+    def __rollback_to_savepoint(self, savepoint:int)->bool:
+        """
+        Undo the changes made since savepoint (of the undo log) after a query failed.
+        Returns False if running the queries since then again can not help: the query
+        did not fail because of a lock or write-write conflict, the conflicting version
+        was written by a younger transaction (it stays invisible to this one), or the
+        transaction was wounded.
+        """
+        if self.mode != Transaction_Mode.LOCKING: return False
+        snapshot = VERSION_MANAGER.get_transaction_snapshot()
+        if snapshot != None and snapshot.has_newer_conflict: return False
+        if not LOCK_MANAGER.had_conflict(self.id) and not (snapshot != None and snapshot.has_write_conflict): return False
+        if not LOCK_MANAGER.clear_conflicts(self.id): return False
+        LOG_MANAGER.rollback_transaction(self.id, BUFFERPOOL.write_entries, savepoint)
+        # the writer it conflicted with may have committed by the time the queries run again
+        VERSION_MANAGER.refresh_transaction_snapshot()
+        return True
+
+    def __validate(self)->bool:
+        """
+        Validate the reads of an optimistic transaction (if any) and apply its buffered
+        writes, one page range at a time. Records read or written are locked while
+        validating (until the transaction ends).
+        """
+        workspace = WORKSPACE_MANAGER.get_workspace()
+        workspace.is_buffering = False
+        if workspace.has_conflict:
+            self.lock_conflict = True
+            self.abort_reason = Abort_Reason.VALIDATION
+            return False
+        for table in workspace.get_tables():
+            if not table.validate_reads(workspace.get_read_set(table), workspace.get_write_set(table)):
+                self.lock_conflict = True
+                self.abort_reason = Abort_Reason.VALIDATION
+                return False
+        for table, method_name, args in workspace.get_writes():
+            if getattr(table, method_name)(*args) == False: return False
+        return True
+
     def abort(self):
-        BUFFERPOOL.abort_writes_to_disk()
+        self.lock_conflict = self.lock_conflict or LOCK_MANAGER.had_conflict(self.id)
+        WORKSPACE_MANAGER.end()
+        # hide the transaction's versions from readers, then undo its writes before its locks let other writers in
+        if VERSION_MANAGER.end_transaction(False): self.lock_conflict = True
+        if self.abort_reason == None: self.abort_reason = Abort_Reason.CONFLICT if self.lock_conflict else Abort_Reason.QUERY_FAILED
+        LOG_MANAGER.rollback_transaction(self.id, BUFFERPOOL.write_entries)
+        VERSION_MANAGER.end_rollback()
+        LOG_MANAGER.abort_transaction(self.id)
+        LOCK_MANAGER.end_transaction(self.id)
         return False
 
-    def commit(self):
-        BUFFERPOOL.commit_writes_to_disk()
+    def commit(self, is_durable:bool=True):
+        WORKSPACE_MANAGER.end()
+        # durable once the log is (as the durability level asks); pages are written out lazily
+        self.commit_lsn = LOG_MANAGER.commit_transaction(self.id, self.durability if is_durable else Durability.NONE)
+        VERSION_MANAGER.end_transaction(True)
+        # changes deferred until the writes are visible (e.g. index entries of deleted records go)
+        LOG_MANAGER.end_commit()
+        LOCK_MANAGER.end_transaction(self.id)
         return True
 
+    def is_retryable(self)->bool:
+        """
+        Check if the transaction aborted because of a lock or write-write conflict (and may commit if run again)
+        """
+        return self.lock_conflict
+
+    def get_locks(self)->dict:
+        """
+        Get {resource: mode} of the locks currently held by this transaction
+        """
+        return LOCK_MANAGER.get_owner_locks(self.id)
+
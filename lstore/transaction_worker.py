@@ -1,24 +1,91 @@
-from threading import Thread
+import multiprocessing
+from random import uniform
+from threading import Condition, Thread
+from time import perf_counter, sleep
 
+import lstore.config as Config
+from lstore.bufferpool import BUFFERPOOL
+from lstore.lock_info import LOCK_MANAGER
+from lstore.log_info import LOG_MANAGER
+from lstore.stats_info import Transaction_Stats, TRANSACTION_STATS
+from lstore.table import get_open_table, open_tables
 from lstore.transaction import Transaction
+from lstore.workspace_info import Workspace
 
 threads = list()
 
+
+class Fork_Gate:
+    """
+    Keeps commits of process workers out of fork(): a forked child must not inherit
+    latches that a committing thread of the parent holds.
+    """
+
+    def __init__(self)->None:
+        self.condition:Condition = Condition()
+        self.num_committing:int  = 0
+        self.num_forking:int     = 0     # workers waiting to fork
+        self.is_starting:bool    = False # a worker is forking
+
+    def enter(self)->None:
+        with self.condition:
+            while self.num_forking:
+                self.condition.wait()
+            self.num_committing += 1
+
+    def exit(self)->None:
+        with self.condition:
+            self.num_committing -= 1
+            self.condition.notify_all()
+
+    def start_process(self, process)->None:
+        """
+        Flush the bufferpool (the process reads pages the pool does not hold from disk)
+        and start process while no other worker commits, flushes or forks
+        """
+        with self.condition:
+            self.num_forking += 1
+            while self.num_committing or self.is_starting:
+                self.condition.wait()
+            self.is_starting = True
+        try:
+            BUFFERPOOL.commit_writes_to_disk()
+            process.start()
+        finally:
+            with self.condition:
+                self.num_forking -= 1
+                self.is_starting = False
+                self.condition.notify_all()
+
+
+FORK_GATE = Fork_Gate()
+
 num_transaction_workers = 0
 
 class TransactionWorker:
 
-    def __init__(self, transactions:list = [])->None:
+    def __init__(self, transactions:list = [], mode=None, use_process:bool=Config.TRANSACTION_WORKER_USE_PROCESS, use_pipeline:bool=Config.TRANSACTION_WORKER_USE_PIPELINE)->None:
         """
         Creates a transaction worker object.
+        If mode is given ("2PL" or "OCC"), every transaction of the worker runs in that mode.
+        If use_process is set, queries run in forked processes and commit here (see __run_with_processes).
+        If use_pipeline is set (and not use_process), commits are made durable in batches (see __run_pipelined).
         """
         global num_transaction_workers
         self.id:int                         = num_transaction_workers
         num_transaction_workers += 1
         self.transactions:list[Transaction] = transactions
-        self.stats:list[bool]               = list()
+        self.stats:list[bool]               = list() # whether each transaction eventually committed
         self.result:int                     = 0
+        self.num_commits:int                = 0
+        self.num_aborts:int                 = 0      # aborted runs, including the ones that were retried
+        self.num_retries:int                = 0
         self.thread:Thread                  = None
+        self.mode                           = mode
+        self.use_process:bool               = use_process
+        self.use_pipeline:bool              = use_pipeline
+        self.metrics:Transaction_Stats      = Transaction_Stats() # also recorded into TRANSACTION_STATS
+        self.pending_commits:list[tuple]    = list() # (transaction, is retry, lock wait time, start time) of commits not durable yet
 
 
     def add_transaction(self, t:Transaction):
@@ -32,7 +99,7 @@ class TransactionWorker:
         """
         Runs all transaction as a thread
         """
-        thread = Thread(target=self.__run, args=())
+        thread = Thread(target=self.__run_with_processes if self.use_process else self.__run, args=())
         self.thread = thread
         global threads
         threads.append(thread)
@@ -46,9 +113,173 @@ class TransactionWorker:
         self.thread.join()
 
 
+    def __record_run(self, transaction:Transaction, is_committed:bool, is_retry:bool, lock_wait_time:float=None)->None:
+        abort_reason = None if is_committed else transaction.abort_reason.value
+        if lock_wait_time == None: lock_wait_time = LOCK_MANAGER.get_lock_wait_time()
+        for metrics in (self.metrics, TRANSACTION_STATS):
+            metrics.record_run(is_committed, abort_reason, lock_wait_time, transaction.query_latencies, is_retry)
+
+
+    def __record_transaction(self, latency:float)->None:
+        self.metrics.record_transaction(latency)
+        TRANSACTION_STATS.record_transaction(latency)
+
+
+    def __record_commit(self, transaction:Transaction, is_retry:bool, start_time:float, lock_wait_time:float=None)->None:
+        self.__record_run(transaction, True, is_retry, lock_wait_time)
+        self.num_commits += 1
+        self.__record_transaction(perf_counter() - start_time)
+
+
+    def __run_transaction(self, transaction:Transaction, is_durable:bool=True, is_retried:bool=False)->bool:
+        """
+        Run transaction, retrying with exponential backoff while it aborts because of lock conflicts
+        (is_retried if its first run here already retries it). Unless is_durable, its commit
+        is recorded once it is durable (see __run_pipelined).
+        """
+        if self.mode != None: transaction.set_mode(self.mode)
+        start_time = perf_counter()
+        backoff = Config.TRANSACTION_RETRY_BACKOFF
+        # running a transaction again is only safe because Transaction.abort rolls back every write
+        # of the aborted run (LOG_MANAGER.rollback_transaction), so a retry never applies a write twice
+        for attempt in range(Config.MAX_TRANSACTION_RETRIES + 1):
+            if attempt:
+                self.num_retries += 1
+                # jitter keeps conflicting transactions from retrying in lockstep
+                sleep(uniform(0, backoff))
+                backoff = min(backoff * 2, Config.MAX_TRANSACTION_RETRY_BACKOFF)
+            # each transaction returns True if committed or False if aborted
+            is_retry = is_retried or attempt > 0
+            if transaction.run(is_durable):
+                if is_durable: self.__record_commit(transaction, is_retry, start_time)
+                else: self.pending_commits.append((transaction, is_retry, LOCK_MANAGER.get_lock_wait_time(), start_time))
+                return True
+            self.__record_run(transaction, False, is_retry)
+            self.num_aborts += 1
+            if not transaction.is_retryable(): break
+        self.__record_transaction(perf_counter() - start_time)
+        return False
+
+
+    def get_stats(self)->dict:
+        """
+        Get commit/abort/retry counts of the worker, aborts by reason, lock wait time,
+        latency histograms and throughput over time (see Transaction_Stats.to_dict).
+        The result can be exported with json.dumps.
+        """
+        return {
+            "transactions": len(self.stats),
+            **self.metrics.to_dict(),
+        }
+
+
     def __run(self):
+        if self.use_pipeline: return self.__run_pipelined()
         for transaction in self.transactions:
-            # each transaction returns True if committed or False if aborted
-            self.stats.append(transaction.run())
+            self.stats.append(self.__run_transaction(transaction))
+        # stores the number of transactions that committed
+        self.result = len(list(filter(lambda x: x, self.stats)))
+
+
+    def __run_pipelined(self):
+        """
+        Run the transactions back to back without waiting for the log at each commit,
+        then make every Config.TRANSACTION_WORKER_PIPELINE_BATCH commits durable with
+        one flush. Locks are still released at each commit: a transaction depending on
+        one of the batch commits after it in the log, so it can not become durable first.
+        Outcomes (stats, commit counts and metrics) are only reported once their batch
+        is durable.
+        """
+        for start in range(0, len(self.transactions), Config.TRANSACTION_WORKER_PIPELINE_BATCH):
+            transactions = self.transactions[start:start + Config.TRANSACTION_WORKER_PIPELINE_BATCH]
+            is_committed = [self.__run_transaction(transaction, is_durable=False) for transaction in transactions]
+            # the first flush covers the whole batch, the others return at once
+            for transaction, is_transaction_committed in zip(transactions, is_committed):
+                if is_transaction_committed: LOG_MANAGER.make_durable(transaction.commit_lsn, transaction.durability)
+            for transaction, is_retry, lock_wait_time, start_time in self.pending_commits:
+                self.__record_commit(transaction, is_retry, start_time, lock_wait_time)
+            self.pending_commits = list()
+            self.stats.extend(is_committed)
         # stores the number of transactions that committed
         self.result = len(list(filter(lambda x: x, self.stats)))
+
+
+    def __run_with_processes(self):
+        """
+        Run the queries in forked processes, but validate and commit every transaction
+        here: writes need the parent's pages, latches, locks and log, so commits stay
+        serialized (in one thread per worker). Only query execution escapes the GIL,
+        which does not make up for forking and shipping workspaces back on short
+        transactions (the m3 testers ran slower than with threads).
+        """
+        # a fresh process per batch keeps the snapshot its queries read from recent
+        for start in range(0, len(self.transactions), Config.TRANSACTION_WORKER_PROCESS_BATCH):
+            self.__run_batch_in_process(self.transactions[start:start + Config.TRANSACTION_WORKER_PROCESS_BATCH])
+        # stores the number of transactions that committed
+        self.result = len(list(filter(lambda x: x, self.stats)))
+
+
+    def __run_batch_in_process(self, transactions:list[Transaction])->None:
+        """
+        Fork a process executing transactions and commit what it sends back. Transactions
+        that fail validation (they read data changed since the fork) or that could not run
+        in the process are run again here.
+        """
+        parent_connection, child_connection = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.get_context("fork").Process(target=self.__run_in_process, args=(transactions, child_connection), daemon=True)
+        FORK_GATE.start_process(process)
+        child_connection.close()
+
+        num_received = 0
+        try:
+            while num_received < len(transactions):
+                i, is_executed, results, query_latencies, state = parent_connection.recv()
+                num_received += 1
+                FORK_GATE.enter()
+                try:
+                    if is_executed:
+                        start_time = perf_counter()
+                        workspace = Workspace()
+                        workspace.set_state(state, get_open_table)
+                        is_committed = transactions[i].commit_workspace(workspace)
+                        # the queries ran in the process
+                        transactions[i].query_latencies = query_latencies
+                        self.__record_run(transactions[i], is_committed, False)
+                        if is_committed:
+                            transactions[i].results = results
+                            self.num_commits += 1
+                            self.stats.append(True)
+                            self.__record_transaction(perf_counter() - start_time + sum(latency for _, latency in query_latencies))
+                            continue
+                        self.num_aborts += 1
+                        self.num_retries += 1
+                    self.stats.append(self.__run_transaction(transactions[i], is_retried=is_executed))
+                finally:
+                    FORK_GATE.exit()
+        except EOFError:
+            # the process died, run the rest here
+            for transaction in transactions[num_received:]:
+                self.stats.append(self.__run_transaction(transaction))
+        finally:
+            parent_connection.close()
+            process.join()
+
+
+    def __run_in_process(self, transactions:list[Transaction], connection)->None:
+        """
+        Worker process: execute transactions optimistically against the state inherited
+        from the parent (a snapshot as of the fork) and send back their results, read sets
+        and buffered writes. The parent validates and commits them, so nothing is written here.
+        """
+        BUFFERPOOL.detach_from_disk()
+        LOG_MANAGER.detach()
+        for table in list(open_tables.values()):
+            table.index.detach_from_disk()
+        for i, transaction in enumerate(transactions):
+            try:
+                is_executed, workspace = transaction.execute()
+                connection.send((i, is_executed, transaction.results, transaction.query_latencies, workspace.get_state()))
+            except Exception:
+                # results that can't be sent back are recomputed by the parent
+                connection.send((i, False, None, None, None))
+        connection.close()
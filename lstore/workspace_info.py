@@ -0,0 +1,131 @@
+import threading
+
+from lstore.record_info import get_page_range_index
+
+
+class Workspace:
+    """
+    Private state of a transaction that defers its writes: its writes, which are
+    buffered until commit, the columns of the records they wrote (so the transaction
+    reads its own writes) and, if it is optimistic, the version stamp of every record
+    it read (the base indirection TID when it was read, 0 if the record was deleted),
+    validated at commit.
+    """
+
+    def __init__(self, is_validating:bool=True)->None:
+        self.read_set:dict[tuple[object,int],int] = dict()  # (table, RID): version stamp
+        self.writes:list[tuple[object,str,tuple,int]] = list()  # [(table, table method name, args, RID written or None)]
+        self.write_set:set[tuple[object,int]]     = set()   # (table, RID) of updated/deleted records
+        self.records:dict[tuple[object,int],list] = dict()  # (table, RID): columns after the buffered writes (None if deleted)
+        self.new_records:dict[tuple[object,object],list] = dict() # (table, inserted primary key): same, for inserted records
+        self.is_validating:bool                    = is_validating # reads are validated at commit (otherwise only write conflicts abort)
+        self.is_buffering:bool                     = True
+        self.has_conflict:bool                     = False  # a read saw a version newer than the snapshot
+
+    def record_read(self, table, rid:int, version_stamp:int)->None:
+        """
+        Remember the version of a record the transaction read (the first read counts)
+        """
+        if self.is_validating and not (table, rid) in self.read_set:
+            self.read_set[(table, rid)] = version_stamp
+
+    def buffer_write(self, table, method_name:str, args:tuple, rid:int=None)->None:
+        """
+        Defer a write (of the record at rid, if it exists yet) until commit
+        """
+        self.writes.append((table, method_name, args, rid))
+        if rid != None: self.write_set.add((table, rid))
+
+    def write_record(self, table, rid:int, primary_key, columns:list)->None:
+        """
+        Remember columns of a record after a buffered write (None if deleted). Records
+        inserted by the transaction have no RID yet and go by the key they were inserted with.
+        """
+        if rid != None: self.records[(table, rid)] = columns
+        else:           self.new_records[(table, primary_key)] = columns
+
+    def get_written_records(self, table)->list[tuple[int,object,list]]:
+        """
+        Get (RID or None, inserted primary key or None, columns or None) of the records of table that were written
+        """
+        written = [(rid, None, columns) for (written_table, rid), columns in self.records.items() if written_table is table]
+        written += [(None, primary_key, columns) for (written_table, primary_key), columns in self.new_records.items() if written_table is table]
+        return written
+
+    def is_record_written(self, table, rid:int)->bool:
+        return (table, rid) in self.records
+
+    def get_writes(self)->list[tuple[object,str,tuple]]:
+        """
+        Get buffered writes as (table, table method name, args), grouped by table and page
+        range so that they are applied one page range at a time. Writes to the same record
+        keep their order; inserts come last (they may reuse keys deleted before).
+        """
+        def get_group(write:tuple)->tuple:
+            table, _, _, rid = write
+            if rid == None: return (table.table_path, 1, 0)
+            return (table.table_path, 0, get_page_range_index(rid))
+        return [(table, method_name, args) for table, method_name, args, _ in sorted(self.writes, key=get_group)]
+
+    def get_tables(self)->list:
+        """
+        Get tables read or written by the transaction (in path order)
+        """
+        tables = {table for table, _ in self.read_set} | {table for table, _, _, _ in self.writes}
+        return sorted(tables, key=lambda table: table.table_path)
+
+    def get_read_set(self, table)->dict[int,int]:
+        """
+        Get {RID: version stamp} of the records of table that were read
+        """
+        return {rid: version_stamp for (read_table, rid), version_stamp in self.read_set.items() if read_table is table}
+
+    def get_write_set(self, table)->set[int]:
+        """
+        Get RIDs of the records of table that will be updated or deleted
+        """
+        return {rid for write_table, rid in self.write_set if write_table is table}
+
+    def get_state(self)->tuple:
+        """
+        Get picklable state of the workspace (tables are replaced by their paths)
+        """
+        return (
+            [(table.table_path, rid, version_stamp) for (table, rid), version_stamp in self.read_set.items()],
+            [(table.table_path, method_name, args, rid) for table, method_name, args, rid in self.writes],
+            [(table.table_path, rid) for table, rid in self.write_set],
+            self.has_conflict,
+        )
+
+    def set_state(self, state:tuple, get_table)->None:
+        """
+        Restore state from get_state (get_table maps a table path to its table)
+        """
+        read_set, writes, write_set, self.has_conflict = state
+        self.read_set = {(get_table(table_path), rid): version_stamp for table_path, rid, version_stamp in read_set}
+        self.writes = [(get_table(table_path), method_name, args, rid) for table_path, method_name, args, rid in writes]
+        self.write_set = {(get_table(table_path), rid) for table_path, rid in write_set}
+
+
+class Workspace_Manager:
+
+    def __init__(self)->None:
+        self.context = threading.local() # workspace of the transaction running on the thread
+
+    def begin(self, workspace:Workspace)->None:
+        """
+        Make queries run by this thread use workspace
+        """
+        self.context.workspace = workspace
+
+    def end(self)->None:
+        self.context.workspace = None
+
+    def get_workspace(self)->Workspace:
+        """
+        Get workspace of the transaction running on this thread (None if there is none)
+        """
+        return getattr(self.context, "workspace", None)
+
+
+WORKSPACE_MANAGER = Workspace_Manager()
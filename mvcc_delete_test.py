@@ -0,0 +1,118 @@
+import os
+import tempfile
+from threading import Event, Thread
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+grades_table.index.create_index(1)
+query = Query(grades_table)
+for key in range(1, 21):
+    query.insert(key, key % 5, key)
+total = sum(range(1, 21))
+num_records = 20
+
+def get_rows(value, column_index=0):
+    return sorted(record.columns for record in query.select(value, column_index, [1, 1, 1]))
+
+def run_paused(transaction):
+    """
+    Run transaction on a thread that stops inside it until the returned event is set
+    """
+    paused = Event()
+    resume = Event()
+    def pause():
+        paused.set()
+        resume.wait()
+        return True
+    transaction.add_query(pause, grades_table)
+    results = list()
+    thread = Thread(target=lambda: results.append(transaction.run()), daemon=True)
+    thread.start()
+    paused.wait()
+    return (thread, resume, results)
+
+def assert_visible(key):
+    assert get_rows(key) == [[key, key % 5, key]]
+    assert [key, key % 5, key] in get_rows(key % 5, 1)
+    assert [record.columns for record in query.prepare_select(0, [1, 1, 1])(key)] == [[key, key % 5, key]]
+    assert [record.columns for record in query.select_cursor(key, 0, [1, 1, 1])] == [[key, key % 5, key]]
+    assert query.sum(1, 20, 2) == total
+    assert query.count() == num_records
+    assert query.table.select_record(key, 2, [1, 1, 1])[0].columns == [key, key % 5, key]
+
+# readers don't see a delete before it commits (by key, other indices, full scans and aggregates)
+transaction = Transaction()
+transaction.add_query(query.delete, grades_table, 5)
+thread, resume, results = run_paused(transaction)
+assert_visible(5)
+resume.set()
+thread.join()
+assert results == [True]
+assert get_rows(5) == [] and not [5, 0, 5] in get_rows(0, 1)
+assert query.sum(1, 20, 2) == total - 5 and query.count() == num_records - 1
+assert grades_table.index.locate(5, 0) == set()
+total -= 5
+num_records -= 1
+print("Uncommitted delete finished")
+
+# readers never see a delete that aborts, and the record can still be written
+transaction = Transaction()
+transaction.add_query(query.delete, grades_table, 6)
+thread, resume, results = run_paused(transaction)
+transaction.add_query(query.insert, grades_table, 7, 7, 7)
+assert_visible(6)
+resume.set()
+thread.join()
+assert results == [False]
+assert_visible(6)
+assert query.update(6, None, 2, None) == True
+assert get_rows(6) == [[6, 2, 6]]
+print("Aborted delete finished")
+
+# a transaction keeps reading the record deleted after its snapshot was taken
+reads = list()
+def read(key):
+    reads.append(get_rows(key))
+    return True
+transaction = Transaction()
+transaction.add_query(read, grades_table, 8)
+thread, resume, results = run_paused(transaction)
+transaction.add_query(read, grades_table, 8)
+assert query.delete(8) == True
+assert get_rows(8) == []
+resume.set()
+thread.join()
+assert results == [True]
+assert reads == [[[8, 3, 8]], [[8, 3, 8]]]
+total -= 8
+print("Snapshot read of deleted record finished")
+
+# a transaction sees its own delete, and can insert the key again
+transaction = Transaction()
+transaction.add_query(query.delete, grades_table, 9)
+transaction.add_query(read, grades_table, 9)
+transaction.add_query(query.insert, grades_table, 9, 1, 90)
+transaction.add_query(read, grades_table, 9)
+assert transaction.run() == True
+assert reads[2:] == [[], [[9, 1, 90]]]
+assert get_rows(9) == [[9, 1, 90]] and query.delete(9) == True and query.delete(9) == False
+assert query.insert(9, 9 % 5, 9) != False
+print("Delete and insert in one transaction finished")
+
+# deletes are still applied after reopening
+db.close()
+del grades_table, query, transaction
+db = Database()
+db.open(path)
+grades_table = db.get_table("Grades")
+query = Query(grades_table)
+assert get_rows(5) == [] and get_rows(8) == [] and get_rows(6) == [[6, 2, 6]] and get_rows(9) == [[9, 4, 9]]
+assert query.sum(1, 20, 2) == total
+db.close()
+print("Reopen after deletes finished")
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from threading import Event, Thread
+
+from lstore.db import Database
+from lstore.lock_info import LOCK_MANAGER
+from lstore.query import Query
+from lstore.transaction import Abort_Reason, Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(1, 11):
+    query.insert(key, 0, 0)
+
+def get_row(key):
+    return query.select(key, 0, [1, 1, 1])[0].columns
+
+def run_paused(transaction):
+    """
+    Run transaction on a thread that stops inside it until the returned event is set
+    """
+    paused = Event()
+    resume = Event()
+    def pause():
+        paused.set()
+        resume.wait()
+        return True
+    transaction.add_query(pause, grades_table)
+    results = list()
+    thread = Thread(target=lambda: results.append(transaction.run()), daemon=True)
+    thread.start()
+    paused.wait()
+    return (thread, resume, results)
+
+# writes of an optimistic transaction are buffered (and lock nothing) until it commits
+transaction = Transaction(mode="OCC")
+transaction.add_query(query.update, grades_table, 1, None, 1, None)
+transaction.add_query(query.insert, grades_table, 11, 0, 0)
+thread, resume, results = run_paused(transaction)
+assert get_row(1) == [1, 0, 0] and query.select(11, 0, [1, 1, 1]) == []
+assert transaction.get_locks() == dict()
+resume.set()
+thread.join()
+assert results == [True] and transaction.abort_reason == None
+assert get_row(1) == [1, 1, 0] and get_row(11) == [11, 0, 0]
+assert LOCK_MANAGER.get_lock_holders() == dict()
+print("Buffered writes finished")
+
+# it aborts if a record it read changed before it committed
+transaction = Transaction(mode="OCC")
+transaction.add_query(query.select, grades_table, 2, 0, [1, 1, 1])
+thread, resume, results = run_paused(transaction)
+transaction.add_query(query.update, grades_table, 3, None, 3, None)
+assert query.update(2, None, 2, None) == True
+resume.set()
+thread.join()
+assert results == [False] and transaction.abort_reason == Abort_Reason.VALIDATION and transaction.is_retryable()
+assert get_row(3) == [3, 0, 0]
+# and commits when run again
+assert transaction.run() == True and transaction.results[0][0].columns == [2, 2, 0]
+assert get_row(3) == [3, 3, 0]
+print("Read validation finished")
+
+# records it writes are validated too
+transaction = Transaction(mode="OCC")
+transaction.add_query(query.update, grades_table, 4, None, 4, None)
+thread, resume, results = run_paused(transaction)
+assert query.update(4, None, None, 4) == True
+resume.set()
+thread.join()
+assert results == [False] and transaction.abort_reason == Abort_Reason.VALIDATION and transaction.is_retryable()
+assert get_row(4) == [4, 0, 4]
+print("Write validation finished")
+
+# a query that fails aborts without a retry
+transaction = Transaction(mode="OCC")
+transaction.add_query(query.update, grades_table, 5, None, 5, None)
+transaction.add_query(query.insert, grades_table, 6, 0, 0)
+assert transaction.run() == False and transaction.abort_reason == Abort_Reason.QUERY_FAILED and not transaction.is_retryable()
+assert get_row(5) == [5, 0, 0]
+print("Failed query finished")
+
+db.close()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+from random import Random
+
+from lstore.aggregate_info import Aggregate_Type
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 4, 0)
+grades_table.index.create_index(2)
+serial_query = Query(grades_table, parallel=False)
+parallel_query = Query(grades_table, parallel=True)
+random = Random(3)
+# several page ranges, with updated and deleted records
+number_of_records = 5000
+for key in range(number_of_records):
+    serial_query.insert(key, random.randint(0, 100), key % 7, 0)
+for key in random.sample(range(number_of_records), 1000):
+    serial_query.update(key, None, random.randint(0, 100), None, 1)
+for key in random.sample(range(number_of_records), 200):
+    serial_query.delete(key)
+
+def get_rows(records):
+    return sorted(record.columns for record in records)
+
+def assert_same_scans():
+    for aggregate_type in Aggregate_Type:
+        assert parallel_query.group_by(2, 1, aggregate_type) == serial_query.group_by(2, 1, aggregate_type)
+    for start_range, end_range in [(None, None), (100, 3000), (number_of_records, number_of_records + 10)]:
+        for aggregate_type in Aggregate_Type:
+            assert parallel_query.aggregate(aggregate_type, 1, start_range, end_range) == serial_query.aggregate(aggregate_type, 1, start_range, end_range)
+        if start_range != None:
+            assert parallel_query.sum(start_range, end_range, 1) == serial_query.sum(start_range, end_range, 1)
+            assert parallel_query.sum_version(start_range, end_range, 1, -1) == serial_query.sum_version(start_range, end_range, 1, -1)
+    # selects on columns without an index scan in parallel, the others use the index
+    for value in [0, 50, 101]:
+        assert get_rows(parallel_query.select(value, 1, [1, 1, 1, 1])) == get_rows(serial_query.select(value, 1, [1, 1, 1, 1]))
+        assert get_rows(parallel_query.select_version(value, 1, [1, 0, 1, 0], -1)) == get_rows(serial_query.select_version(value, 1, [1, 0, 1, 0], -1))
+    assert get_rows(parallel_query.select(3, 2, [1, 1, 1, 1])) == get_rows(serial_query.select(3, 2, [1, 1, 1, 1]))
+    assert get_rows(parallel_query.select(1, 3, [1, 1, 1, 1])) == get_rows(serial_query.select(1, 3, [1, 1, 1, 1]))
+
+assert parallel_query.count() == number_of_records - 200
+assert_same_scans()
+print("Parallel scans finished")
+
+# dirty pages are written out before the workers read them
+for key in range(0, number_of_records, 10):
+    serial_query.update(key, None, None, None, 2)
+assert parallel_query.count(aggregate_column_index=3) == serial_query.count(aggregate_column_index=3)
+assert_same_scans()
+print("Parallel scans after updates finished")
+
+# reads in transactions stay serial: they see the transaction's own writes
+sums = list()
+def read_sums():
+    sums.append((parallel_query.sum(0, 9, 1), serial_query.sum(0, 9, 1)))
+    return True
+transaction = Transaction(mode="DEFERRED")
+transaction.add_query(serial_query.update, grades_table, 1, None, 1000, None, None)
+transaction.add_query(read_sums, grades_table)
+assert transaction.run() == True
+assert sums[0][0] == sums[0][1] == serial_query.sum(0, 9, 1)
+print("Parallel scans in transactions finished")
+
+parallel_query.parallel_scan.shutdown()
+db.close()
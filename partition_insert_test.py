@@ -0,0 +1,61 @@
+import os
+import tempfile
+from threading import Thread
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.record_info import Insert_Partition, get_base_page_index, get_page_range_index
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+num_threads = 4
+number_of_records = 1000
+
+def insert_concurrently(table, first_key):
+    query = Query(table)
+    def insert(keys):
+        for key in keys:
+            assert query.insert(key, key % 10, 0) != False
+    threads = [Thread(target=insert, args=(range(first_key + i * number_of_records, first_key + (i + 1) * number_of_records),)) for i in range(num_threads)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+
+def get_rids(table, keys):
+    return [rid for key in keys for rid in table.index.locate(key, 0)]
+
+for partition in Insert_Partition:
+    table = db.create_table(partition.value, 3, 0)
+    table.rid_allocator.partition = partition
+    insert_concurrently(table, 0)
+    query = Query(table)
+    assert query.count() == num_threads * number_of_records and query.sum(0, num_threads * number_of_records, 0) == sum(range(num_threads * number_of_records))
+    # each thread wrote to base pages (and with PAGE_RANGE page ranges) no other thread wrote to
+    locations = list()
+    for i in range(num_threads):
+        rids = get_rids(table, range(i * number_of_records, (i + 1) * number_of_records))
+        assert len(rids) == number_of_records
+        if partition == Insert_Partition.PAGE_RANGE: locations.append({get_page_range_index(rid) for rid in rids})
+        if partition == Insert_Partition.BASE_PAGE: locations.append({(get_page_range_index(rid), get_base_page_index(rid)) for rid in rids})
+    for i in range(len(locations)):
+        for j in range(i):
+            assert not locations[i] & locations[j], partition
+    print(f"{partition.value} partitioned inserts finished")
+
+# RIDs left unused by the partitions are handed out again after reopening
+max_rids = {partition: db.get_table(partition.value).rid_allocator.get_max_rid() for partition in Insert_Partition}
+db.close()
+del table, query
+db = Database()
+db.open(path)
+for partition in Insert_Partition:
+    table = db.get_table(partition.value)
+    query = Query(table)
+    assert query.count() == num_threads * number_of_records
+    for key in range(num_threads * number_of_records, num_threads * number_of_records + 100):
+        assert query.insert(key, 0, 0) != False
+    assert query.count() == num_threads * number_of_records + 100
+    assert min(get_rids(table, range(num_threads * number_of_records, num_threads * number_of_records + 100))) < max_rids[partition]
+    assert [record.columns for record in query.select(num_threads * number_of_records + 50, 0, [1, 1, 1])] == [[num_threads * number_of_records + 50, 0, 0]]
+print("Reopen after partitioned inserts finished")
+db.close()
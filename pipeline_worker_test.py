@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import lstore.config as Config
+import lstore.log_info as log_info
+from lstore.db import Database
+from lstore.log_info import LOG_MANAGER
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path, "FSYNC")
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(10):
+    query.insert(key, 0, 0)
+
+# count fsyncs of the log
+fsync = log_info.os.fsync
+num_fsyncs = 0
+def counting_fsync(fd):
+    global num_fsyncs
+    num_fsyncs += 1
+    fsync(fd)
+log_info.os.fsync = counting_fsync
+
+def run_workers(use_pipeline, column):
+    workers = list()
+    for _ in range(2):
+        transactions = list()
+        for key in range(Config.TRANSACTION_WORKER_PIPELINE_BATCH * 5):
+            transaction = Transaction()
+            transaction.add_query(query.increment, grades_table, key % 10, column)
+            transactions.append(transaction)
+        workers.append(TransactionWorker(transactions, use_pipeline=use_pipeline))
+    for worker in workers: worker.run()
+    for worker in workers: worker.join()
+    return workers
+
+num_transactions = Config.TRANSACTION_WORKER_PIPELINE_BATCH * 10
+workers = run_workers(False, 1)
+num_unpipelined_fsyncs = num_fsyncs
+num_fsyncs = 0
+workers = run_workers(True, 2)
+log_info.os.fsync = fsync
+# commits of a batch share one flush of the log
+assert num_fsyncs <= num_transactions // Config.TRANSACTION_WORKER_PIPELINE_BATCH + 2 < num_unpipelined_fsyncs, (num_fsyncs, num_unpipelined_fsyncs)
+assert query.sum(0, 9, 1) == query.sum(0, 9, 2) == num_transactions
+print("Pipelined commits finished")
+
+# outcomes are reported once they are durable
+for worker in workers:
+    assert worker.result == worker.num_commits == len(worker.transactions) and worker.stats == [True] * len(worker.transactions)
+    assert worker.get_stats()["commits"] == len(worker.transactions)
+    assert all(0 < transaction.commit_lsn <= LOG_MANAGER.flushed_lsn for transaction in worker.transactions)
+# failing transactions in a batch abort on their own
+transactions = list()
+for key in range(20):
+    transaction = Transaction()
+    transaction.add_query(query.increment, grades_table, key, 1)
+    transactions.append(transaction)
+worker = TransactionWorker(transactions, use_pipeline=True)
+worker.run()
+worker.join()
+assert worker.stats == [True] * 10 + [False] * 10 and worker.result == worker.num_commits == 10 and worker.num_retries == 0
+assert query.sum(0, 9, 1) == num_transactions + 10
+print("Pipelined outcomes finished")
+db.close()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+from random import Random
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 4, 0)
+grades_table.index.create_index(1)
+query = Query(grades_table)
+random = Random(3)
+number_of_records = 3000
+for key in range(number_of_records):
+    query.insert(key, key % 50, key, 0)
+for key in random.sample(range(number_of_records), 1000):
+    query.update(key, None, None, random.randint(0, 100), 1)
+for key in random.sample(range(number_of_records), 100):
+    query.delete(key)
+
+def get_rows(records):
+    return sorted(record.columns for record in records)
+
+# prepared selects return what select does, by key, other indexed and unindexed columns
+for search_key_index, search_keys in [(0, range(0, number_of_records, 7)), (1, range(50)), (2, range(0, 100, 10))]:
+    for projected_columns_index in [[1, 1, 1, 1], [0, 1, 0, 1]]:
+        select = query.prepare_select(search_key_index, projected_columns_index)
+        for search_key in search_keys:
+            assert get_rows(select(search_key)) == get_rows(query.select(search_key, search_key_index, projected_columns_index))
+            assert get_rows(select(search_key, -1)) == get_rows(query.select_version(search_key, search_key_index, projected_columns_index, -1))
+assert query.prepare_select(0)(number_of_records) == []
+print("Prepared select finished")
+
+# dropping or creating an index after preparing still selects correctly
+select = query.prepare_select(1, [1, 0, 0, 0])
+grades_table.index.drop_index(1)
+assert get_rows(select(7)) == get_rows(query.select(7, 1, [1, 0, 0, 0]))
+grades_table.index.create_index(1)
+assert get_rows(select(7)) == get_rows(query.select(7, 1, [1, 0, 0, 0]))
+# projections must cover every column
+try:
+    query.prepare_select(0, [1, 1])
+    assert False
+except ValueError:
+    pass
+print("Prepared select after index changes finished")
+
+# in transactions they see the transaction's own writes
+reads = list()
+select = query.prepare_select(0, [1, 1, 1, 1])
+key = next(key for key in range(number_of_records) if len(query.select(key, 0, [1, 1, 1, 1])))
+def read():
+    reads.append(get_rows(select(key)))
+    return True
+for mode in ["2PL", "OCC"]:
+    transaction = Transaction(mode=mode)
+    transaction.add_query(query.update, grades_table, key, None, None, None, 1000)
+    transaction.add_query(read, grades_table)
+    assert transaction.run() == True
+    assert reads[-1][0][3] == 1000
+    assert query.update(key, None, None, None, 0) == True
+print("Prepared select in transactions finished")
+db.close()
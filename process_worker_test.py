@@ -0,0 +1,58 @@
+import os
+import tempfile
+from random import Random
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(1, 21):
+    query.insert(key, 0, key)
+
+# workers running queries in processes increment the same records concurrently
+random = Random(3)
+num_workers = 4
+num_transactions = 40
+workers = list()
+increments = {key: 0 for key in range(1, 21)}
+for _ in range(num_workers):
+    transactions = list()
+    for _ in range(num_transactions):
+        keys = random.sample(range(1, 21), 2)
+        transaction = Transaction()
+        for key in keys:
+            transaction.add_query(query.select, grades_table, key, 0, [1, 0, 1])
+            transaction.add_query(query.increment, grades_table, key, 1)
+            increments[key] += 1
+        transactions.append(transaction)
+    workers.append(TransactionWorker(transactions, use_process=True))
+# a transaction that fails in the process fails again when run here
+failing_transaction = Transaction()
+failing_transaction.add_query(query.insert, grades_table, 1, 0, 0)
+workers[0].add_transaction(failing_transaction)
+for worker in workers: worker.run()
+for worker in workers: worker.join()
+
+assert workers[0].stats[-1] == False and workers[0].stats[:-1] == [True] * num_transactions
+assert all(worker.stats == [True] * num_transactions for worker in workers[1:])
+for worker in workers:
+    assert worker.result == worker.num_commits == num_transactions
+    # transactions that failed validation are counted as retries
+    assert worker.num_aborts == worker.num_retries + (worker == workers[0])
+    stats = worker.get_stats()
+    assert stats["commits"] == num_transactions and stats["retries"] == worker.num_retries
+# every increment was applied once, and selects sent back their results
+for key, num_increments in increments.items():
+    assert query.select(key, 0, [1, 1, 1])[0].columns == [key, num_increments, key]
+for worker in workers:
+    for transaction in worker.transactions[:num_transactions]:
+        key = transaction.queries[0][1][0]
+        assert transaction.results[0][0].columns == [key, key]
+print("Process workers finished")
+db.close()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import tracemalloc
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.record_info import RID, TID, Record, Record_Batch
+
+# records are slotted and keep the column lists they are given
+columns = [1, 2, 3]
+record = Record(RID(5), 0, columns)
+assert not hasattr(record, "__dict__") and record.rid == 5 and type(record.rid) is int
+assert record.columns is columns and Record(5, 0, (1, 2, 3)).columns == columns
+# RIDs and TIDs stay usable as the ints they wrap
+assert RID(5) == 5 and TID(5) == RID(5) and {RID(5), 5} == {5} and int(TID(7)) == 7
+print("Slotted records finished")
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+number_of_records = 5000
+for key in range(number_of_records):
+    query.insert(key, key % 10, key)
+query.update(3, None, 30, None)
+
+# selects return records with int RIDs
+records = query.select(3, 0, [1, 1, 0])
+assert len(records) == 1 and type(records[0].rid) is int and records[0].columns == [3, 30]
+assert sorted(record.columns[0] for record in query.select(3, 1, [1, 0, 0])) == list(range(13, number_of_records, 10))
+
+# batches hold one list per projected column instead of a record per row
+batch = query.select_batch(3, 1, [1, 0, 1])
+assert isinstance(batch, Record_Batch) and len(batch) == number_of_records // 10 - 1
+assert sorted(batch.get_column(0)) == sorted(batch.get_column(1)) == list(range(13, number_of_records, 10))
+assert sorted(record.columns for record in batch) == [[key, key] for key in range(13, number_of_records, 10)]
+print("Record batches finished")
+
+# and allocate less than the same rows as records
+def get_peak_allocation(select):
+    tracemalloc.start()
+    rows = select()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+record_allocation = get_peak_allocation(lambda: [record for record in query.select_cursor(None, None)])
+batch_allocation = get_peak_allocation(lambda: query.select_batch(None, None))
+assert batch_allocation < record_allocation, (batch_allocation, record_allocation)
+assert len(query.select_batch(None, None)) == number_of_records
+print("Record batch allocation finished")
+db.close()
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from lstore.db import Database
+from lstore.query import Query
+
+# runs in a child process that dies without closing the database
+CRASHING_SESSION = r'''
+import os
+import sys
+
+from lstore.bufferpool import BUFFERPOOL
+from lstore.db import Database
+from lstore.log_info import LOG_MANAGER
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+db.open(sys.argv[1])
+grades_table = db.create_table("Grades", 3, 0)
+grades_table.index.create_index(1)
+query = Query(grades_table)
+for key in range(1, 101):
+    transaction = Transaction()
+    transaction.add_query(query.insert, grades_table, key, key % 10, 0)
+    assert transaction.run()
+for key in range(2, 101, 2):
+    transaction = Transaction()
+    transaction.add_query(query.update, grades_table, key, None, 100, 1)
+    assert transaction.run()
+
+# the log (and pages) of a running transaction reach disk, then the process dies before it commits
+def crash():
+    LOG_MANAGER.flush()
+    BUFFERPOOL.commit_writes_to_disk()
+    os._exit(0)
+transaction = Transaction()
+transaction.add_query(query.update, grades_table, 1, None, 200, 2)
+transaction.add_query(query.insert, grades_table, 500, 200, 2)
+transaction.add_query(query.delete, grades_table, 3)
+transaction.add_query(crash, grades_table)
+transaction.run()
+'''
+
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+subprocess.run([sys.executable, "-c", CRASHING_SESSION, path], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+print("Crashed session finished")
+
+db = Database()
+db.open(path)
+grades_table = db.get_table("Grades")
+query = Query(grades_table)
+# committed transactions are redone, the running one is undone
+for key in range(1, 101):
+    expected = [key, 100, 1] if key % 2 == 0 else [key, key % 10, 0]
+    columns = [record.columns for record in query.select(key, 0, [1, 1, 1])]
+    assert columns == [expected], (key, columns)
+assert query.select(500, 0, [1, 1, 1]) == []
+# the secondary index matches the recovered records
+assert sorted(record.columns[0] for record in query.select(100, 1, [1, 1, 1])) == list(range(2, 101, 2))
+assert sorted(record.columns[0] for record in query.select(3, 1, [1, 1, 1])) == [3, 13, 23, 33, 43, 53, 63, 73, 83, 93]
+assert query.select(200, 1, [1, 1, 1]) == []
+print("Recovery finished")
+
+# the recovered database keeps working across a clean reopen
+query.update(1, None, 11, 11)
+query.insert(600, 6, 6)
+db.close()
+del grades_table, query
+db = Database()
+db.open(path)
+query = Query(db.get_table("Grades"))
+assert query.select(1, 0, [1, 1, 1])[0].columns == [1, 11, 11]
+assert query.select(600, 0, [1, 1, 1])[0].columns == [600, 6, 6]
+assert sorted(record.columns[0] for record in query.select(11, 1, [1, 1, 1])) == [1]
+db.close()
+print("Reopen after recovery finished")
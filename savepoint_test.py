@@ -0,0 +1,63 @@
+import os
+import tempfile
+import threading
+from time import sleep
+
+from lstore.db import Database
+from lstore.lock_info import LOCK_MANAGER
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+db.open(os.path.join(tempfile.mkdtemp(), "ECS165"))
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(1, 11):
+    query.insert(key, 0, 0)
+LOCK_MANAGER.set_conflict_policy("NO_WAIT")
+
+def get_columns(key):
+    return query.select(key, 0, [1, 1, 1])[0].columns
+
+# an older transaction holds the lock on key 5 for a while: the queries after the savepoint run again until it commits
+is_holding = threading.Event()
+def hold_lock():
+    transaction = Transaction()
+    transaction.add_query(query.increment, grades_table, 5, 2)
+    transaction.add_query(lambda: is_holding.set() or sleep(0.05) or True, grades_table)
+    assert transaction.run() == True
+holder = threading.Thread(target=hold_lock)
+holder.start()
+is_holding.wait()
+section_runs = list()
+transaction = Transaction()
+transaction.add_query(query.increment, grades_table, 1, 1)
+transaction.add_savepoint()
+transaction.add_query(lambda: section_runs.append(1) or True, grades_table)
+transaction.add_query(query.increment, grades_table, 2, 1)
+transaction.add_query(query.increment, grades_table, 5, 1)
+assert transaction.run() == True
+holder.join()
+assert len(section_runs) > 1, section_runs
+assert get_columns(1)[1] == 1 and get_columns(2)[1] == 1 and get_columns(5)[1:] == [1, 1]
+print("Savepoint retry after lock conflict finished")
+
+# a younger transaction commits a version first: it never becomes visible, so the transaction aborts without retrying
+def write_younger():
+    transaction = Transaction()
+    transaction.add_query(query.update, grades_table, 7, None, 70, None)
+    assert transaction.run() == True
+section_runs = list()
+transaction = Transaction()
+transaction.add_query(query.increment, grades_table, 6, 1)
+transaction.add_query(lambda: [writer.start(), writer.join()] and True, grades_table)
+transaction.add_savepoint()
+transaction.add_query(lambda: section_runs.append(1) or True, grades_table)
+transaction.add_query(query.increment, grades_table, 7, 1)
+writer = threading.Thread(target=write_younger)
+assert transaction.run() == False
+assert len(section_runs) == 1, section_runs
+assert transaction.is_retryable()
+assert get_columns(6)[1] == 0 and get_columns(7)[1] == 70
+print("Savepoint write-write conflict finished")
+db.close()
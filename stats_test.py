@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+from threading import Event, Thread, Timer
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.stats_info import Latency_Histogram, TRANSACTION_STATS
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+# percentiles of a histogram are within a bucket of the exact ones
+histogram = Latency_Histogram()
+latencies = [i / 10000 for i in range(1, 1001)]
+for latency in latencies:
+    histogram.record(latency)
+for percentile, exact in [(0.5, latencies[499]), (0.99, latencies[989]), (0.999, latencies[998])]:
+    assert exact <= histogram.get_percentile(percentile) <= exact * 1.1, (percentile, histogram.get_percentile(percentile))
+assert histogram.to_dict()["max"] == 0.1 and histogram.to_dict()["count"] == 1000 and Latency_Histogram().get_percentile(0.5) == 0
+print("Latency histogram finished")
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(10):
+    query.insert(key, 0, 0)
+TRANSACTION_STATS.reset()
+
+# a transaction holds record 0 for a while, so the worker's first transaction waits for it (then
+# aborts, as it wrote the record after that transaction's snapshot was taken, and is retried)
+paused = Event()
+resume = Event()
+def pause():
+    paused.set()
+    resume.wait()
+    return True
+transaction = Transaction()
+transaction.add_query(query.update, grades_table, 0, None, 1, None)
+transaction.add_query(pause, grades_table)
+thread = Thread(target=transaction.run, daemon=True)
+thread.start()
+paused.wait()
+Timer(0.2, resume.set).start()
+
+transactions = list()
+for key in range(10):
+    transaction = Transaction()
+    transaction.add_query(query.select, grades_table, key, 0, [1, 1, 1])
+    transaction.add_query(query.increment, grades_table, key, 2)
+    transactions.append(transaction)
+# one fails (the key exists)
+transaction = Transaction()
+transaction.add_query(query.insert, grades_table, 0, 0, 0)
+transactions.append(transaction)
+worker = TransactionWorker(transactions)
+worker.run()
+worker.join()
+thread.join()
+other_worker = TransactionWorker([Transaction() for _ in range(5)])
+other_worker.run()
+other_worker.join()
+
+# per-worker stats are exported as JSON
+stats = json.loads(json.dumps(worker.get_stats()))
+assert stats["transactions"] == 11 and stats["commits"] == 10 and stats["aborts"] == 2 and stats["aborts_by_reason"] == {"CONFLICT": 1, "QUERY_FAILED": 1}
+assert stats["retries"] == 1 and stats["lock_wait_time"] >= 0.1
+assert stats["transaction_latency"]["count"] == 11 and stats["transaction_latency"]["max"] >= 0.1
+assert stats["query_latencies"]["select"]["count"] == 11 and stats["query_latencies"]["increment"]["count"] == 11 and stats["query_latencies"]["insert"]["count"] == 1
+assert stats["query_latencies"]["select"]["p50"] <= stats["query_latencies"]["select"]["p99"] <= stats["query_latencies"]["select"]["max"]
+assert sum(stats["throughput"]) == 10
+# global stats add up every worker
+global_stats = json.loads(TRANSACTION_STATS.to_json())
+assert global_stats["commits"] == 15 and global_stats["aborts"] == 2 and sum(global_stats["throughput"]) == 15
+assert global_stats["transaction_latency"]["count"] == 16
+print("Transaction stats finished")
+db.close()
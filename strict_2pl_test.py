@@ -0,0 +1,74 @@
+import os
+import tempfile
+from threading import Event, Thread
+
+from lstore.db import Database
+from lstore.lock_info import LOCK_MANAGER, Lock_Mode
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+db = Database()
+path = os.path.join(tempfile.mkdtemp(), "ECS165")
+db.open(path)
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(1, 11):
+    query.insert(key, 0, 0)
+rid = grades_table.index.locate(1, 0).pop()
+record_resource = (grades_table.table_path, 0, rid)
+
+# operations outside transactions release their locks when they finish
+assert query.update(1, None, 1, None) == True
+assert LOCK_MANAGER.get_lock_holders() == dict()
+print("Operation locks finished")
+
+# a transaction keeps its locks until it commits
+paused = Event()
+resume = Event()
+def pause():
+    paused.set()
+    resume.wait()
+    return True
+transaction = Transaction()
+transaction.add_query(query.update, grades_table, 1, None, 2, None)
+transaction.add_query(pause, grades_table)
+results = list()
+thread = Thread(target=lambda: results.append(transaction.run()), daemon=True)
+thread.start()
+paused.wait()
+assert transaction.get_locks()[record_resource] == Lock_Mode.X
+assert LOCK_MANAGER.get_lock_holders()[record_resource] == {transaction.id: "X"}
+# other transactions can't write the record meanwhile (but still read it)
+other_transaction = Transaction()
+other_transaction.lock_timeout = 0.1
+other_transaction.add_query(query.update, grades_table, 1, None, 3, None)
+assert other_transaction.run() == False and other_transaction.is_retryable()
+assert query.select(1, 0, [1, 1, 1])[0].columns == [1, 1, 0]
+resume.set()
+thread.join()
+assert results == [True]
+assert transaction.get_locks() == dict() and LOCK_MANAGER.get_lock_holders() == dict()
+assert other_transaction.run() == True
+assert query.select(1, 0, [1, 1, 1])[0].columns == [1, 3, 0]
+print("Locks held until commit finished")
+
+# an aborted transaction releases its locks too
+transaction = Transaction()
+transaction.add_query(query.update, grades_table, 2, None, 2, None)
+transaction.add_query(query.insert, grades_table, 3, 0, 0)
+assert transaction.run() == False
+assert transaction.get_locks() == dict() and LOCK_MANAGER.get_lock_holders() == dict()
+assert query.select(2, 0, [1, 1, 1])[0].columns == [2, 0, 0]
+print("Locks released on abort finished")
+
+# transactions created on several threads get different ids
+transaction_ids = list()
+def create_transactions():
+    transaction_ids.extend(Transaction().id for _ in range(1000))
+threads = [Thread(target=create_transactions) for _ in range(4)]
+for thread in threads: thread.start()
+for thread in threads: thread.join()
+assert len(set(transaction_ids)) == 4000
+print("Transaction ids finished")
+
+db.close()
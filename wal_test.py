@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from lstore.db import Database
+from lstore.query import Query
+
+# runs in a child process that commits transactions and dies before any page is written out
+CRASHING_SESSION = r'''
+import os
+import sys
+from threading import Thread
+
+import lstore.config as Config
+from lstore.bufferpool import BUFFERPOOL
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+Config.WAL_GROUP_COMMIT_DELAY = 0.01
+db = Database()
+db.open(sys.argv[1], sys.argv[2])
+grades_table = db.create_table("Grades", 3, 0)
+query = Query(grades_table)
+for key in range(1, 51):
+    transaction = Transaction()
+    transaction.add_query(query.insert, grades_table, key, 0, 0)
+    assert transaction.run()
+# concurrent committers share flushes of the log
+def update(keys):
+    for key in keys:
+        transaction = Transaction()
+        transaction.add_query(query.update, grades_table, key, None, key, None)
+        assert transaction.run()
+threads = [Thread(target=update, args=(range(first, 51, 4),)) for first in range(1, 5)]
+for thread in threads: thread.start()
+for thread in threads: thread.join()
+# an aborted transaction leaves nothing behind
+transaction = Transaction()
+transaction.add_query(query.update, grades_table, 1, None, None, 1)
+transaction.add_query(query.insert, grades_table, 2, 0, 0)
+assert not transaction.run()
+# commits only wrote the log: pages on disk are still empty
+assert len(BUFFERPOOL.get_dirty_page_table())
+for directory, _, filenames in os.walk(os.path.join(sys.argv[1], "Grades", "PR0")):
+    for filename in filenames:
+        if filename.endswith(".bin"):
+            with open(os.path.join(directory, filename), "rb") as file: assert not any(file.read())
+os._exit(0)
+'''
+
+for durability in ["FSYNC", "GROUP"]:
+    path = os.path.join(tempfile.mkdtemp(), "ECS165")
+    subprocess.run([sys.executable, "-c", CRASHING_SESSION, path, durability], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    db = Database()
+    db.open(path)
+    grades_table = db.get_table("Grades")
+    query = Query(grades_table)
+    for key in range(1, 51):
+        assert query.select(key, 0, [1, 1, 1])[0].columns == [key, key, 0]
+    assert query.sum(1, 50, 1) == sum(range(1, 51))
+    db.close()
+    del grades_table, query
+    print(f"{durability} commits survive a crash finished")